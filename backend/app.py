@@ -1,9 +1,11 @@
 from flask import Flask, jsonify, request, redirect
 from flasgger import Swagger
 from flask_cors import CORS
-from flask import Flask, send_from_directory
+from flask import Flask
 import os
 from config import Config
+from utils import db, like_buffer, static_files, suggest
+from commands import register_commands
 
 
 from blueprints.post_routes import post_bp
@@ -13,26 +15,42 @@ from blueprints.post_comment_routes import post_comment_bp
 from blueprints.user_routes import user_bp
 from blueprints.moment_routes import moment_bp
 from blueprints.moment_image_routes import moment_image_bp
+from blueprints.admin_routes import admin_bp
+from blueprints.search_routes import search_bp
 
 
-app = Flask(__name__, static_folder='../frontend/MyBlog/dist', static_url_path='/')
+# 前端构建目录由下方 serve_static 统一提供（内存 index.html、预压缩、缓存头），不使用 Flask 自带的静态路由
+app = Flask(__name__, static_folder=None)
+FRONTEND_DIST = os.path.join(app.root_path, '..', 'frontend', 'MyBlog', 'dist')
+frontend_root = static_files.SpaRoot('dist', FRONTEND_DIST)
 
 # 配置一个额外的静态文件目录来服务 src/assets
 ASSETS_FOLDER = os.path.join(app.root_path, '..', 'frontend', 'MyBlog', 'src', 'assets')
+assets_root = static_files.StaticRoot('assets', ASSETS_FOLDER, cache_control=f'public, max-age={Config.STATIC_MAX_AGE}')
 app.add_url_rule('/static_assets/<path:filename>',
                  endpoint='assets',
-                 view_func=lambda filename: send_from_directory(ASSETS_FOLDER, filename))
+                 view_func=lambda filename: assets_root.serve(filename))
 
 # 配置上传文件目录
 UPLOAD_FOLDER = os.path.join(app.root_path, 'uploads')
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+uploads_root = static_files.StaticRoot('uploads', UPLOAD_FOLDER, cache_control=f'public, max-age={Config.STATIC_MAX_AGE}')
+# 内容寻址的动态图片：文件名即内容哈希，内容不会变化，可以永久缓存
+blobs_root = static_files.StaticRoot('blobs', Config.BLOB_STORE_DIR, cache_control=static_files.IMMUTABLE)
 
 # 添加路由以服务上传的图片
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    return uploads_root.serve(filename)
+
+@app.route(f'{Config.BLOB_STORE_URL}/<path:filename>')
+def blob_file(filename):
+    return blobs_root.serve(filename)
+
+# 加载 `flask assets build` 生成的清单，清单内的文件发送时不再访问文件系统元数据
+static_files.init_app(app, frontend_root, assets_root, uploads_root, blobs_root)
 app.config.from_object(Config)
 
 app.config['SWAGGER'] = {
@@ -59,20 +77,30 @@ app.register_blueprint(post_comment_bp, url_prefix='/api')
 app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(moment_bp, url_prefix='/api')
 app.register_blueprint(moment_image_bp, url_prefix='/api')
+app.register_blueprint(admin_bp, url_prefix='/api')
+app.register_blueprint(search_bp, url_prefix='/api')
+
+# 每个请求共用一个池化连接，请求结束时归还
+db.init_app(app)
+
+# 点赞写回缓冲（LIKE_WRITE_BEHIND=true 时启动后台写回线程）
+like_buffer.init_app(app)
+
+# 启动时从数据库构建标题联想索引
+suggest.init_app(app)
+
+# 注册 flask 命令行工具，如 flask counters reconcile
+register_commands(app)
 
 # 提供前端静态文件
 @app.route('/')
 def serve_index():
-    return send_from_directory(app.static_folder, 'index.html')
+    return frontend_root.index()
 
 @app.route('/<path:path>')
 def serve_static(path):
-    # 检查请求的路径是否是文件，如果是，则直接提供
-    if os.path.isfile(os.path.join(app.static_folder, path)):
-        return send_from_directory(app.static_folder, path)
-    # 如果不是文件（例如，是一个路由路径），则返回 index.html
-    else:
-        return send_from_directory(app.static_folder, 'index.html')
+    # 构建产物中的文件直接提供，其余路径（前端路由）返回 index.html；判断只查内存中的文件列表
+    return frontend_root.serve_path(path)
 
 @app.errorhandler(500)
 def handle_500_error(e):
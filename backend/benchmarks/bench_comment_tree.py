@@ -0,0 +1,79 @@
+"""
+评论树构建基准
+
+对比旧的递归 build_comment_tree（每个节点重扫整张列表，O(n²)）与
+utils.comment_tree.build_comment_tree（按 parent_id 建索引后迭代展开，O(n)）。
+旧实现在大规模数据上过慢，只跑到 LEGACY_LIMIT 条。
+
+运行：在 backend 目录下执行 python -m benchmarks.bench_comment_tree
+"""
+import random
+import time
+
+from utils.comment_tree import build_comment_tree
+
+LEGACY_LIMIT = 10000
+
+
+def legacy_build_comment_tree(comments, parent_id=None):
+    branch = []
+    for comment in comments:
+        if comment['parent_id'] == parent_id:
+            children = legacy_build_comment_tree(comments, comment['id'])
+            if children:
+                comment['replies'] = children
+            branch.append(comment)
+    return branch
+
+
+def make_comments(count, root_ratio=0.1, seed=42):
+    rng = random.Random(seed)
+    comments = []
+    for comment_id in range(1, count + 1):
+        if comment_id == 1 or rng.random() < root_ratio:
+            parent_id = None
+        else:
+            # 偏向回复最近的评论，形成较深的讨论串
+            parent_id = rng.randint(max(1, comment_id - 50), comment_id - 1)
+        comments.append({'id': comment_id, 'parent_id': parent_id, 'content': f'comment {comment_id}'})
+    return comments
+
+
+def make_chain(count):
+    """一条回复链，深度等于评论数，递归实现会超出递归上限"""
+    return [{'id': i, 'parent_id': i - 1 if i > 1 else None} for i in range(1, count + 1)]
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    print(f"{'comments':>8} | {'legacy ms':>10} | {'indexed ms':>10}")
+    for count in (1000, 5000, 10000, 50000):
+        comments = make_comments(count)
+        _, indexed_ms = timed(build_comment_tree, comments)
+        if count <= LEGACY_LIMIT:
+            _, legacy_ms = timed(legacy_build_comment_tree, [dict(c) for c in comments])
+            legacy = f'{legacy_ms:>10.1f}'
+        else:
+            legacy = f"{'skipped':>10}"
+        print(f'{count:>8} | {legacy} | {indexed_ms:>10.1f}')
+
+    chain = make_chain(20000)
+    roots, chain_ms = timed(build_comment_tree, chain, max_depth=10)
+    depth, node, last_level = 0, roots[0], 0
+    while node['replies']:
+        depth, last_level, node = depth + 1, len(node['replies']), node['replies'][0]
+    print(f'20000-deep reply chain (max_depth=10): {chain_ms:.1f} ms, '
+          f'nested {depth} levels, {last_level} replies flattened at the last level')
+    try:
+        legacy_build_comment_tree([dict(c) for c in chain])
+    except RecursionError:
+        print('legacy builder: RecursionError on the same chain')
+
+
+if __name__ == '__main__':
+    main()
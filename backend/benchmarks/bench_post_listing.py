@@ -0,0 +1,71 @@
+"""
+文章列表数据库往返次数基准
+
+不依赖真实数据库：用一个记录 execute 次数的假游标分别跑旧的逐篇 COUNT 写法
+和 utils.post_queries.fetch_posts，对比文章数增长时的往返次数与耗时。
+
+运行：在 backend 目录下执行 python -m benchmarks.bench_post_listing
+"""
+import time
+
+from utils.post_queries import fetch_posts
+
+ROUND_TRIP_LATENCY = 0.0002  # 模拟每次往返 0.2ms 的网络延迟
+
+
+class CountingCursor:
+    def __init__(self, num_posts):
+        self.num_posts = num_posts
+        self.round_trips = 0
+        self._result = []
+
+    def execute(self, sql, args=None):
+        self.round_trips += 1
+        time.sleep(ROUND_TRIP_LATENCY)
+        if 'COUNT(*)' in sql and 'GROUP BY' not in sql:
+            self._result = [{'like_count': 3, 'comment_count': 5}]
+        else:
+            self._result = [
+                {'id': i, 'title': f'post {i}', 'content': '...', 'like_count': 3, 'comment_count': 5}
+                for i in range(1, self.num_posts + 1)
+            ]
+
+    def fetchall(self):
+        return self._result
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+
+def legacy_listing(cursor):
+    cursor.execute("SELECT id, title, content FROM post ORDER BY id ASC")
+    posts = cursor.fetchall()
+    for post in posts:
+        cursor.execute("SELECT COUNT(*) as like_count FROM post_like WHERE post_id = %s", (post['id'],))
+        post['like_count'] = cursor.fetchone()['like_count']
+        cursor.execute("SELECT COUNT(*) as comment_count FROM post_comment WHERE post_id = %s", (post['id'],))
+        post['comment_count'] = cursor.fetchone()['comment_count']
+    return posts
+
+
+def run(listing, num_posts):
+    cursor = CountingCursor(num_posts)
+    start = time.perf_counter()
+    posts = listing(cursor)
+    elapsed = time.perf_counter() - start
+    assert len(posts) == num_posts
+    return cursor.round_trips, elapsed
+
+
+def main():
+    print(f"{'posts':>6} | {'legacy trips':>12} {'legacy ms':>10} | {'batched trips':>13} {'batched ms':>10}")
+    for num_posts in (10, 50, 100, 500):
+        legacy_trips, legacy_time = run(legacy_listing, num_posts)
+        batched_trips, batched_time = run(fetch_posts, num_posts)
+        print(f"{num_posts:>6} | {legacy_trips:>12} {legacy_time * 1000:>10.1f} | "
+              f"{batched_trips:>13} {batched_time * 1000:>10.1f}")
+        assert batched_trips == 1
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+from flask import Blueprint, jsonify
+from flasgger import swag_from
+from utils.auth_utils import jwt_required, role_required
+from utils.db import pool_stats
+from utils import like_buffer, related, response_cache, totals, user_cache
+
+admin_bp = Blueprint('admin_bp', __name__)
+
+@admin_bp.route('/admin/stats/db_pool', methods=['GET'])
+@jwt_required
+@role_required(['author'])
+@swag_from({
+    'tags': ['Admin'],
+    'security': [{'BearerAuth': []}],
+    'responses': {
+        200: {
+            'description': '数据库连接池状态',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'max_size': {'type': 'integer', 'description': '连接池上限'},
+                    'size': {'type': 'integer', 'description': '当前连接数'},
+                    'idle': {'type': 'integer', 'description': '空闲连接数'},
+                    'in_use': {'type': 'integer', 'description': '借出连接数'},
+                    'created': {'type': 'integer', 'description': '累计新建连接数'},
+                    'checkouts': {'type': 'integer', 'description': '累计借出次数'},
+                    'waits': {'type': 'integer', 'description': '累计等待次数'},
+                    'timeouts': {'type': 'integer', 'description': '累计超时次数'}
+                }
+            }
+        },
+        403: {'description': '权限不足'}
+    }
+})
+def get_db_pool_stats(current_user):
+    return jsonify(pool_stats()), 200
+
+@admin_bp.route('/admin/stats/like_buffer', methods=['GET'])
+@jwt_required
+@role_required(['author'])
+@swag_from({
+    'tags': ['Admin'],
+    'security': [{'BearerAuth': []}],
+    'responses': {
+        200: {
+            'description': '点赞写回缓冲状态',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'enabled': {'type': 'boolean', 'description': '是否开启写回模式'},
+                    'pending': {'type': 'integer', 'description': '待写回条目数'},
+                    'inflight': {'type': 'integer', 'description': '正在写回的条目数'},
+                    'coalesced': {'type': 'integer', 'description': '被抵消的操作数'},
+                    'flushes': {'type': 'integer', 'description': '累计写回批次'},
+                    'flush_errors': {'type': 'integer', 'description': '累计写回失败次数'}
+                }
+            }
+        },
+        403: {'description': '权限不足'}
+    }
+})
+def get_like_buffer_stats(current_user):
+    return jsonify({'enabled': like_buffer.enabled(), **like_buffer.buffer.stats()}), 200
+
+@admin_bp.route('/admin/stats/caches', methods=['GET'])
+@jwt_required
+@role_required(['author'])
+@swag_from({
+    'tags': ['Admin'],
+    'security': [{'BearerAuth': []}],
+    'responses': {
+        200: {'description': '各进程内缓存的大小与命中/未命中次数'},
+        403: {'description': '权限不足'}
+    }
+})
+def get_cache_stats(current_user):
+    return jsonify({
+        'totals': totals.stats(),
+        'users': user_cache.stats(),
+        'responses': response_cache.stats(),
+        'related_posts': related.stats()
+    }), 200
@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify
 import pymysql
 from utils.auth_utils import jwt_required
+from config import Config
 from utils.db import get_db_connection
+from utils import blob_store, image_variants, versions
 from flasgger import swag_from
 
 moment_image_bp = Blueprint('moment_image_bp', __name__)
@@ -33,8 +35,27 @@ moment_image_bp = Blueprint('moment_image_bp', __name__)
                             'type': 'object',
                             'properties': {
                                 'id': {'type': 'integer', 'description': '图片ID'},
-                                'image_url': {'type': 'string', 'description': '图片URL'},
-                                'display_order': {'type': 'integer', 'description': '显示顺序'}
+                                'image_url': {'type': 'string', 'description': '原图URL'},
+                                'display_order': {'type': 'integer', 'description': '显示顺序'},
+                                'width': {'type': ['integer', 'null'], 'description': '原图宽度'},
+                                'height': {'type': ['integer', 'null'], 'description': '原图高度'},
+                                'variants': {
+                                    'type': 'array',
+                                    'description': '缩放版本，按宽度升序；仍在处理中或旧图片为空数组',
+                                    'items': {
+                                        'type': 'object',
+                                        'properties': {
+                                            'url': {'type': 'string'},
+                                            'width': {'type': 'integer'},
+                                            'height': {'type': 'integer'},
+                                            'type': {'type': 'string', 'description': 'MIME，如 image/webp'}
+                                        }
+                                    }
+                                },
+                                'srcset': {
+                                    'type': 'object',
+                                    'description': 'MIME -> srcset 字符串，可直接用于 <picture><source>；为空时使用原图'
+                                }
                             }
                         }
                     }
@@ -64,13 +85,14 @@ def get_moment_images(current_user, moment_id):
             
             # 获取该动态的所有图片
             sql = """
-                SELECT id, image_url, display_order
-                FROM moment_image
-                WHERE moment_id = %s
-                ORDER BY display_order ASC
+                SELECT mi.id, mi.image_url, mi.display_order, mi.blob_hash, b.width, b.height, b.variants
+                FROM moment_image mi
+                LEFT JOIN image_blob b ON b.content_hash = mi.blob_hash
+                WHERE mi.moment_id = %s
+                ORDER BY mi.display_order ASC
             """
             cursor.execute(sql, (moment_id,))
-            images = cursor.fetchall()
+            images = image_variants.attach(cursor.fetchall())
             
             if not images:
                 return jsonify({
@@ -104,23 +126,18 @@ def get_moment_images(current_user, moment_id):
             'description': '动态ID'
         },
         {
-            'name': 'body',
-            'in': 'body',
-            'required': True,
-            'schema': {
-                'type': 'object',
-                'properties': {
-                    'image_url': {
-                        'type': 'string',
-                        'description': '图片URL地址'
-                    },
-                    'display_order': {
-                        'type': 'integer',
-                        'description': '图片显示顺序（可选，默认为1）'
-                    }
-                },
-                'required': ['image_url']
-            }
+            'name': 'image',
+            'in': 'formData',
+            'type': 'file',
+            'required': False,
+            'description': 'multipart 上传的图片文件（png/jpg/gif/webp）；也可以直接以 image/* 请求体上传，免去表单解析'
+        },
+        {
+            'name': 'display_order',
+            'in': 'formData',
+            'type': 'integer',
+            'required': False,
+            'description': '图片显示顺序（可选，默认为1）；请求体直接上传时放在查询参数中'
         }
     ],
     'responses': {
@@ -131,11 +148,12 @@ def get_moment_images(current_user, moment_id):
                 'properties': {
                     'success': {'type': 'boolean'},
                     'message': {'type': 'string'},
-                    'image_id': {'type': 'integer', 'description': '新添加的图片ID'}
+                    'image_id': {'type': 'integer', 'description': '新添加的图片ID'},
+                    'image_url': {'type': 'string', 'description': '按内容哈希命名的图片地址，可长期缓存'}
                 }
             }
         },
-        400: {'description': '缺少必要参数'},
+        400: {'description': '缺少图片、类型不支持或超过大小限制'},
         403: {'description': '无权操作此动态'},
         404: {'description': '动态不存在'},
         500: {'description': '数据库错误'}
@@ -143,66 +161,80 @@ def get_moment_images(current_user, moment_id):
 })
 def add_moment_image(current_user, moment_id):
 
-    if 'image' not in request.files:
-        return jsonify({
-            'success': False,
-            'error': '缺少图片文件',
-            'error_code': 'IMAGE_FILE_REQUIRED'
-        }), 400
+    if request.mimetype.startswith('image/'):
+        # 请求体即图片：直接读取输入流，不经过 werkzeug 的表单解析缓冲
+        stream = request.stream
+        display_order = request.args.get('display_order', 1, type=int)
+    else:
+        if 'image' not in request.files:
+            return jsonify({
+                'success': False,
+                'error': '缺少图片文件',
+                'error_code': 'IMAGE_FILE_REQUIRED'
+            }), 400
 
-    image_file = request.files['image']
-    display_order = request.form.get('display_order', 1)  # 从表单数据中获取显示顺序
+        image_file = request.files['image']
+        display_order = request.form.get('display_order', 1, type=int)  # 从表单数据中获取显示顺序
 
-    if image_file.filename == '':
-        return jsonify({
-            'success': False,
-            'error': '未选择图片文件',
-            'error_code': 'NO_IMAGE_SELECTED'
-        }), 400
+        if image_file.filename == '':
+            return jsonify({
+                'success': False,
+                'error': '未选择图片文件',
+                'error_code': 'NO_IMAGE_SELECTED'
+            }), 400
+        stream = image_file.stream
 
     conn = get_db_connection()
     if not conn:
         return jsonify({'success': False, 'error': '数据库连接失败'}), 500
 
+    blob = None
     try:
+        # 先写入临时文件，数据库事务只包含写表，不因文件 IO 长时间持锁
+        try:
+            blob = blob_store.receive(stream)
+        except blob_store.BlobError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e),
+                'error_code': 'INVALID_IMAGE'
+            }), 400
+
         with conn.cursor() as cursor:
-            # 验证动态存在且用户有权操作
-            cursor.execute("SELECT id FROM moment WHERE id = %s", (moment_id,))
+            # 锁定动态行，与批量上传互斥，批量上传分配和取回 display_order 期间不会插入其他图片
+            cursor.execute("SELECT id FROM moment WHERE id = %s FOR UPDATE", (moment_id,))
             if not cursor.fetchone():
+                conn.rollback()
                 return jsonify({
                     'success': False,
                     'error': '动态不存在',
                     'error_code': 'MOMENT_NOT_FOUND'
                 }), 404
 
-            # 插入新图片
-            import os
-            from werkzeug.utils import secure_filename
-            
-            UPLOAD_FOLDER = os.path.abspath('../../frontend/MyBlog/src/assets/Images/Moments')
-            if not os.path.exists(UPLOAD_FOLDER):
-                os.makedirs(UPLOAD_FOLDER)
-            
-            filename = secure_filename(image_file.filename)
-            save_path = os.path.join(UPLOAD_FOLDER, filename)
-            image_file.save(save_path)
-            
-            image_url_for_db = f'/assets/Images/Moments/{filename}'
+            # 增加引用计数，相同图片只保存一份；文件在事务提交后才放到内容地址
+            blob_store.acquire(cursor, blob)
 
             sql = """
 INSERT INTO moment_image 
-                    (moment_id, image_url, display_order) 
+                    (moment_id, image_url, display_order, blob_hash) 
                 VALUES 
-                    (%s, %s, %s)
+                    (%s, %s, %s, %s)
             """
-            cursor.execute(sql, (moment_id, image_url_for_db, display_order))
-            conn.commit()
+            cursor.execute(sql, (moment_id, blob.url, display_order, blob.digest))
             image_id = cursor.lastrowid
+            versions.bump(cursor, f'moment:{moment_id}')
+            conn.commit()
+            # 提交之后再放置文件：事务失败不会留下文件，提交后记录已存在，reclaim 不会删除它
+            blob.publish()
+
+            # 尚未生成缩放版本的文件交给后台进程池，完成前接口返回原图
+            image_variants.schedule_missing(cursor, [blob.digest])
             
             return jsonify({
                 'success': True,
                 'message': '图片添加成功',
-                'image_id': image_id
+                'image_id': image_id,
+                'image_url': blob.url
             }), 201
             
     except pymysql.IntegrityError as e:
@@ -214,7 +246,159 @@ INSERT INTO moment_image
     except pymysql.Error as e:
         conn.rollback()
         return jsonify({'success': False, 'error': f'数据库错误: {str(e)}'}), 500
+    except OSError as e:
+        conn.rollback()
+        print(f"Blob store error in add_moment_image: {e}")
+        return jsonify({'success': False, 'error': '图片保存失败'}), 500
+    finally:
+        if blob is not None:
+            blob.discard()
+        conn.close()
+
+
+@moment_image_bp.route('/moment/<int:moment_id>/images/batch', methods=['POST'])
+@jwt_required
+@swag_from({
+    'tags': ['Moment Image'],
+    'security': [{'BearerAuth': []}],
+    'consumes': ['multipart/form-data'],
+    'parameters': [
+        {
+            'name': 'moment_id',
+            'in': 'path',
+            'type': 'integer',
+            'required': True,
+            'description': '动态ID'
+        },
+        {
+            'name': 'images',
+            'in': 'formData',
+            'type': 'file',
+            'required': True,
+            'description': f'图片文件，可重复提交多个（最多 {Config.MAX_IMAGES_PER_UPLOAD} 个，字段名 images 或 image）；'
+                           f'按提交顺序追加在已有图片之后'
+        }
+    ],
+    'responses': {
+        201: {
+            'description': '全部图片添加成功',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'success': {'type': 'boolean'},
+                    'message': {'type': 'string'},
+                    'images': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'id': {'type': 'integer', 'description': '图片ID'},
+                                'image_url': {'type': 'string', 'description': '图片URL'},
+                                'display_order': {'type': 'integer', 'description': '服务端分配的显示顺序'}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        400: {'description': '缺少图片、数量超限，或其中某张类型不支持/超过大小限制（整批不写入）'},
+        404: {'description': '动态不存在'},
+        500: {'description': '数据库错误'}
+    }
+})
+def add_moment_images(current_user, moment_id):
+
+    files = [f for f in request.files.getlist('images') + request.files.getlist('image') if f.filename]
+    if not files:
+        return jsonify({
+            'success': False,
+            'error': '缺少图片文件',
+            'error_code': 'IMAGE_FILE_REQUIRED'
+        }), 400
+    if len(files) > Config.MAX_IMAGES_PER_UPLOAD:
+        return jsonify({
+            'success': False,
+            'error': f'一次最多上传 {Config.MAX_IMAGES_PER_UPLOAD} 张图片',
+            'error_code': 'TOO_MANY_IMAGES'
+        }), 400
+
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'success': False, 'error': '数据库连接失败'}), 500
+
+    blobs = []
+    try:
+        # 先并发写入临时文件，数据库事务只包含写表，不因文件 IO 长时间持锁
+        try:
+            blobs = blob_store.receive_many(f.stream for f in files)
+        except blob_store.BlobError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e),
+                'error_code': 'INVALID_IMAGE'
+            }), 400
+
+        with conn.cursor() as cursor:
+            # 锁定动态行，同一动态的并发上传依次分配 display_order
+            cursor.execute("SELECT id FROM moment WHERE id = %s FOR UPDATE", (moment_id,))
+            if not cursor.fetchone():
+                conn.rollback()
+                return jsonify({
+                    'success': False,
+                    'error': '动态不存在',
+                    'error_code': 'MOMENT_NOT_FOUND'
+                }), 404
+
+            cursor.execute(
+                "SELECT COALESCE(MAX(display_order), 0) AS max_order FROM moment_image WHERE moment_id = %s",
+                (moment_id,)
+            )
+            first_order = cursor.fetchone()['max_order'] + 1
+
+            blob_store.acquire_many(cursor, blobs)
+
+            # executemany 对 INSERT ... VALUES 会合并为一条多行 INSERT
+            rows = [
+                (moment_id, blob.url, first_order + offset, blob.digest)
+                for offset, blob in enumerate(blobs)
+            ]
+            cursor.executemany(
+                "INSERT INTO moment_image (moment_id, image_url, display_order, blob_hash) VALUES (%s, %s, %s, %s)",
+                rows
+            )
+            # 多行 INSERT 的自增 ID 不保证连续，按刚分配的 display_order 区间取回；
+            # 动态行已锁定，单张与批量上传都不会并发写入这个区间
+            cursor.execute(
+                "SELECT id, image_url, display_order FROM moment_image "
+                "WHERE moment_id = %s AND display_order BETWEEN %s AND %s ORDER BY display_order ASC",
+                (moment_id, first_order, first_order + len(blobs) - 1)
+            )
+            images = cursor.fetchall()
+            versions.bump(cursor, f'moment:{moment_id}')
+            conn.commit()
+            # 与单张上传相同，事务提交后再放置文件
+            for blob in blobs:
+                blob.publish()
+
+            # 尚未生成缩放版本的文件交给后台进程池
+            image_variants.schedule_missing(cursor, [blob.digest for blob in blobs])
+
+            return jsonify({
+                'success': True,
+                'message': f'成功添加 {len(images)} 张图片',
+                'images': images
+            }), 201
+
+    except pymysql.Error as e:
+        conn.rollback()
+        return jsonify({'success': False, 'error': f'数据库错误: {str(e)}'}), 500
+    except OSError as e:
+        conn.rollback()
+        print(f"Blob store error in add_moment_images: {e}")
+        return jsonify({'success': False, 'error': '图片保存失败'}), 500
     finally:
+        for blob in blobs:
+            blob.discard()
         conn.close()
 
 
@@ -249,7 +433,7 @@ def delete_moment_image(current_user, image_id):
         with conn.cursor(pymysql.cursors.DictCursor) as cursor:
             # 获取图片信息及其关联动态
             sql = """
-                SELECT mi.id, mi.moment_id, m.user_id AS moment_user_id 
+                SELECT mi.id, mi.moment_id, mi.blob_hash, m.user_id AS moment_user_id 
                 FROM moment_image mi
                 JOIN moment m ON mi.moment_id = m.id
                 WHERE mi.id = %s
@@ -275,7 +459,11 @@ def delete_moment_image(current_user, image_id):
             # 删除图片
             delete_sql = "DELETE FROM moment_image WHERE id = %s"
             cursor.execute(delete_sql, (image_id,))
+            # 最后一个引用被删除时回收文件（提交成功后才删除）
+            reclaimable = blob_store.release(cursor, image_data['blob_hash']) if image_data['blob_hash'] else []
+            versions.bump(cursor, f"moment:{image_data['moment_id']}")
             conn.commit()
+            blob_store.reclaim(conn, reclaimable)
             
             return jsonify({
                 'success': True,
@@ -5,6 +5,9 @@ import pymysql
 from werkzeug.utils import secure_filename
 from utils.auth_utils import jwt_required, role_required
 from utils.db import get_db_connection
+from utils.moment_feed import MOMENT_COLUMNS, assemble_moments
+from utils.pagination import decode_cursor, keyset_condition, next_cursor, split_page
+from utils import blob_store, counters, like_buffer, likes, totals, versions
 
 
 
@@ -23,6 +26,40 @@ def allowed_file(filename):
 @swag_from({
     'tags': ['Moment'],
     'security': [{'BearerAuth': []}],
+    'parameters': [
+        {
+            'name': 'page',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'default': 1,
+            'description': '页码，从1开始（传 cursor 时忽略）'
+        },
+        {
+            'name': 'per_page',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'default': 20,
+            'description': '每页条数'
+        },
+        {
+            'name': 'cursor',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': '游标分页：首页传空字符串，之后传上一页返回的 next_cursor'
+        },
+        {
+            'name': 'total',
+            'in': 'query',
+            'type': 'string',
+            'enum': ['exact', 'cached', 'none'],
+            'required': False,
+            'default': 'exact',
+            'description': '总数统计方式：exact 实时统计，cached 使用缓存，none 不统计（只返回 has_more）'
+        }
+    ],
     'responses': {
         200: {
             'description': '成功获取所有动态',
@@ -49,70 +86,58 @@ def get_moments(current_user):
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 20))
     offset = (page - 1) * per_page
+    cursor_token = request.args.get('cursor')
+    total_mode = request.args.get('total')
 
     conn = get_db_connection()
     if not conn:
         return jsonify({'error': '数据库连接失败'}), 500
     
     try:
+        after = decode_cursor(cursor_token, 2)
+        total_mode = totals.parse_mode(total_mode)
         with conn.cursor(pymysql.cursors.DictCursor) as cursor:
             base_query = "FROM `moment` WHERE 1=1"
             params = []
             
 
             
-            # 获取总数
+            # 获取总数（total=none 时跳过，total=cached 时使用缓存）
             count_sql = f"SELECT COUNT(*) AS total {base_query}"
-            cursor.execute(count_sql, params)
-            total = cursor.fetchone()['total']
-            total_pages = (total + per_page - 1) // per_page
+            total = totals.get_total(cursor, total_mode, 'moments', count_sql, params)
+            total_pages = (total + per_page - 1) // per_page if total is not None else None
             
-            # 获取数据
+            # 获取数据：带游标时从游标之后取，不再扫描并丢弃前面的行
+            data_params = list(params)
+            keyset = ''
+            if after:
+                keyset = 'AND ' + keyset_condition('publish_time', 'id', descending=True)
+                data_params.extend([after[0], after[0], after[1]])
+                offset = 0
             data_sql = f"""
-                SELECT id, content, publish_time
+                SELECT {MOMENT_COLUMNS}
                 {base_query}
-                ORDER BY publish_time DESC
+                {keyset}
+                ORDER BY publish_time DESC, id DESC
                 LIMIT %s, %s
             """
-            params.extend([offset, per_page])
-            cursor.execute(data_sql, params)
-            moments = cursor.fetchall()
-
-            for moment in moments:
-                moment_id = moment['id']
-                # 获取用户信息 (固定为用户ID 1)
-                sql_user = "SELECT id, username FROM user WHERE id = 1"
-                cursor.execute(sql_user)
-                user_info = cursor.fetchone()
-                moment['user'] = user_info if user_info else {'username': '未知用户'}
-
-                # 实时计算点赞数
-                sql_likes = "SELECT COUNT(*) as like_count FROM moment_like WHERE moment_id = %s"
-                cursor.execute(sql_likes, (moment_id,))
-                result = cursor.fetchone()
-                like_count = result['like_count'] if result else 0
-
-                # 实时计算评论数
-                sql_comments = "SELECT COUNT(*) as comment_count FROM moment_comment WHERE moment_id = %s"
-                cursor.execute(sql_comments, (moment_id,))
-                result = cursor.fetchone()
-                comment_count = result['comment_count'] if result else 0
-
-                moment['likes_count'] = like_count # 修改为 likes_count 以匹配前端
-                moment['comments'] = [] # 初始化评论列表，如果需要详细评论，需要另外查询
-
-                # 获取动态图片
-                sql_images = "SELECT id, image_url, display_order FROM moment_image WHERE moment_id = %s ORDER BY display_order"
-                cursor.execute(sql_images, (moment_id,))
-                images = cursor.fetchall()
-                moment['images'] = images
+            # 多取一行用于判断 has_more
+            data_params.extend([offset, per_page + 1])
+            cursor.execute(data_sql, data_params)
+            moments, has_more = split_page(cursor.fetchall(), per_page)
+            cursor_for_next = next_cursor(moments, has_more, 'publish_time')
+
+            # 作者、图片整页批量取回，查询次数与每页条数无关
+            assemble_moments(cursor, moments)
 
             return jsonify({
                 'moments': moments,
                 'total': total,
                 'page': page,
                 'per_page': per_page,
-                'total_pages': total_pages
+                'total_pages': total_pages,
+                'has_more': has_more,
+                'next_cursor': cursor_for_next
             })
             
     except (ValueError, TypeError) as e:
@@ -171,26 +196,16 @@ def create_moment(current_user):
             cursor.execute(sql, (content,))
             conn.commit()
             new_moment_id = cursor.lastrowid
+            totals.invalidate('moments')
 
 
 
             # 获取新创建的动态的完整信息，包括用户信息和图片
-            cursor.execute("SELECT id, content, publish_time FROM `moment` WHERE id = %s", (new_moment_id,))
+            cursor.execute(f"SELECT {MOMENT_COLUMNS} FROM `moment` WHERE id = %s", (new_moment_id,))
             new_moment = cursor.fetchone()
 
             if new_moment:
-                # 获取用户信息 (固定为用户ID 1)
-                cursor.execute("SELECT id, username FROM user WHERE id = 1")
-                user_info = cursor.fetchone()
-                new_moment['user'] = user_info if user_info else {'username': '未知用户'}
-                new_moment['likes_count'] = 0  # 新创建的动态点赞数为0
-                new_moment['comments'] = []  # 新创建的动态评论为空
-
-                # 获取动态图片
-                sql_images = "SELECT id, image_url, display_order FROM moment_image WHERE moment_id = %s ORDER BY display_order"
-                cursor.execute(sql_images, (new_moment_id,))
-                images_data = cursor.fetchall()
-                new_moment['images'] = images_data
+                assemble_moments(cursor, [new_moment])
 
             return jsonify({
                 'code': 200,
@@ -237,6 +252,7 @@ def create_moment(current_user):
         500: {'description': '服务器错误'}
     }
 })
+@versions.conditional(versions.moment_scopes)
 def get_moment(current_user, moment_id):
     conn = get_db_connection()
     if not conn:
@@ -245,29 +261,13 @@ def get_moment(current_user, moment_id):
     try:
         with conn.cursor(pymysql.cursors.DictCursor) as cursor:
             sql = """
-                SELECT id, user_id, content, publish_time
+                SELECT id, user_id, content, publish_time, like_count, comment_count
                 FROM `moment`
                 WHERE id = %s
             """
             cursor.execute(sql, (moment_id,))
             moment = cursor.fetchone()
 
-            if moment:
-                # 实时计算点赞数
-                sql_likes = "SELECT COUNT(*) as like_count FROM moment_like WHERE moment_id = %s"
-                cursor.execute(sql_likes, (moment_id,))
-                result = cursor.fetchone()
-                like_count = result['like_count'] if result else 0
-
-                # 实时计算评论数
-                sql_comments = "SELECT COUNT(*) as comment_count FROM moment_comment WHERE moment_id = %s"
-                cursor.execute(sql_comments, (moment_id,))
-                result = cursor.fetchone()
-                comment_count = result['comment_count'] if result else 0
-
-                moment['like_count'] = like_count
-                moment['comment_count'] = comment_count
-            
             if not moment:
                 return jsonify({'error': '动态不存在'}), 404
                 
@@ -354,6 +354,7 @@ def update_moment(current_user, moment_id):
             # 3. 更新动态内容
             sql_update_moment = "UPDATE `moment` SET content = %s WHERE id = %s"
             cursor.execute(sql_update_moment, (content, moment_id))
+            versions.bump(cursor, f'moment:{moment_id}')
             conn.commit()
 
             return jsonify({
@@ -410,10 +411,25 @@ def delete_moment(current_user, moment_id):
                     'error_code': 'MOMENT_NOT_FOUND'
                 }), 404
 
+            # 先删除图片并释放其引用的文件（按哈希排序加锁，避免并发删除时死锁）
+            cursor.execute(
+                "SELECT blob_hash FROM moment_image WHERE moment_id = %s AND blob_hash IS NOT NULL",
+                (moment_id,)
+            )
+            blob_hashes = sorted(row['blob_hash'] for row in cursor.fetchall())
+            cursor.execute("DELETE FROM moment_image WHERE moment_id = %s", (moment_id,))
+            reclaimable = []
+            for blob_hash in blob_hashes:
+                reclaimable.extend(blob_store.release(cursor, blob_hash))
+
             # 删除动态
             sql_delete_moment = "DELETE FROM `moment` WHERE id = %s"
             cursor.execute(sql_delete_moment, (moment_id,))
+            versions.bump(cursor, f'moment:{moment_id}')
             conn.commit()
+            totals.invalidate('moments')
+            # 提交成功后才删除引用归零的文件
+            blob_store.reclaim(conn, reclaimable)
 
             return jsonify({
                 'success': True,
@@ -433,7 +449,6 @@ def delete_moment(current_user, moment_id):
     'security': [{'BearerAuth': []}],
     'responses': {
         200: {'description': '点赞成功'},
-        400: {'description': '无效的动态ID或重复操作'},
         401: {'description': '未授权'},
         404: {'description': '动态不存在'},
         500: {'description': '数据库错误'}
@@ -456,78 +471,123 @@ def like_moment(current_user, moment_id):
 
     try:
         with conn.cursor() as cursor:
-            # 1. 验证动态是否存在
-            sql_check_moment = "SELECT id FROM `moment` WHERE id = %s"
-            cursor.execute(sql_check_moment, (moment_id,))
-            moment = cursor.fetchone()
+            # 写回模式：只记录到缓冲，由后台线程批量落库
+            if like_buffer.enabled():
+                result = like_buffer.settle(cursor, 'moment', moment_id, current_user['user_id'])
+                if result is None:
+                    return jsonify({
+                        'success': False,
+                        'message': '动态不存在',
+                        'error_code': 'MOMENT_NOT_FOUND'
+                    }), 404
+                liked, updated_count = result
+                return jsonify({
+                    'success': True,
+                    'message': '点赞成功' if liked else '已取消点赞',
+                    'like_count': updated_count
+                }), 200
 
-            if not moment:
+            user_id = current_user['user_id']
+
+            # 锁定目标行并读取当前点赞状态（JOIN 的点赞记录同样加锁读取），同一目标的并发切换依次执行，
+            # 读到的状态在提交前不会被其他请求改变，连续点击不会重复点赞或重复计数
+            cursor.execute("""
+                SELECT t.id, l.user_id AS liked_by
+                FROM `moment` t
+                LEFT JOIN moment_like l ON l.moment_id = t.id AND l.user_id = %s
+                WHERE t.id = %s
+                FOR UPDATE
+            """, (user_id, moment_id))
+            row = cursor.fetchone()
+            if not row:
                 return jsonify({
                     'success': False,
                     'message': '动态不存在',
                     'error_code': 'MOMENT_NOT_FOUND'
                 }), 404
 
-            user_id = current_user['user_id']
+            liked = row['liked_by'] is None
+            updated_count = likes.set_like(cursor, 'moment', moment_id, user_id, liked)
+            versions.bump(cursor, *versions.target_scopes('moment', moment_id))
+            conn.commit()
+            return jsonify({
+                'success': True,
+                'message': '点赞成功' if liked else '已取消点赞',
+                'like_count': updated_count
+            }), 200
 
-            # 2. 检查当前点赞状态
-            sql_check_like = """
-                SELECT id FROM moment_like
-                WHERE moment_id = %s AND user_id = %s
-            """
-            cursor.execute(sql_check_like, (moment_id, user_id))
-            existing_like = cursor.fetchone()
-
-            if existing_like:
-                # 3. 已点赞 -> 执行取消点赞
-                # 3.1 删除点赞记录
-                sql_delete_like = """
-                    DELETE FROM moment_like
-                    WHERE id = %s
-                """
-                cursor.execute(sql_delete_like, (existing_like['id'],))
-
-                # 获取实时点赞数
-                cursor.execute("SELECT COUNT(*) as like_count FROM moment_like WHERE moment_id = %s", (moment_id,))
-                updated_count = cursor.fetchone()['like_count']
+    except pymysql.Error as e:
+        conn.rollback()
+        return jsonify({'error': f'数据库错误: {str(e)}'}), 500
+    finally:
+        conn.close()
 
-                conn.commit()
-                return jsonify({
-                    'success': True,
-                    'message': '已取消点赞',
-                    'like_count': updated_count
-                }), 200
+@moment_bp.route('/moment/<int:moment_id>/like', methods=['PUT', 'DELETE'])
+@jwt_required
+@swag_from({
+    'tags': ['Moment'],
+    'security': [{'BearerAuth': []}],
+    'parameters': [
+        {
+            'name': 'moment_id',
+            'in': 'path',
+            'type': 'integer',
+            'required': True,
+            'description': '动态ID'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'PUT 点赞 / DELETE 取消点赞，重复请求结果相同',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'success': {'type': 'boolean', 'description': '操作是否成功'},
+                    'liked': {'type': 'boolean', 'description': '当前是否已点赞'},
+                    'like_count': {'type': 'integer', 'description': '更新后的点赞数'}
+                }
+            }
+        },
+        404: {'description': '动态不存在'},
+        500: {'description': '数据库错误'}
+    }
+})
+def set_moment_like(current_user, moment_id):
+    """
+    幂等点赞
+    - PUT：点赞，已点赞时不做变更
+    - DELETE：取消点赞，未点赞时不做变更
+    """
+    liked = request.method == 'PUT'
+    user_id = current_user['user_id']
 
-            else:
-                # 4. 未点赞 -> 执行点赞
-                # 4.1 添加点赞记录
-                sql_insert_like = """
-                    INSERT INTO moment_like (moment_id, user_id)
-                    VALUES (%s, %s)
-                """
-                cursor.execute(sql_insert_like, (moment_id, user_id))
-
-                # 4.2 获取更新后的点赞数
-                cursor.execute("SELECT COUNT(*) as like_count FROM moment_like WHERE moment_id = %s", (moment_id,))
-                updated_count = cursor.fetchone()['like_count']
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({'error': 'Database connection failed'}), 500
 
+    try:
+        with conn.cursor() as cursor:
+            if like_buffer.enabled():
+                result = like_buffer.settle(cursor, 'moment', moment_id, user_id, liked)
+                updated_count = result[1] if result else None
+            else:
+                updated_count = likes.set_like(cursor, 'moment', moment_id, user_id, liked)
+                if updated_count is not None:
+                    versions.bump(cursor, *versions.target_scopes('moment', moment_id))
                 conn.commit()
+
+            if updated_count is None:
                 return jsonify({
-                    'success': True,
-                    'message': '点赞成功',
-                    'like_count': updated_count
-                }), 200
+                    'success': False,
+                    'message': '动态不存在',
+                    'error_code': 'MOMENT_NOT_FOUND'
+                }), 404
 
-    except pymysql.IntegrityError as e:
-        conn.rollback()
-        if e.args[0] == 1062:  # 唯一约束违反(重复点赞)
             return jsonify({
-                'success': False,
-                'message': '操作失败，请勿重复操作',
-                'error_code': 'DUPLICATE_LIKE_ACTION'
-            }), 400
-        else:
-            return jsonify({'error': f'数据库完整性错误: {str(e)}'}), 500
+                'success': True,
+                'liked': liked,
+                'like_count': updated_count
+            }), 200
 
     except pymysql.Error as e:
         conn.rollback()
@@ -2,38 +2,60 @@ from flask import Blueprint, jsonify, request
 from flasgger import swag_from
 from flask import Blueprint, request, jsonify
 from utils.db import get_db_connection
+from utils.pagination import decode_cursor, keyset_condition, next_cursor, split_page
+from utils.comment_tree import build_comment_tree
+from utils import counters, response_cache, totals, user_cache, versions
 import pymysql
 from utils.auth_utils import jwt_required
 
 post_comment_bp = Blueprint('post_comment_bp', __name__)
 
-def build_comment_tree(comments, parent_id=None):
-    branch = []
-    for comment in comments:
-        if comment['parent_id'] == parent_id:
-            children = build_comment_tree(comments, comment['id'])
-            if children:
-                comment['replies'] = children
-            branch.append(comment)
-    return branch
-
-def get_username_by_id(user_id):
-    conn = get_db_connection()
-    if conn is None:
-        return None
-    try:
-        with conn.cursor() as cursor:
-            sql = "SELECT username FROM user WHERE id = %s"
-            cursor.execute(sql, (user_id,))
-            result = cursor.fetchone()
-            if result:
-                return result['username']
-            return ""
-    except pymysql.Error as e:
-        print(f"Database error in get_username_by_id: {e}")
-        return None
-    finally:
-        conn.close()
+# 用户名不再 JOIN user 表，查询后由 user_cache.attach_usernames 补全
+REPLY_COLUMNS = "pc.id, pc.user_id, pc.post_id, pc.parent_id, pc.content, pc.create_time"
+
+def fetch_thread_replies(cursor, root_ids, limit=None):
+    """
+    按写入时记录的 root_id 取一批一级评论的回复（无论层级），走 (root_id, create_time) 索引
+    limit 为空时取全部回复，否则每个一级评论只取最早的 limit 条；limit 为 0 时只统计回复数
+    返回 {root_id: {'replies': [...], 'reply_count': 回复总数}}，回复中保留 create_time 供生成游标
+    """
+    if limit == 0:
+        # 窗口查询截断后一行都不剩，拿不到 reply_count，单独按讨论串计数
+        cursor.execute(
+            "SELECT root_id, COUNT(*) AS reply_count FROM post_comment WHERE root_id IN %s GROUP BY root_id",
+            (tuple(root_ids),)
+        )
+        return {row['root_id']: {'replies': [], 'reply_count': row['reply_count']} for row in cursor.fetchall()}
+    if limit is None:
+        sql = f"""
+            SELECT {REPLY_COLUMNS}, pc.root_id
+            FROM post_comment pc
+            WHERE pc.root_id IN %s
+            ORDER BY pc.create_time ASC, pc.id ASC
+        """
+        cursor.execute(sql, (tuple(root_ids),))
+    else:
+        # 窗口函数在同一次查询里完成每个讨论串的截断和计数
+        sql = f"""
+            SELECT {REPLY_COLUMNS}, pc.root_id, pc.reply_count
+            FROM (
+                SELECT id, user_id, post_id, parent_id, content, create_time, root_id,
+                    ROW_NUMBER() OVER (PARTITION BY root_id ORDER BY create_time, id) AS rn,
+                    COUNT(*) OVER (PARTITION BY root_id) AS reply_count
+                FROM post_comment
+                WHERE root_id IN %s
+            ) pc
+            WHERE pc.rn <= %s
+            ORDER BY pc.create_time ASC, pc.id ASC
+        """
+        cursor.execute(sql, (tuple(root_ids), limit))
+
+    threads = {}
+    for reply in user_cache.attach_usernames(cursor, cursor.fetchall()):
+        thread = threads.setdefault(reply.pop('root_id'), {'replies': [], 'reply_count': 0})
+        thread['replies'].append(reply)
+        thread['reply_count'] = reply.pop('reply_count', len(thread['replies']))
+    return threads
 
 
 @post_comment_bp.route('/comments/<int:comment_id>', methods=['DELETE'])
@@ -83,12 +105,14 @@ def delete_comment(comment_id, current_user):
             sql_delete_comment = "DELETE FROM post_comment WHERE id = %s"
             cursor.execute(sql_delete_comment, (comment_id,))
             
-            # Update article comment count
-            sql_update_post_comment_count = "UPDATE post SET comment_count = (SELECT COUNT(*) FROM post_comment WHERE post_id = %s) WHERE id = %s"
-            # 删除更新comment_count的SQL语句
-            # cursor.execute(sql_update_post_comment_count, (post_id, post_id))
+            # 4. Update article comment count
+            # 子回复可能被级联删除，按评论表重新统计而不是简单减一
+            counters.recount(cursor, 'post', post_id, 'comment_count')
+            versions.bump(cursor, *versions.target_scopes('post', post_id))
 
             conn.commit()
+            totals.invalidate(('root_comments', post_id))
+            response_cache.invalidate_post(post_id)
             return jsonify({'message': '评论删除成功'}), 200
 
     except pymysql.Error as e:
@@ -125,6 +149,52 @@ def delete_comment(comment_id, current_user):
             'required': False,
             'default': 10,
             'description': '每页条数'
+        },
+        {
+            'name': 'cursor',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': '游标分页：首页传空字符串，之后传上一页返回的 next_cursor（传入时忽略 page）'
+        },
+        {
+            'name': 'total',
+            'in': 'query',
+            'type': 'string',
+            'enum': ['exact', 'cached', 'none'],
+            'required': False,
+            'default': 'exact',
+            'description': '总数统计方式：exact 实时统计，cached 使用缓存，none 不统计（只返回 has_more）'
+        },
+        {
+            'name': 'nested',
+            'in': 'query',
+            'type': 'boolean',
+            'required': False,
+            'default': False,
+            'description': '为 true 时 replies 按回复关系逐层嵌套，否则所有回复平铺在一级评论下'
+        },
+        {
+            'name': 'max_depth',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'default': 10,
+            'description': '嵌套模式下的最大层数（1-50），更深的回复平铺到最后一层'
+        },
+        {
+            'name': 'max_replies',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'description': '嵌套模式下每条评论最多返回的回复数，reply_count 为回复总数'
+        },
+        {
+            'name': 'replies_limit',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'description': '懒加载回复：每条一级评论只返回最早的 N 条回复（0-100，0 表示只返回 reply_count），并附带 reply_count 和 replies_cursor，其余回复通过 /comments/{comment_id}/replies 分页获取'
         }
     ],
     'definitions': {
@@ -142,7 +212,9 @@ def delete_comment(comment_id, current_user):
                     'items': {
                         '$ref': '#/definitions/Comment'
                     }
-                }
+                },
+                'reply_count': {'type': 'integer', 'description': '回复总数（嵌套或懒加载模式）'},
+                'replies_cursor': {'type': ['string', 'null'], 'description': '懒加载模式下获取剩余回复的游标'}
             }
         }
     },
@@ -163,8 +235,10 @@ def delete_comment(comment_id, current_user):
                         'properties': {
                             'current_page': {'type': 'integer'},
                             'page_size': {'type': 'integer'},
-                            'total_count': {'type': 'integer'},
-                            'total_pages': {'type': 'integer'}
+                            'total_count': {'type': ['integer', 'null']},
+                            'total_pages': {'type': ['integer', 'null']},
+                            'has_more': {'type': 'boolean'},
+                            'next_cursor': {'type': ['string', 'null']}
                         }
                     }
                 }
@@ -188,29 +262,57 @@ def get_comments_by_post_id(post_id, current_user):
 
     offset = (page - 1) * page_size
 
+    nested = request.args.get('nested', default='false').lower() in ('1', 'true', 'yes')
+    max_depth = request.args.get('max_depth', default=10, type=int)
+    max_replies = request.args.get('max_replies', default=None, type=int)
+    if max_depth < 1 or max_depth > 50:
+        max_depth = 10
+    if max_replies is not None and max_replies < 0:
+        max_replies = None
+    replies_limit = request.args.get('replies_limit', default=None, type=int)
+    if replies_limit is not None and (replies_limit < 0 or replies_limit > 100):
+        replies_limit = None
+
+    try:
+        after = decode_cursor(request.args.get('cursor'), 2)
+        total_mode = totals.parse_mode(request.args.get('total'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     conn = get_db_connection()
     if conn is None:
         return jsonify({'error': 'Database connection failed'}), 500
     
     try:
         with conn.cursor(pymysql.cursors.DictCursor) as cursor:
-            # 查询总一级评论数（parent_id为空）
-            count_sql = "SELECT COUNT(*) AS total_count FROM post_comment WHERE post_id = %s AND parent_id IS NULL"
-            cursor.execute(count_sql, (post_id,))
-            total_count = cursor.fetchone()['total_count']
-
-            # 分页查询一级评论（parent_id为空）
-            sql = """
-                SELECT pc.id, pc.user_id, pc.post_id, pc.parent_id, pc.content, 
-                    COALESCE(u.username, '匿名用户') AS username
+            # 查询总一级评论数（parent_id为空），total=none 时跳过，total=cached 时使用缓存
+            count_sql = "SELECT COUNT(*) AS total FROM post_comment WHERE post_id = %s AND parent_id IS NULL"
+            total_count = totals.get_total(cursor, total_mode, ('root_comments', post_id), count_sql, (post_id,))
+            total_pages = (total_count + page_size - 1) // page_size if total_count is not None else None
+
+            # 分页查询一级评论（parent_id为空），带游标时从游标之后取
+            params = [post_id]
+            keyset = ''
+            if after:
+                keyset = 'AND ' + keyset_condition('pc.create_time', 'pc.id', descending=False)
+                params.extend([after[0], after[0], after[1]])
+                offset = 0
+            sql = f"""
+                SELECT {REPLY_COLUMNS}
                 FROM post_comment pc
-                LEFT JOIN user u ON pc.user_id = u.id
                 WHERE pc.post_id = %s AND pc.parent_id IS NULL
-                ORDER BY pc.create_time ASC
+                {keyset}
+                ORDER BY pc.create_time ASC, pc.id ASC
                 LIMIT %s OFFSET %s
             """
-            cursor.execute(sql, (post_id, page_size, offset))
-            root_comments = cursor.fetchall()
+            # 多取一行用于判断 has_more
+            params.extend([page_size + 1, offset])
+            cursor.execute(sql, params)
+            root_comments, has_more = split_page(cursor.fetchall(), page_size)
+            user_cache.attach_usernames(cursor, root_comments)
+            cursor_for_next = next_cursor(root_comments, has_more, 'create_time')
+            for comment in root_comments:
+                del comment['create_time']
             
             # 获取所有一级评论的ID列表
             if not root_comments:
@@ -221,69 +323,38 @@ def get_comments_by_post_id(post_id, current_user):
                         'current_page': page,
                         'page_size': page_size,
                         'total_count': total_count,
-                        'total_pages': (total_count + page_size - 1) // page_size
+                        'total_pages': total_pages,
+                        'has_more': False,
+                        'next_cursor': None
                     }
                 })
             
             root_comment_ids = [c['id'] for c in root_comments]
             
-            # 关键修改：查询所有属于这些一级评论的子评论（无论层级）
-            # 使用JOIN找到最顶层的父评论ID（即一级评论ID）
-            sql_replies = """
-                WITH RECURSIVE comment_path (id, parent_id) AS (
-                    SELECT id, parent_id
-                    FROM post_comment
-                    WHERE parent_id IS NULL AND post_id = %s
-                    UNION ALL
-                    SELECT pc.id, pc.parent_id
-                    FROM post_comment pc
-                    INNER JOIN comment_path cp ON pc.parent_id = cp.id
-                )
-                SELECT 
-                    pc.id, 
-                    pc.user_id, 
-                    pc.post_id, 
-                    pc.parent_id, 
-                    pc.content,
-                    COALESCE(u.username, '匿名用户') AS username,
-                    cp.id AS root_comment_id
-                FROM post_comment pc
-                LEFT JOIN user u ON pc.user_id = u.id
-                INNER JOIN comment_path cp ON cp.id = (
-                    SELECT id FROM comment_path WHERE parent_id IS NULL AND id = cp.id
-                )
-                WHERE pc.post_id = %s
-                  AND pc.parent_id IS NOT NULL
-                ORDER BY pc.create_time ASC
-            """
-            cursor.execute(sql_replies, (post_id, post_id))
-            all_replies = cursor.fetchall()
-            
-            # 将回复分组到对应的根评论ID下
-            replies_map = {}
-            for reply in all_replies:
-                root_id = reply['root_comment_id']
-                # 只处理属于当前页的根评论的回复
-                if root_id in root_comment_ids:
-                    # 只保留回复的基本信息
-                    cleaned_reply = {
-                        'id': reply['id'],
-                        'user_id': reply['user_id'],
-                        'post_id': reply['post_id'],
-                        'parent_id': reply['parent_id'],  # 保持原始父ID，支持多级嵌套
-                        'content': reply['content'],
-                        'username': reply['username']
-                    }
-                    if root_id not in replies_map:
-                        replies_map[root_id] = []
-                    replies_map[root_id].append(cleaned_reply)
+            # 只取当前页一级评论的回复；懒加载模式下每个讨论串只取前 replies_limit 条
+            threads = fetch_thread_replies(cursor, root_comment_ids, limit=replies_limit)
 
             # 将回复挂载到对应一级评论的replies字段
             for comment in root_comments:
-                comment_id = comment['id']
-                comment['replies'] = replies_map.get(comment_id, [])
-
-            total_pages = (total_count + page_size - 1) // page_size
+                thread = threads.get(comment['id'], {'replies': [], 'reply_count': 0})
+                comment['replies'] = thread['replies']
+                if replies_limit is not None:
+                    comment['reply_count'] = thread['reply_count']
+                    has_more_replies = thread['reply_count'] > len(comment['replies'])
+                    if comment['replies']:
+                        comment['replies_cursor'] = next_cursor(comment['replies'], has_more_replies, 'create_time')
+                    else:
+                        # 一条都没有返回时，空游标表示从第一条回复开始
+                        comment['replies_cursor'] = '' if has_more_replies else None
+                for reply in comment['replies']:
+                    del reply['create_time']
+
+            # 嵌套模式：按 parent_id 重新组装为多层 replies（懒加载模式下回复不完整，不做嵌套）
+            if nested and replies_limit is None:
+                page_comments = list(root_comments)
+                for comment in root_comments:
+                    page_comments.extend(comment.pop('replies'))
+                root_comments = build_comment_tree(page_comments, max_depth=max_depth, max_replies=max_replies)
 
             return jsonify({
                 'data': root_comments,
@@ -291,7 +362,9 @@ def get_comments_by_post_id(post_id, current_user):
                     'current_page': page,
                     'page_size': page_size,
                     'total_count': total_count,
-                    'total_pages': total_pages
+                    'total_pages': total_pages,
+                    'has_more': has_more,
+                    'next_cursor': cursor_for_next
                 }
             })
                 
@@ -303,6 +376,125 @@ def get_comments_by_post_id(post_id, current_user):
 
 
 
+@post_comment_bp.route('/comments/<int:comment_id>/replies', methods=['GET'])
+@jwt_required
+@swag_from({
+    'tags': ['Comment'],
+    'security': [{'BearerAuth': []}],
+    'parameters': [
+        {
+            'name': 'comment_id',
+            'in': 'path',
+            'type': 'integer',
+            'required': True,
+            'description': '一级评论ID'
+        },
+        {
+            'name': 'cursor',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': '上一页返回的 next_cursor，或评论列表中的 replies_cursor；为空时从第一条回复开始'
+        },
+        {
+            'name': 'page_size',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'default': 10,
+            'description': '每页条数'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': '成功获取回复列表（按时间顺序，平铺，parent_id 保留回复关系）',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'data': {
+                        'type': 'array',
+                        'items': {
+                            '$ref': '#/definitions/Comment'
+                        }
+                    },
+                    'pagination': {
+                        'type': 'object',
+                        'properties': {
+                            'page_size': {'type': 'integer'},
+                            'has_more': {'type': 'boolean'},
+                            'next_cursor': {'type': ['string', 'null']}
+                        }
+                    }
+                }
+            }
+        },
+        400: {'description': '游标无效或评论不是一级评论'},
+        404: {'description': '评论未找到'},
+        500: {'description': '数据库连接失败或数据库错误'}
+    }
+})
+def get_comment_replies(comment_id, current_user):
+    page_size = request.args.get('page_size', default=10, type=int)
+    if page_size < 1 or page_size > 100:
+        page_size = 10
+
+    try:
+        after = decode_cursor(request.args.get('cursor'), 2)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({'error': 'Database connection failed'}), 500
+
+    try:
+        with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+            cursor.execute("SELECT id, root_id FROM post_comment WHERE id = %s", (comment_id,))
+            comment = cursor.fetchone()
+            if not comment:
+                return jsonify({'error': '评论未找到'}), 404
+            if comment['root_id'] is not None:
+                return jsonify({'error': '只能按一级评论分页获取回复'}), 400
+
+            # 同一讨论串内按 (create_time, id) 游标分页，走 (root_id, create_time, id) 索引
+            params = [comment_id]
+            keyset = ''
+            if after:
+                keyset = 'AND ' + keyset_condition('pc.create_time', 'pc.id', descending=False)
+                params.extend([after[0], after[0], after[1]])
+            sql = f"""
+                SELECT {REPLY_COLUMNS}
+                FROM post_comment pc
+                WHERE pc.root_id = %s
+                {keyset}
+                ORDER BY pc.create_time ASC, pc.id ASC
+                LIMIT %s
+            """
+            params.append(page_size + 1)
+            cursor.execute(sql, params)
+            replies, has_more = split_page(cursor.fetchall(), page_size)
+            user_cache.attach_usernames(cursor, replies)
+            cursor_for_next = next_cursor(replies, has_more, 'create_time')
+            for reply in replies:
+                del reply['create_time']
+
+            return jsonify({
+                'data': replies,
+                'pagination': {
+                    'page_size': page_size,
+                    'has_more': has_more,
+                    'next_cursor': cursor_for_next
+                }
+            })
+
+    except pymysql.Error as e:
+        print(f"Database error in get_comment_replies: {e}")
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+    finally:
+        conn.close()
+
+
+
 @post_comment_bp.route('/comments', methods=['POST'])
 @jwt_required
 @swag_from({
@@ -319,6 +511,7 @@ def get_comments_by_post_id(post_id, current_user):
             }
         },
         400: {'description': '请求参数缺失或无效'},
+        404: {'description': '父评论不存在或不属于该文章'},
         500: {'description': '数据库连接失败或数据库错误'}
     },
     'parameters': [
@@ -349,38 +542,40 @@ def add_comment(current_user):
     if not all([user_id, post_id, content]):
         return jsonify({'error': 'Missing required parameters: user_id, post_id, content'}), 400
 
-    # 如果是回复评论，拼接回复用户名
-    # 新增评论时，保持parent_id原样，不做扁平化处理
-    if parent_id is not None:
-        conn = get_db_connection()
-        if conn is None:
-            return jsonify({"error": "Database connection failed"}), 500
-        try:
-            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
-                cursor.execute("SELECT u.username FROM post_comment pc LEFT JOIN user u ON pc.user_id = u.id WHERE pc.id = %s", (parent_id,))
-                parent_comment = cursor.fetchone()
-                if parent_comment and parent_comment["username"]:
-                    content = f"回复{parent_comment['username']}：{content}"
-        except pymysql.Error as e:
-            print(f"Database error in fetching parent comment username: {e}")
-        finally:
-            conn.close()
-
     conn = get_db_connection()
     if conn is None:
         return jsonify({'error': 'Database connection failed'}), 500
 
     try:
         with conn.cursor() as cursor:
-            sql = "INSERT INTO post_comment (user_id, post_id, content, parent_id) VALUES (%s, %s, %s, %s)"
-            cursor.execute(sql, (user_id, post_id, content, parent_id))
-            conn.commit()
+            # 如果是回复评论，拼接回复用户名（走用户缓存），并记录所属一级评论 root_id
+            # 新增评论时，保持parent_id原样，不做扁平化处理
+            root_id = None
+            if parent_id is not None:
+                # 父评论必须属于同一篇文章，否则 root_id 会把回复挂到别的文章的讨论串下
+                cursor.execute(
+                    "SELECT root_id, user_id FROM post_comment WHERE id = %s AND post_id = %s", (parent_id, post_id)
+                )
+                parent_comment = cursor.fetchone()
+                if not parent_comment:
+                    return jsonify({'error': 'Parent comment not found'}), 404
+                # 父评论是一级评论时 root_id 为空，此时父评论自身就是根
+                root_id = parent_comment['root_id'] or parent_id
+                parent_user = user_cache.get_user(cursor, parent_comment['user_id'])
+                if parent_user and parent_user['username']:
+                    content = f"回复{parent_user['username']}：{content}"
+
+            sql = "INSERT INTO post_comment (user_id, post_id, content, parent_id, root_id) VALUES (%s, %s, %s, %s, %s)"
+            cursor.execute(sql, (user_id, post_id, content, parent_id, root_id))
             new_comment_id = cursor.lastrowid
 
-            sql_update_post = "UPDATE post SET comment_count = comment_count + 1 WHERE id = %s"
-            # 删除更新comment_count的SQL语句
-            # cursor.execute(sql_update_post, (post_id,))
+            # 评论与文章评论数在同一事务内提交
+            counters.adjust(cursor, 'post', post_id, 'comment_count', 1)
+            versions.bump(cursor, *versions.target_scopes('post', post_id))
             conn.commit()
+            response_cache.invalidate_post(post_id)
+            if parent_id is None:
+                totals.invalidate(('root_comments', post_id))
 
             return jsonify({'message': 'Comment added successfully', 'comment_id': new_comment_id}), 201
     except pymysql.Error as e:
@@ -2,8 +2,12 @@ from flask import Blueprint, jsonify
 from flasgger import swag_from
 from flask import Blueprint, request, jsonify
 from utils.db import get_db_connection
+from utils.post_queries import POST_SORTS, fetch_posts, fetch_post, fetch_post_detail, fetch_post_page, make_excerpt, parse_columns
+from utils.pagination import decode_cursor
+from utils import counters, like_buffer, likes, markdown_render, related, response_cache, suggest, versions
 import pymysql
 from utils.auth_utils import jwt_required, role_required
+from config import Config
 
 post_bp = Blueprint('post_bp', __name__)
 
@@ -12,9 +16,51 @@ post_bp = Blueprint('post_bp', __name__)
 @swag_from({
     'tags': ['Post'],
     'security': [{'BearerAuth': []}],
+    'parameters': [
+        {
+            'name': 'view',
+            'in': 'query',
+            'type': 'string',
+            'enum': ['full', 'summary'],
+            'required': False,
+            'default': 'full',
+            'description': 'full 返回正文；summary 只返回标题、摘要、计数和时间'
+        },
+        {
+            'name': 'fields',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': '逗号分隔的返回字段（优先于 view），可选 id, title, content, excerpt, like_count, comment_count, create_time, update_time；id 始终返回'
+        },
+        {
+            'name': 'sort',
+            'in': 'query',
+            'type': 'string',
+            'enum': ['newest', 'likes', 'comments'],
+            'required': False,
+            'default': 'newest',
+            'description': '排序：newest 最新，likes 最多点赞，comments 最多评论（传入时返回分页结构）'
+        },
+        {
+            'name': 'cursor',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': '游标分页：首页传空字符串，之后传上一页返回的 next_cursor（传入时返回分页结构）'
+        },
+        {
+            'name': 'per_page',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'default': 10,
+            'description': '每页条数，1-100（传入时返回分页结构）'
+        }
+    ],
     'responses': {
         200: {
-            'description': '成功获取所有文章',
+            'description': '成功获取文章列表；未传 sort/cursor/per_page 时返回全部文章数组，否则返回 {data, pagination}',
             'schema': {
                 'type': 'array',
                 'items': {
@@ -22,47 +68,59 @@ post_bp = Blueprint('post_bp', __name__)
                     'properties': {
                         'id': {'type': 'integer', 'description': '文章ID'},
                         'title': {'type': 'string', 'description': '文章标题'},
-                        'content': {'type': 'string', 'description': '文章内容'}
+                        'content': {'type': 'string', 'description': '文章内容（full）'},
+                        'excerpt': {'type': 'string', 'description': '文章摘要（summary）'},
+                        'like_count': {'type': 'integer', 'description': '点赞数'},
+                        'comment_count': {'type': 'integer', 'description': '评论数'},
+                        'create_time': {'type': 'string', 'format': 'date-time', 'description': '发布时间（summary）'},
+                        'update_time': {'type': 'string', 'format': 'date-time', 'description': '最后修改时间（summary）'}
                     }
                 }
             }
         },
+        400: {'description': 'view、fields、sort 或 cursor 参数无效'},
         500: {'description': '数据库连接失败或数据库错误'}
     }
 })
+@response_cache.cached(response_cache.post_tags)
+@versions.conditional(versions.post_scopes, max_stale=Config.LIST_ETAG_MAX_STALE)
 def get_all_posts(current_user):
+    # 传入任一分页参数时返回分页结构，否则保持旧的全量数组
+    paginated = any(name in request.args for name in ('sort', 'cursor', 'per_page'))
+    sort = request.args.get('sort', 'newest')
+    per_page = request.args.get('per_page', default=10, type=int)
+    if per_page < 1 or per_page > 100:
+        per_page = 10
+    try:
+        columns = parse_columns(request.args.get('view'), request.args.get('fields'))
+        if sort not in POST_SORTS:
+            raise ValueError(f"sort must be one of {', '.join(POST_SORTS)}")
+        after = decode_cursor(request.args.get('cursor'), 2)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     conn = get_db_connection()
     if conn is None:
         return jsonify({'error': 'Database connection failed'}), 500
     
     try:
         with conn.cursor() as cursor:
-            # 只获取基本字段，移除计数字段
-            sql_posts = "SELECT id, title, content FROM post ORDER BY id ASC"
-            cursor.execute(sql_posts)
-            posts = cursor.fetchall()
-            
-            # 为每篇文章实时计算
-            for post in posts:
-                post_id = post['id']
-                
-                # 实时计算点赞数
-                sql_likes = "SELECT COUNT(*) as like_count FROM post_like WHERE post_id = %s"
-                cursor.execute(sql_likes, (post_id,))
-                result = cursor.fetchone()
-                like_count = result['like_count'] if result else 0
-                
-                # 实时计算评论数
-                # 删除所有包含comment_count的字段引用
-                # 确保所有统计都通过COUNT实现
-                sql_comments = "SELECT COUNT(*) as comment_count FROM post_comment WHERE post_id = %s"
-                cursor.execute(sql_comments, (post_id,))
-                result = cursor.fetchone()
-                comment_count = result['comment_count'] if result else 0
-                
-                # 添加计算值
-                post['like_count'] = like_count
-                post['comment_count'] = comment_count
+            if paginated:
+                posts, has_more, cursor_for_next = fetch_post_page(
+                    cursor, columns=columns, sort=sort, after=after, per_page=per_page
+                )
+                return jsonify({
+                    'data': posts,
+                    'pagination': {
+                        'sort': sort,
+                        'per_page': per_page,
+                        'has_more': has_more,
+                        'next_cursor': cursor_for_next
+                    }
+                })
+
+            # 文章与点赞数、评论数一次查询取回，只查请求的列
+            posts = fetch_posts(cursor, columns=columns)
             
             return jsonify(posts)
                 
@@ -97,7 +155,6 @@ def get_all_posts(current_user):
                 } 
             } 
         }, 
-        400: {'description': 'Invalid post ID or already liked/unliked'}, 
         404: {'description': 'Post not found'}, 
         500: {'description': 'Database error'} 
     } 
@@ -114,89 +171,52 @@ def like_post(current_user, post_id):
 
     try: 
         with conn.cursor() as cursor: 
-            # 1. 验证文章是否存在 
-            sql_check_post = "SELECT id, like_count FROM post WHERE id = %s" 
-            cursor.execute(sql_check_post, (post_id,)) 
-            post = cursor.fetchone() 
-            
-            if not post: 
-                return jsonify({ 
-                    'success': False, 
-                    'message': '文章不存在', 
-                    'error_code': 'POST_NOT_FOUND' 
-                }), 404 
-
-            user_id = current_user['user_id'] 
-            
-            # 2. 检查当前点赞状态 
-            sql_check_like = """ 
-                SELECT id FROM post_like 
-                WHERE post_id = %s AND user_id = %s 
-            """ 
-            cursor.execute(sql_check_like, (post_id, user_id)) 
-            existing_like = cursor.fetchone() 
-
-            if existing_like: 
-                # 3. 已点赞 -> 执行取消点赞 
-                # 3.1 删除点赞记录 
-                sql_delete_like = """ 
-                    DELETE FROM post_like 
-                    WHERE id = %s 
-                """ 
-                cursor.execute(sql_delete_like, (existing_like['id'],)) 
-                
-                # 3.2 移除更新文章点赞计数
-                # 4.2 移除更新文章点赞计数
-                # 获取实时点赞数
-                cursor.execute("SELECT COUNT(*) as like_count FROM post_like WHERE post_id = %s", (post_id,))
-                updated_count = cursor.fetchone()['like_count']
-                
-                conn.commit() 
-                return jsonify({ 
-                    'success': True, 
-                    'message': '已取消点赞', 
-                    'like_count': updated_count 
-                }), 200 
-            
-            else: 
-                # 4. 未点赞 -> 执行点赞 
-                # 4.1 添加点赞记录 
-                sql_insert_like = """ 
-                    INSERT INTO post_like (post_id, user_id) 
-                    VALUES (%s, %s) 
-                """ 
-                cursor.execute(sql_insert_like, (post_id, user_id)) 
-                
-                # 4.2 更新文章点赞计数 
-                sql_increment_likes = """ 
-                    UPDATE post 
-                    SET like_count = like_count + 1 
-                    WHERE id = %s 
-                """ 
-                cursor.execute(sql_increment_likes, (post_id,)) 
-                
-                # 4.3 获取更新后的点赞数 
-                cursor.execute("SELECT like_count FROM post WHERE id = %s", (post_id,)) 
-                updated_count = cursor.fetchone()['like_count'] 
-                
-                conn.commit() 
-                return jsonify({ 
-                    'success': True, 
-                    'message': '点赞成功', 
-                    'like_count': updated_count 
-                }), 200 
-
-    except pymysql.IntegrityError as e: 
-        conn.rollback() 
-        if e.args[0] == 1062:  # 唯一约束违反(重复点赞) 
-            return jsonify({ 
-                'success': False, 
-                'message': '操作失败，请勿重复操作', 
-                'error_code': 'DUPLICATE_LIKE_ACTION' 
-            }), 400 
-        else: 
-            return jsonify({'error': f'数据库完整性错误: {str(e)}'}), 500 
-            
+            # 写回模式：只记录到缓冲，由后台线程批量落库
+            if like_buffer.enabled():
+                result = like_buffer.settle(cursor, 'post', post_id, current_user['user_id'])
+                if result is None:
+                    return jsonify({
+                        'success': False,
+                        'message': '文章不存在',
+                        'error_code': 'POST_NOT_FOUND'
+                    }), 404
+                liked, updated_count = result
+                return jsonify({
+                    'success': True,
+                    'message': '点赞成功' if liked else '已取消点赞',
+                    'like_count': updated_count
+                }), 200
+
+            user_id = current_user['user_id']
+
+            # 锁定目标行并读取当前点赞状态（JOIN 的点赞记录同样加锁读取），同一目标的并发切换依次执行，
+            # 读到的状态在提交前不会被其他请求改变，连续点击不会重复点赞或重复计数
+            cursor.execute("""
+                SELECT t.id, l.user_id AS liked_by
+                FROM `post` t
+                LEFT JOIN post_like l ON l.post_id = t.id AND l.user_id = %s
+                WHERE t.id = %s
+                FOR UPDATE
+            """, (user_id, post_id))
+            row = cursor.fetchone()
+            if not row:
+                return jsonify({
+                    'success': False,
+                    'message': '文章不存在',
+                    'error_code': 'POST_NOT_FOUND'
+                }), 404
+
+            liked = row['liked_by'] is None
+            updated_count = likes.set_like(cursor, 'post', post_id, user_id, liked)
+            versions.bump(cursor, *versions.target_scopes('post', post_id))
+            conn.commit()
+            response_cache.invalidate_post(post_id)
+            return jsonify({
+                'success': True,
+                'message': '点赞成功' if liked else '已取消点赞',
+                'like_count': updated_count
+            }), 200
+
     except pymysql.Error as e: 
         conn.rollback() 
         return jsonify({'error': f'数据库错误: {str(e)}'}), 500 
@@ -204,6 +224,81 @@ def like_post(current_user, post_id):
     finally: 
         conn.close()
 
+@post_bp.route('/post/<int:post_id>/like', methods=['PUT', 'DELETE'])
+@jwt_required
+@swag_from({
+    'tags': ['Post'],
+    'security': [{'BearerAuth': []}],
+    'parameters': [
+        {
+            'name': 'post_id',
+            'in': 'path',
+            'type': 'integer',
+            'required': True,
+            'description': '文章ID'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'PUT 点赞 / DELETE 取消点赞，重复请求结果相同',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'success': {'type': 'boolean', 'description': '操作是否成功'},
+                    'liked': {'type': 'boolean', 'description': '当前是否已点赞'},
+                    'like_count': {'type': 'integer', 'description': '更新后的点赞数'}
+                }
+            }
+        },
+        404: {'description': '文章不存在'},
+        500: {'description': '数据库错误'}
+    }
+})
+def set_post_like(current_user, post_id):
+    """
+    幂等点赞
+    - PUT：点赞，已点赞时不做变更
+    - DELETE：取消点赞，未点赞时不做变更
+    """
+    liked = request.method == 'PUT'
+    user_id = current_user['user_id']
+
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({'error': 'Database connection failed'}), 500
+
+    try:
+        with conn.cursor() as cursor:
+            if like_buffer.enabled():
+                result = like_buffer.settle(cursor, 'post', post_id, user_id, liked)
+                updated_count = result[1] if result else None
+            else:
+                updated_count = likes.set_like(cursor, 'post', post_id, user_id, liked)
+                if updated_count is not None:
+                    versions.bump(cursor, *versions.target_scopes('post', post_id))
+                conn.commit()
+                if updated_count is not None:
+                    response_cache.invalidate_post(post_id)
+
+            if updated_count is None:
+                return jsonify({
+                    'success': False,
+                    'message': '文章不存在',
+                    'error_code': 'POST_NOT_FOUND'
+                }), 404
+
+            return jsonify({
+                'success': True,
+                'liked': liked,
+                'like_count': updated_count
+            }), 200
+
+    except pymysql.Error as e:
+        conn.rollback()
+        return jsonify({'error': f'数据库错误: {str(e)}'}), 500
+    finally:
+        conn.close()
+
 @post_bp.route('/post', methods=['POST'])
 @jwt_required
 @role_required(['author'])
@@ -248,9 +343,16 @@ def create_post(current_user):
 
     try:
         with conn.cursor() as cursor:
-            sql = "INSERT INTO post (title, content, user_id) VALUES (%s, %s, %s)"
-            cursor.execute(sql, (title, content, user_id))
+            # 摘要与 Markdown 渲染结果在写入时生成，读取时直接使用
+            digest = markdown_render.store(cursor, content)
+            sql = "INSERT INTO post (title, content, excerpt, content_hash, user_id) VALUES (%s, %s, %s, %s, %s)"
+            cursor.execute(sql, (title, content, make_excerpt(content), digest, user_id))
+            post_id = cursor.lastrowid
+            versions.bump(cursor, 'posts')
             conn.commit()
+            response_cache.invalidate('posts')
+            suggest.index.add('post', post_id, title)
+            related.post_changed(post_id, title, content)
             return jsonify({'message': 'Post created successfully'}), 201
     except pymysql.Error as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
@@ -315,6 +417,10 @@ def update_post(current_user, post_id):
             if content:
                 updates.append("content = %s")
                 params.append(content)
+                updates.append("excerpt = %s")
+                params.append(make_excerpt(content))
+                updates.append("content_hash = %s")
+                params.append(markdown_render.store(cursor, content))
 
             if not updates:
                 return jsonify({'error': 'No valid fields to update'}), 400
@@ -322,11 +428,19 @@ def update_post(current_user, post_id):
             sql = f"UPDATE post SET {', '.join(updates)} WHERE id = %s"
             params.append(post_id)
             cursor.execute(sql, tuple(params))
-            conn.commit()
-
             if cursor.rowcount == 0:
                 return jsonify({'error': 'Post not found'}), 404
 
+            versions.bump(cursor, 'posts', f'post:{post_id}')
+            conn.commit()
+
+            response_cache.invalidate_post(post_id)
+            if title:
+                suggest.index.add('post', post_id, title)
+            # 只改了标题或正文之一时，取回完整内容重新计算相关文章
+            post = fetch_post(cursor, post_id, columns=('id', 'title', 'content'))
+            if post:
+                related.post_changed(post_id, post['title'], post['content'])
             return jsonify({'message': 'Post updated successfully'}), 200
     except pymysql.Error as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
@@ -365,11 +479,15 @@ def delete_post(current_user, post_id):
         with conn.cursor() as cursor:
             sql = "DELETE FROM post WHERE id = %s"
             cursor.execute(sql, (post_id,))
-            conn.commit()
-
             if cursor.rowcount == 0:
                 return jsonify({'error': 'Post not found'}), 404
 
+            versions.bump(cursor, 'posts', f'post:{post_id}')
+            conn.commit()
+
+            response_cache.invalidate_post(post_id)
+            suggest.index.remove('post', post_id)
+            related.post_removed(post_id)
             return jsonify({'message': 'Post deleted successfully'}), 200
     except pymysql.Error as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
@@ -397,7 +515,22 @@ def delete_post(current_user, post_id):
                 'properties': {
                     'id': {'type': 'integer', 'description': '文章ID'},
                     'title': {'type': 'string', 'description': '文章标题'},
-                    'content': {'type': 'string', 'description': '文章内容'}
+                    'content': {'type': 'string', 'description': '文章内容（Markdown 原文）'},
+                    'content_html': {'type': 'string', 'description': '服务端预渲染的 HTML'},
+                    'toc': {
+                        'type': 'array',
+                        'description': '目录，id 对应 content_html 中标题的锚点',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'level': {'type': 'integer'},
+                                'id': {'type': 'string'},
+                                'text': {'type': 'string'}
+                            }
+                        }
+                    },
+                    'like_count': {'type': 'integer', 'description': '点赞数'},
+                    'comment_count': {'type': 'integer', 'description': '评论数'}
                 }
             }
         },
@@ -405,6 +538,8 @@ def delete_post(current_user, post_id):
         500: {'description': '数据库连接失败或数据库错误'}
     }
 })
+@response_cache.cached(response_cache.post_tags)
+@versions.conditional(versions.post_scopes)
 def get_post_by_id(current_user, post_id):
     conn = get_db_connection()
     if conn is None:
@@ -412,30 +547,12 @@ def get_post_by_id(current_user, post_id):
     
     try:
         with conn.cursor() as cursor:
-            # 只获取基本字段，移除计数字段
-            sql_post = "SELECT id, title, content FROM post WHERE id = %s"
-            cursor.execute(sql_post, (post_id,))
-            post = cursor.fetchone()
+            post = fetch_post_detail(cursor, post_id)
             
             if not post:
                 return jsonify({'error': 'Post not found'}), 404
             
-            # 实时计算点赞数
-            sql_likes = "SELECT COUNT(*) as like_count FROM post_like WHERE post_id = %s"
-            cursor.execute(sql_likes, (post_id,))
-            result = cursor.fetchone()
-            like_count = result['like_count'] if result else 0
-            
-            # 实时计算评论数
-            sql_comments = "SELECT COUNT(*) as comment_count FROM post_comment WHERE post_id = %s"
-            cursor.execute(sql_comments, (post_id,))
-            result = cursor.fetchone()
-            comment_count = result['comment_count'] if result else 0
-            
-            # 添加计算值到响应
-            post['like_count'] = like_count
-            post['comment_count'] = comment_count
-            
+            conn.commit()  # 补渲染时会写入 post_render
             return jsonify(post)
                 
     except pymysql.Error as e:
@@ -445,6 +562,79 @@ def get_post_by_id(current_user, post_id):
 
 
 
+@post_bp.route('/post/<int:post_id>/related', methods=['GET'])
+@jwt_required
+@swag_from({
+    'tags': ['Post'],
+    'security': [{'BearerAuth': []}],
+    'parameters': [
+        {
+            'name': 'post_id',
+            'in': 'path',
+            'type': 'integer',
+            'required': True,
+            'description': '文章ID'
+        },
+        {
+            'name': 'limit',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'default': 5,
+            'description': '返回条数，最多 RELATED_TOP_K 条'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': '按 TF-IDF 余弦相似度降序排列的相关文章',
+            'schema': {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'properties': {
+                        'id': {'type': 'integer', 'description': '文章ID'},
+                        'title': {'type': 'string', 'description': '文章标题'},
+                        'excerpt': {'type': 'string', 'description': '文章摘要'},
+                        'like_count': {'type': 'integer', 'description': '点赞数'},
+                        'comment_count': {'type': 'integer', 'description': '评论数'},
+                        'score': {'type': 'number', 'description': '相似度'}
+                    }
+                }
+            }
+        },
+        404: {'description': '未找到文章'},
+        500: {'description': '数据库连接失败或数据库错误'}
+    }
+})
+def get_related_posts(current_user, post_id):
+    limit = request.args.get('limit', default=5, type=int)
+    if limit < 1:
+        limit = 5
+
+    # 相关列表已预先算好，这里只查表补全文章信息
+    scores = dict(related.related_posts(post_id, limit))
+
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({'error': 'Database connection failed'}), 500
+
+    try:
+        with conn.cursor() as cursor:
+            if post_id not in related.index and not fetch_post(cursor, post_id, columns=('id',)):
+                return jsonify({'error': 'Post not found'}), 404
+            posts = fetch_posts(
+                cursor, columns=('id', 'title', 'excerpt', 'like_count', 'comment_count'), post_ids=scores
+            )
+            for post in posts:
+                post['score'] = scores[post['id']]
+            posts.sort(key=lambda post: -post['score'])
+            return jsonify(posts)
+    except pymysql.Error as e:
+        print(f"Database error in get_related_posts: {e}")
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+    finally:
+        conn.close()
+
 @post_bp.route('/post/<int:post_id>/like', methods=['POST'])
 @jwt_required
 @swag_from({
@@ -465,18 +655,7 @@ def get_posts(current_user):
     
     try:
         with conn.cursor() as cursor:
-            sql = "SELECT id, title FROM post"
-            cursor.execute(sql)
-            posts = cursor.fetchall()
-            for post in posts:
-                post_id = post['id']
-               
-                cursor.execute("SELECT COUNT(*) as like_count FROM post_like WHERE post_id = %s", (post_id,))
-                result = cursor.fetchone()
-                post['like_count'] = result['like_count'] if result else 0
-                cursor.execute("SELECT COUNT(*) as comment_count FROM post_comment WHERE post_id = %s", (post_id,))
-                result = cursor.fetchone()
-                post['comment_count'] = result['comment_count'] if result else 0
+            posts = fetch_posts(cursor, columns=('id', 'title', 'like_count', 'comment_count'))
             return jsonify(posts)
     except pymysql.Error as e:
         print(f"Database error in get_posts: {e}")
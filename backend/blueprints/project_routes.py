@@ -6,6 +6,7 @@ import pymysql
 import json
 import os
 from utils.auth_utils import jwt_required, role_required
+from utils import suggest, versions
 
 project_bp = Blueprint('project_bp', __name__)
 
@@ -38,6 +39,7 @@ project_bp = Blueprint('project_bp', __name__)
         500: {'description': '数据库连接失败或数据库错误'}
     }
 })
+@versions.conditional(versions.project_scopes)
 def get_projects(current_user):
     conn = get_db_connection()
     if conn is None:
@@ -137,7 +139,10 @@ def create_project(current_user):
         with conn.cursor() as cursor:
             sql = "INSERT INTO project (name, description, img, technologies, start_date, end_date, role, demo_url, project_url) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)"
             cursor.execute(sql, (name, description, img, technologies, start_date, end_date, role, demo_url, project_url))
+            project_id = cursor.lastrowid
+            versions.bump(cursor, 'projects')
             conn.commit()
+            suggest.index.add('project', project_id, name)
             return jsonify({'message': 'Project created successfully'}), 201
     except pymysql.Error as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
@@ -232,11 +237,14 @@ def update_project(current_user, project_id):
             sql = f"UPDATE project SET {', '.join(updates)} WHERE id = %s"
             params.append(project_id)
             cursor.execute(sql, tuple(params))
-            conn.commit()
-
             if cursor.rowcount == 0:
                 return jsonify({'error': 'Project not found'}), 404
 
+            versions.bump(cursor, 'projects', f'project:{project_id}')
+            conn.commit()
+
+            if data.get('name'):
+                suggest.index.add('project', project_id, data['name'])
             return jsonify({'message': 'Project updated successfully'}), 200
     except pymysql.Error as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
@@ -275,11 +283,13 @@ def delete_project(current_user, project_id):
         with conn.cursor() as cursor:
             sql = "DELETE FROM project WHERE id = %s"
             cursor.execute(sql, (project_id,))
-            conn.commit()
-
             if cursor.rowcount == 0:
                 return jsonify({'error': 'Project not found'}), 404
 
+            versions.bump(cursor, 'projects', f'project:{project_id}')
+            conn.commit()
+
+            suggest.index.remove('project', project_id)
             return jsonify({'message': 'Project deleted successfully'}), 200
     except pymysql.Error as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
@@ -319,6 +329,7 @@ def delete_project(current_user, project_id):
         }
     ]
 })
+@versions.conditional(versions.project_scopes)
 def get_project(current_user, project_id):
     conn = get_db_connection()
     if conn is None:
@@ -0,0 +1,203 @@
+from flask import Blueprint, jsonify, request
+from flasgger import swag_from
+import pymysql
+from utils.auth_utils import jwt_required
+from utils.db import get_db_connection
+from utils.pagination import split_page
+from utils.search import MAX_QUERY_LENGTH, SEARCH_SOURCES, highlight, query_terms, search
+from utils import suggest
+
+search_bp = Blueprint('search_bp', __name__)
+
+
+def _text(value):
+    # project 表部分列为二进制类型，取出后是 bytes
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+@search_bp.route('/search', methods=['GET'])
+@jwt_required
+@swag_from({
+    'tags': ['Search'],
+    'security': [{'BearerAuth': []}],
+    'parameters': [
+        {
+            'name': 'q',
+            'in': 'query',
+            'type': 'string',
+            'required': True,
+            'description': f'检索词，最长 {MAX_QUERY_LENGTH} 个字符'
+        },
+        {
+            'name': 'type',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': '逗号分隔的检索范围：post, moment, project，默认全部'
+        },
+        {
+            'name': 'page',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'default': 1,
+            'description': '页码，从1开始'
+        },
+        {
+            'name': 'per_page',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'default': 10,
+            'description': '每页条数，1-50'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': '按相关度排序的检索结果，title/snippet 中命中部分以 <mark> 标记，其余内容已做 HTML 转义',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'data': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'type': {'type': 'string', 'description': 'post / moment / project'},
+                                'id': {'type': 'integer'},
+                                'title': {'type': ['string', 'null'], 'description': '高亮后的标题（动态没有标题）'},
+                                'snippet': {'type': 'string', 'description': '高亮后的命中片段'},
+                                'score': {'type': 'number', 'description': '相关度'}
+                            }
+                        }
+                    },
+                    'pagination': {
+                        'type': 'object',
+                        'properties': {
+                            'page': {'type': 'integer'},
+                            'per_page': {'type': 'integer'},
+                            'has_more': {'type': 'boolean'}
+                        }
+                    }
+                }
+            }
+        },
+        400: {'description': '检索词为空、过长或 type 无效'},
+        500: {'description': '数据库连接失败或数据库错误'}
+    }
+})
+def search_content(current_user):
+    q = (request.args.get('q') or '').strip()
+    if not q:
+        return jsonify({'error': 'Missing search query: q'}), 400
+    if len(q) > MAX_QUERY_LENGTH:
+        return jsonify({'error': f'Search query too long (max {MAX_QUERY_LENGTH} characters)'}), 400
+
+    types = [t.strip() for t in request.args.get('type', '').split(',') if t.strip()]
+    unknown = [t for t in types if t not in SEARCH_SOURCES]
+    if unknown:
+        return jsonify({'error': f"Unknown type: {', '.join(unknown)}"}), 400
+
+    page = request.args.get('page', default=1, type=int)
+    per_page = request.args.get('per_page', default=10, type=int)
+    if page < 1:
+        page = 1
+    if per_page < 1 or per_page > 50:
+        per_page = 10
+
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({'error': 'Database connection failed'}), 500
+
+    try:
+        with conn.cursor() as cursor:
+            # 多取一行用于判断 has_more
+            rows = search(cursor, q, types=types, limit=per_page + 1, offset=(page - 1) * per_page)
+            rows, has_more = split_page(rows, per_page)
+
+            terms = query_terms(q)
+            results = []
+            for row in rows:
+                title = _text(row['title'])
+                results.append({
+                    'type': row['type'],
+                    'id': row['id'],
+                    'title': highlight(title, terms, width=len(title)) if title else None,
+                    'snippet': highlight(_text(row['body']), terms),
+                    'score': round(float(row['score']), 4)
+                })
+
+            return jsonify({
+                'data': results,
+                'pagination': {
+                    'page': page,
+                    'per_page': per_page,
+                    'has_more': has_more
+                }
+            })
+    except pymysql.Error as e:
+        print(f"Database error in search_content: {e}")
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+    finally:
+        conn.close()
+
+
+@search_bp.route('/suggest', methods=['GET'])
+@jwt_required
+@swag_from({
+    'tags': ['Search'],
+    'security': [{'BearerAuth': []}],
+    'parameters': [
+        {
+            'name': 'q',
+            'in': 'query',
+            'type': 'string',
+            'required': True,
+            'description': '标题前缀（不区分大小写）'
+        },
+        {
+            'name': 'type',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': '逗号分隔的范围：post, project，默认全部'
+        },
+        {
+            'name': 'limit',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'default': 8,
+            'description': '最多返回条数，1-20'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': '按标题字典序排列的联想结果',
+            'schema': {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'properties': {
+                        'type': {'type': 'string', 'description': 'post / project'},
+                        'id': {'type': 'integer'},
+                        'title': {'type': 'string'}
+                    }
+                }
+            }
+        },
+        400: {'description': 'type 无效'}
+    }
+})
+def suggest_titles(current_user):
+    q = (request.args.get('q') or '')[:MAX_QUERY_LENGTH]
+    types = [t.strip() for t in request.args.get('type', '').split(',') if t.strip()]
+    unknown = [t for t in types if t not in suggest.SUGGEST_SOURCES]
+    if unknown:
+        return jsonify({'error': f"Unknown type: {', '.join(unknown)}"}), 400
+    limit = request.args.get('limit', default=8, type=int)
+    if limit < 1 or limit > 20:
+        limit = 8
+
+    # 纯内存查询，不占用数据库连接（索引过期时才会触发一次重建）
+    return jsonify(suggest.suggest(q, limit=limit, types=set(types) or None))
@@ -4,6 +4,7 @@ from flask import Blueprint, request, jsonify
 from utils.db import get_db_connection
 from werkzeug.security import generate_password_hash
 from utils.auth_utils import jwt_required, role_required
+from utils import user_cache
 import pymysql
 
 user_bp = Blueprint('user_bp', __name__)
@@ -63,6 +64,8 @@ def register():
             default_role = 'guest'
             cursor.execute("INSERT INTO user (username, password, role) VALUES (%s, %s, %s)", (username, hashed_password, default_role))
             conn.commit()
+            # 该 ID 之前可能被作为不存在的用户缓存过
+            user_cache.invalidate(cursor.lastrowid)
             return jsonify({'message': 'User registered successfully', 'role': default_role}), 201
     except pymysql.Error as e:
         print(f"Database error in register: {e}")
@@ -0,0 +1,277 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from config import Config
+from utils.db import get_db_connection
+from utils import blob_store, counters, image_variants, markdown_render, response_cache, static_files, versions
+from utils.post_queries import make_excerpt
+
+counters_cli = AppGroup('counters', help='冗余计数维护')
+posts_cli = AppGroup('posts', help='文章数据维护')
+blobs_cli = AppGroup('blobs', help='图片存储维护')
+assets_cli = AppGroup('assets', help='静态文件构建')
+
+
+@counters_cli.command('reconcile')
+@click.option('--target', type=click.Choice(sorted(counters.COUNTER_TARGETS)), multiple=True,
+              help='只对账指定目标，可重复指定，默认全部')
+@click.option('--batch-size', default=500, show_default=True, help='每批处理的行数')
+def reconcile_counters(target, batch_size):
+    """按源表修复 like_count / comment_count 的漂移"""
+    conn = get_db_connection()
+    if conn is None:
+        raise click.ClickException('Database connection failed')
+    try:
+        repaired = counters.reconcile(conn, targets=target or None, batch_size=batch_size)
+        if any(repaired.values()):
+            # 计数被修正，所有读接口的 ETag 一起失效
+            with conn.cursor() as cursor:
+                versions.bump(cursor, versions.GLOBAL_SCOPE)
+            conn.commit()
+    finally:
+        conn.close()
+    # 计数被修正后缓存的文章响应可能已过时（file 后端下对运行中的 worker 同样生效）
+    if any(repaired.values()):
+        response_cache.clear()
+    for key, count in repaired.items():
+        click.echo(f'{key}: repaired {count} rows')
+
+
+@posts_cli.command('excerpts')
+@click.option('--batch-size', default=200, show_default=True, help='每批处理的文章数')
+def backfill_excerpts(batch_size):
+    """按当前正文重新生成全部文章的摘要"""
+    conn = get_db_connection()
+    if conn is None:
+        raise click.ClickException('Database connection failed')
+    updated = 0
+    last_id = 0
+    try:
+        while True:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT id, content, excerpt FROM post WHERE id > %s ORDER BY id ASC LIMIT %s",
+                    (last_id, batch_size)
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                changes = []
+                for row in rows:
+                    excerpt = make_excerpt(row['content'])
+                    if excerpt != row['excerpt']:
+                        changes.append((excerpt, row['id']))
+                if changes:
+                    # 只改摘要，不应触发 update_time 变化
+                    cursor.executemany(
+                        "UPDATE post SET excerpt = %s, update_time = update_time WHERE id = %s", changes
+                    )
+                    versions.bump(cursor, 'posts')
+                conn.commit()
+                updated += len(changes)
+                last_id = rows[-1]['id']
+    finally:
+        conn.close()
+    if updated:
+        response_cache.invalidate('posts')
+    click.echo(f'excerpts: updated {updated} posts')
+
+
+@posts_cli.command('render')
+@click.option('--workers', type=int, default=None, help='渲染进程数，默认为 CPU 核数')
+@click.option('--batch-size', default=200, show_default=True, help='每批读取的文章数')
+@click.option('--force', is_flag=True, help='忽略已有渲染结果，全部重新渲染')
+def render_posts(workers, batch_size, force):
+    """用进程池把全部文章的 Markdown 渲染为 HTML，并更新 post.content_hash"""
+    conn = get_db_connection()
+    if conn is None:
+        raise click.ClickException('Database connection failed')
+    rendered = 0
+    changed_posts = []
+    last_id = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while True:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT id, content, content_hash FROM post WHERE id > %s ORDER BY id ASC LIMIT %s",
+                        (last_id, batch_size)
+                    )
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+                    hashes = {row['id']: markdown_render.content_hash(row['content']) for row in rows}
+
+                    # 同一批内相同正文只渲染一次，已存在的结果默认跳过
+                    pending = {hashes[row['id']]: row['content'] for row in rows}
+                    if not force:
+                        cursor.execute(
+                            "SELECT content_hash FROM post_render WHERE content_hash IN %s", (tuple(pending),)
+                        )
+                        for row in cursor.fetchall():
+                            pending.pop(row['content_hash'], None)
+                    entries = list(pool.map(markdown_render.render_entry, pending.values(), chunksize=8))
+                    markdown_render.save_entries(cursor, entries)
+                    rendered += len(entries)
+
+                    changed = [
+                        row['id'] for row in rows
+                        if row['content_hash'] != hashes[row['id']] or hashes[row['id']] in pending
+                    ]
+                    relink = [(hashes[row['id']], row['id']) for row in rows if row['content_hash'] != hashes[row['id']]]
+                    if relink:
+                        cursor.executemany(
+                            "UPDATE post SET content_hash = %s, update_time = update_time WHERE id = %s", relink
+                        )
+                    versions.bump(cursor, *(f'post:{post_id}' for post_id in changed))
+                conn.commit()
+                changed_posts.extend(changed)
+                last_id = rows[-1]['id']
+    finally:
+        conn.close()
+    for post_id in changed_posts:
+        response_cache.invalidate(f'post:{post_id}')
+    click.echo(f'render: rendered {rendered} documents, updated {len(changed_posts)} posts')
+
+
+@posts_cli.command('highlight-css')
+@click.option('--output', type=click.Path(dir_okay=False), default=None,
+              help='输出文件，默认为 frontend/MyBlog/src/assets/highlight.css')
+def write_highlight_css(output):
+    """生成代码高亮样式表，前端入口引入该文件（修改 HIGHLIGHT_STYLE 后执行，再重新构建前端）"""
+    output = output or os.path.join(current_app.root_path, '..', 'frontend', 'MyBlog', 'src', 'assets', 'highlight.css')
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write('/* 由 `flask posts highlight-css` 生成，请勿手动修改 */\n')
+        f.write(markdown_render.css())
+        f.write('\n')
+    click.echo(f'highlight-css: wrote {output}')
+
+
+@blobs_cli.command('gc')
+@click.option('--min-age', default=3600, show_default=True, help='只清理修改时间早于该秒数的文件')
+@click.option('--dry-run', is_flag=True, help='只列出将被删除的文件')
+def collect_blobs(min_age, dry_run):
+    """删除没有 image_blob 记录的文件（上传事务失败遗留）和残留的临时文件"""
+    blobs, partials = blob_store.scan(min_age)
+    conn = get_db_connection()
+    if conn is None:
+        raise click.ClickException('Database connection failed')
+    orphans = []
+    try:
+        with conn.cursor() as cursor:
+            for start in range(0, len(blobs), 500):
+                batch = blobs[start:start + 500]
+                placeholders = ', '.join(['%s'] * len(batch))
+                cursor.execute(
+                    f"SELECT content_hash FROM image_blob WHERE content_hash IN ({placeholders})",
+                    [digest for digest, _ in batch]
+                )
+                known = {row['content_hash'] for row in cursor.fetchall()}
+                orphans.extend(path for digest, path in batch if digest not in known)
+    finally:
+        conn.close()
+    for path in orphans + partials:
+        if dry_run:
+            click.echo(path)
+        else:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    click.echo(f'gc: {len(orphans)} orphaned blobs, {len(partials)} partial uploads'
+               + (' (dry run)' if dry_run else ' removed'))
+
+
+@blobs_cli.command('variants')
+@click.option('--workers', type=int, default=None, help='处理进程数，默认为 CPU 核数')
+@click.option('--batch-size', default=100, show_default=True, help='每批读取的图片数')
+@click.option('--force', is_flag=True, help='忽略已有结果，全部重新生成（修改 IMAGE_VARIANT_WIDTHS 后使用）')
+def generate_variants(workers, batch_size, force):
+    """用进程池为尚未处理的图片生成缩放版本"""
+    conn = get_db_connection()
+    if conn is None:
+        raise click.ClickException('Database connection failed')
+    processed = 0
+    failed = 0
+    last_hash = ''
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while True:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT content_hash, ext FROM image_blob WHERE content_hash > %s"
+                        + ("" if force else " AND variants IS NULL")
+                        + " ORDER BY content_hash ASC LIMIT %s",
+                        (last_hash, batch_size)
+                    )
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+                    futures = [
+                        (row['content_hash'], pool.submit(image_variants.generate, row['content_hash'], row['ext'],
+                                                          Config.IMAGE_VARIANT_WIDTHS))
+                        for row in rows
+                    ]
+                    for digest, future in futures:
+                        try:
+                            width, height, variants = future.result()
+                        except Exception as e:
+                            click.echo(f'{digest}: {e}', err=True)
+                            failed += 1
+                            continue
+                        image_variants.save_result(cursor, digest, width, height, variants)
+                        processed += 1
+                conn.commit()
+                last_hash = rows[-1]['content_hash']
+    finally:
+        conn.close()
+    click.echo(f'variants: processed {processed} images, {failed} failed')
+
+
+@assets_cli.command('build')
+@click.option('--root', 'roots', multiple=True, default=('dist', 'uploads'), show_default=True,
+              help='要处理的目录名称（app.py 中登记的 dist / assets / uploads / blobs），可重复指定')
+@click.option('--workers', type=int, default=None, help='压缩进程数，默认为 CPU 核数')
+@click.option('--min-size', default=1024, show_default=True, help='小于该字节数的文件不压缩')
+@click.option('--force', is_flag=True, help='忽略已有的 .br/.gz，全部重新压缩')
+def build_assets(roots, workers, min_size, force):
+    """并行生成 .br/.gz 压缩版本，并为每个目录写出文件清单（前端重新构建后执行，重启应用后生效）"""
+    registered = current_app.extensions['static_roots']
+    unknown = [name for name in roots if name not in registered]
+    if unknown:
+        raise click.BadParameter(f"unknown root: {', '.join(unknown)}", param_hint='--root')
+    if static_files.brotli is None:
+        click.echo('brotli not installed, generating gzip only', err=True)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for name in roots:
+            root = registered[name]
+            if not os.path.isdir(root.directory):
+                click.echo(f'{name}: {root.directory} not found, skipped', err=True)
+                continue
+            # 嵌套在该目录下的其他目录（如 uploads/blobs）由各自的登记项处理
+            nested = [other.directory for other in registered.values() if other is not root]
+            paths = static_files.manifest_sources(root.directory, exclude=nested)
+            entries = dict(zip(paths, pool.map(
+                static_files.build_entry,
+                [root.directory] * len(paths), paths, [min_size] * len(paths), [force] * len(paths),
+                chunksize=16
+            )))
+            static_files.write_manifest(root.directory, entries)
+            original = sum(entry['size'] for entry in entries.values())
+            compressed = sum(entry['encodings'].get('br', entry['encodings'].get('gzip', entry['size']))
+                             for entry in entries.values())
+            click.echo(f'{name}: {len(entries)} files, '
+                       f'{sum(1 for entry in entries.values() if entry["encodings"])} compressed, '
+                       f'{original} -> {compressed} bytes')
+
+
+def register_commands(app):
+    app.cli.add_command(counters_cli)
+    app.cli.add_command(posts_cli)
+    app.cli.add_command(blobs_cli)
+    app.cli.add_command(assets_cli)
@@ -11,4 +11,47 @@ class Config:
     MYSQL_DB = os.getenv('DB_NAME', 'blog_db')
     MYSQL_CHARSET = os.getenv('MYSQL_CHARSET', 'utf8mb4')
     SECRET_KEY = os.getenv('SECRET_KEY', 'your_secret_key') # Change this to a strong, random key in production
-    JWT_EXPIRATION_HOURS = int(os.getenv('JWT_EXPIRATION_HOURS', 12))
\ No newline at end of file
+    JWT_EXPIRATION_HOURS = int(os.getenv('JWT_EXPIRATION_HOURS', 12))
+    # 数据库连接池
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))
+    DB_POOL_MAX_IDLE = int(os.getenv('DB_POOL_MAX_IDLE', 300))
+    DB_POOL_MAX_LIFETIME = int(os.getenv('DB_POOL_MAX_LIFETIME', 3600))
+    DB_POOL_PING_INTERVAL = int(os.getenv('DB_POOL_PING_INTERVAL', 30))
+    # 点赞写回缓冲，开启后点赞先记在进程内，定期批量落库
+    LIKE_WRITE_BEHIND = os.getenv('LIKE_WRITE_BEHIND', 'false').lower() == 'true'
+    LIKE_FLUSH_INTERVAL = float(os.getenv('LIKE_FLUSH_INTERVAL', 2))
+    LIKE_BUFFER_MAX_PENDING = int(os.getenv('LIKE_BUFFER_MAX_PENDING', 1000))
+    # 分页接口 total=cached 时总数的缓存时间（秒）
+    TOTAL_CACHE_TTL = int(os.getenv('TOTAL_CACHE_TTL', 60))
+    # 用户身份（用户名、角色）进程内缓存
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 600))
+    # 文章列表摘要长度（字符）
+    POST_EXCERPT_LENGTH = int(os.getenv('POST_EXCERPT_LENGTH', 200))
+    # 标题联想索引的全量重建间隔（秒），用于同步其他 worker 的写入
+    SUGGEST_REBUILD_INTERVAL = int(os.getenv('SUGGEST_REBUILD_INTERVAL', 300))
+    # 相关文章：每篇保留的相似文章数，以及全量重建间隔（秒）
+    RELATED_TOP_K = int(os.getenv('RELATED_TOP_K', 10))
+    RELATED_REBUILD_INTERVAL = int(os.getenv('RELATED_REBUILD_INTERVAL', 600))
+    # GET 响应缓存：memory（进程内）/ file（本机目录，多 worker 共享）/ none
+    RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'memory').lower()
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 30))
+    RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 512))
+    # 列表接口 ETag 允许点赞数、评论数陈旧的最长时间（秒），计数变化不递增列表版本号
+    LIST_ETAG_MAX_STALE = int(os.getenv('LIST_ETAG_MAX_STALE', 60))
+    RESPONSE_CACHE_DIR = os.getenv('RESPONSE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'responses'))
+    # 动态图片的内容寻址存储目录、对外 URL 前缀及单张大小上限（字节）
+    BLOB_STORE_DIR = os.getenv('BLOB_STORE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads', 'blobs'))
+    BLOB_STORE_URL = os.getenv('BLOB_STORE_URL', '/uploads/blobs')
+    MAX_IMAGE_BYTES = int(os.getenv('MAX_IMAGE_BYTES', 10 * 1024 * 1024))
+    # 批量上传接口单次最多的图片数
+    MAX_IMAGES_PER_UPLOAD = int(os.getenv('MAX_IMAGES_PER_UPLOAD', 9))
+    # 动态图片缩放：生成的宽度（小于原图宽度的才生成）与处理进程数
+    IMAGE_VARIANT_WIDTHS = [int(w) for w in os.getenv('IMAGE_VARIANT_WIDTHS', '320,640,1280').split(',') if w.strip()]
+    IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+    # 静态文件：图片等非哈希文件的缓存时间（秒）；交给前置代理输出文件：x-sendfile / x-accel-redirect / 空（由应用输出）
+    STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', 86400))
+    STATIC_SENDFILE = os.getenv('STATIC_SENDFILE', '').lower()
+    STATIC_ACCEL_PREFIX = os.getenv('STATIC_ACCEL_PREFIX', '/_static').rstrip('/')
+    USE_X_SENDFILE = STATIC_SENDFILE == 'x-sendfile'
@@ -0,0 +1,7 @@
+-- 冗余计数列：post 表已有 like_count / comment_count，这里为 moment 补齐
+-- 执行后运行 `flask counters reconcile` 用点赞表、评论表的真实数据回填计数
+-- 动态暂无评论表，moment.comment_count 先保持为 0，接口照常返回该字段
+
+ALTER TABLE `moment`
+    ADD COLUMN `like_count` INT UNSIGNED NOT NULL DEFAULT 0,
+    ADD COLUMN `comment_count` INT UNSIGNED NOT NULL DEFAULT 0;
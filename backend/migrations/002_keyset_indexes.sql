@@ -0,0 +1,5 @@
+-- 游标分页使用的复合索引：排序列 + id，保证 WHERE (sort_key, id) 定位和 ORDER BY 都走索引
+
+CREATE INDEX `idx_moment_publish_time_id` ON `moment` (`publish_time`, `id`);
+
+CREATE INDEX `idx_post_comment_post_parent_time_id` ON `post_comment` (`post_id`, `parent_id`, `create_time`, `id`);
@@ -0,0 +1,3 @@
+-- 动态 feed 按页批量取图片：WHERE moment_id IN (...) ORDER BY moment_id, display_order
+
+CREATE INDEX `idx_moment_image_moment_order` ON `moment_image` (`moment_id`, `display_order`);
@@ -0,0 +1,24 @@
+-- post_comment.root_id：回复所属的一级评论ID，一级评论本身为 NULL
+-- 由 add_comment 在写入时填充，读取某页一级评论的全部回复只需一次 WHERE root_id IN (...) 索引查询
+
+ALTER TABLE `post_comment`
+    ADD COLUMN `root_id` INT NULL DEFAULT NULL AFTER `parent_id`;
+
+-- 回填历史回复：从一级评论出发沿 parent_id 向下传递根ID
+UPDATE `post_comment` pc
+JOIN (
+    WITH RECURSIVE thread (id, root_id) AS (
+        SELECT id, id
+        FROM `post_comment`
+        WHERE parent_id IS NULL
+        UNION ALL
+        SELECT c.id, t.root_id
+        FROM `post_comment` c
+        INNER JOIN thread t ON c.parent_id = t.id
+    )
+    SELECT id, root_id FROM thread
+) t ON t.id = pc.id
+SET pc.root_id = t.root_id
+WHERE pc.parent_id IS NOT NULL;
+
+CREATE INDEX `idx_post_comment_root_time_id` ON `post_comment` (`root_id`, `create_time`, `id`);
@@ -0,0 +1,10 @@
+-- 内容版本号：读接口的 ETag / Last-Modified 由这里的版本号生成，命中 If-None-Match 时只需一次主键查询
+-- scope 如 posts、post:12、projects、moment:3；写操作在同一事务内通过 utils.versions.bump 递增
+-- 表为空时所有 scope 视为版本 0，无需回填
+
+CREATE TABLE IF NOT EXISTS `content_version` (
+    `scope` VARCHAR(64) NOT NULL,
+    `version` BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    `updated_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (`scope`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
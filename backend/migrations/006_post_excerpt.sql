@@ -0,0 +1,10 @@
+-- 文章摘要与时间戳：列表 summary 模式只读这些列，不再传输正文
+-- excerpt 由 create_post / update_post 写入时生成；历史数据执行后运行 `flask posts excerpts` 回填
+-- （下面的 LEFT 只是兜底，回填命令会去掉 Markdown 标记后重新生成）
+
+ALTER TABLE `post`
+    ADD COLUMN `excerpt` VARCHAR(512) NOT NULL DEFAULT '',
+    ADD COLUMN `create_time` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    ADD COLUMN `update_time` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP;
+
+UPDATE `post` SET `excerpt` = LEFT(`content`, 200) WHERE `excerpt` = '';
@@ -0,0 +1,6 @@
+-- 文章列表排序索引：最多点赞、最多评论按 (计数列, id) 倒序扫描，游标定位与 ORDER BY 都走索引
+-- 最新排序直接使用主键
+
+CREATE INDEX `idx_post_like_count_id` ON `post` (`like_count`, `id`);
+
+CREATE INDEX `idx_post_comment_count_id` ON `post` (`comment_count`, `id`);
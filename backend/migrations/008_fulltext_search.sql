@@ -0,0 +1,9 @@
+-- 全文检索：FULLTEXT 索引使用 ngram 解析器以支持中文（按 ngram_token_size 切词，默认 2）
+-- 索引由 InnoDB 在 INSERT / UPDATE / DELETE 时自动增量维护，写接口无需额外处理
+-- MATCH 的列必须与索引列完全一致，见 utils/search.py 中的 SEARCH_SOURCES
+
+ALTER TABLE `post` ADD FULLTEXT INDEX `ft_post_title_content` (`title`, `content`) WITH PARSER ngram;
+
+ALTER TABLE `moment` ADD FULLTEXT INDEX `ft_moment_content` (`content`) WITH PARSER ngram;
+
+ALTER TABLE `project` ADD FULLTEXT INDEX `ft_project_name_description` (`name`, `description`) WITH PARSER ngram;
@@ -0,0 +1,13 @@
+-- Markdown 渲染结果：按 content_hash（sha256(渲染版本:正文)）存储，post.content_hash 指向当前正文的渲染结果
+-- 执行后运行 `flask posts render` 用进程池为已有文章批量渲染
+
+CREATE TABLE IF NOT EXISTS `post_render` (
+    `content_hash` CHAR(64) NOT NULL,
+    `html` MEDIUMTEXT NOT NULL,
+    `toc` TEXT NOT NULL,
+    `create_time` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (`content_hash`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+ALTER TABLE `post`
+    ADD COLUMN `content_hash` CHAR(64) NULL DEFAULT NULL;
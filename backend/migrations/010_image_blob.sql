@@ -0,0 +1,17 @@
+-- 动态图片按内容寻址存储：content_hash 为文件 sha256，文件位于 BLOB_STORE_DIR/<前两位>/<哈希>.<ext>
+-- ref_count 为引用该文件的 moment_image 行数，归零时由 utils.blob_store.release 删除记录和文件
+-- 旧图片（blob_hash 为 NULL）仍使用原 image_url，不参与引用计数
+
+CREATE TABLE IF NOT EXISTS `image_blob` (
+    `content_hash` CHAR(64) NOT NULL,
+    `ext` VARCHAR(8) NOT NULL,
+    `mime` VARCHAR(32) NOT NULL,
+    `size` INT UNSIGNED NOT NULL,
+    `ref_count` INT UNSIGNED NOT NULL DEFAULT 0,
+    `create_time` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (`content_hash`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+ALTER TABLE `moment_image`
+    ADD COLUMN `blob_hash` CHAR(64) NULL DEFAULT NULL,
+    ADD KEY `idx_moment_image_blob_hash` (`blob_hash`);
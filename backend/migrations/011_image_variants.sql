@@ -0,0 +1,7 @@
+-- 图片缩放版本：原图尺寸与生成的版本列表 [[宽, 高, 扩展名], ...]（JSON）
+-- variants 为 NULL 表示尚未处理；执行后运行 `flask blobs variants` 为已有图片生成
+
+ALTER TABLE `image_blob`
+    ADD COLUMN `width` INT UNSIGNED NULL DEFAULT NULL,
+    ADD COLUMN `height` INT UNSIGNED NULL DEFAULT NULL,
+    ADD COLUMN `variants` TEXT NULL DEFAULT NULL;
@@ -0,0 +1,100 @@
+"""
+测试公共设施
+
+测试不连接 MySQL：各测试模块用一个小的内存对象模拟用到的表，实现 execute(sql, params)，
+返回 Result；FakeCursor / FakeConnection 按 pymysql DictCursor 的接口把它包装起来。
+运行：在 backend 目录下执行 python -m pytest
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Result:
+
+    def __init__(self, rows=(), rowcount=None, lastrowid=None):
+        self.rows = [dict(row) for row in rows]
+        self.rowcount = len(self.rows) if rowcount is None else rowcount
+        self.lastrowid = lastrowid
+
+
+class FakeCursor:
+    """把 SQL 压缩成单行空白后交给 db.execute，记录执行过的语句"""
+
+    def __init__(self, db):
+        self.db = db
+        self.rowcount = 0
+        self.lastrowid = None
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        sql = ' '.join(sql.split())
+        self.db.executed.append((sql, params))
+        result = self.db.execute(sql, params) or Result()
+        self._rows = list(result.rows)
+        self.rowcount = result.rowcount
+        self.lastrowid = result.lastrowid
+        return self.rowcount
+
+    def executemany(self, sql, seq):
+        total = 0
+        for params in seq:
+            total += self.execute(sql, params)
+        self.rowcount = total
+        return total
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+
+class FakeConnection:
+
+    def __init__(self, db):
+        self.db = db
+        self.commits = 0
+        self.rollbacks = 0
+        self.closed = False
+
+    def cursor(self, *_):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class FakeDB:
+    """子类实现 execute；executed 记录 (sql, params)"""
+
+    def __init__(self):
+        self.executed = []
+
+    def statements(self, prefix):
+        return [sql for sql, _ in self.executed if sql.startswith(prefix)]
+
+    def execute(self, sql, params):
+        raise AssertionError(f'unexpected SQL: {sql}')
+
+
+@pytest.fixture
+def fake_connection():
+    """返回工厂：fake_connection(db) -> FakeConnection"""
+    return FakeConnection
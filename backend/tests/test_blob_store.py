@@ -0,0 +1,166 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from conftest import FakeConnection, FakeCursor, FakeDB, Result
+from config import Config
+from utils import blob_store
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 100
+WEBP = b'RIFF\x00\x00\x00\x00WEBPVP8 ' + b'\x00' * 100
+
+
+class TrickleStream(io.BytesIO):
+    """每次 read 最多返回 step 字节，模拟网络分片"""
+
+    def __init__(self, data, step):
+        super().__init__(data)
+        self.step = step
+
+    def read(self, size=-1):
+        return super().read(self.step)
+
+
+class BlobDB(FakeDB):
+    """image_blob 表：content_hash -> {ext, mime, size, ref_count}"""
+
+    def __init__(self):
+        super().__init__()
+        self.blobs = {}
+
+    def execute(self, sql, params):
+        if sql.startswith('INSERT INTO image_blob'):
+            for offset in range(0, len(params), 5):
+                digest, ext, mime, size, count = params[offset:offset + 5] if 'AS new' in sql else (*params, 1)
+                row = self.blobs.setdefault(digest, {'ext': ext, 'mime': mime, 'size': size, 'ref_count': 0})
+                row['ref_count'] += count
+            return Result(rowcount=1)
+        if sql.startswith('SELECT ext, ref_count FROM image_blob'):
+            row = self.blobs.get(params[0])
+            return Result([row] if row else [])
+        if sql.startswith('UPDATE image_blob SET ref_count = ref_count - 1'):
+            self.blobs[params[0]]['ref_count'] -= 1
+            return Result(rowcount=1)
+        if sql.startswith('DELETE FROM image_blob'):
+            return Result(rowcount=int(self.blobs.pop(params[0], None) is not None))
+        if sql.startswith('SELECT 1 FROM image_blob'):
+            return Result([{'1': 1}] if params[0] in self.blobs else [])
+        return super().execute(sql, params)
+
+
+@pytest.fixture(autouse=True)
+def blob_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'BLOB_STORE_DIR', str(tmp_path))
+    return tmp_path
+
+
+def upload(data):
+    blob = blob_store.receive(io.BytesIO(data))
+    blob.publish()
+    return blob
+
+
+class TestReceive:
+
+    def test_content_addressed(self):
+        blob = blob_store.receive(io.BytesIO(PNG))
+        assert blob.digest == hashlib.sha256(PNG).hexdigest()
+        assert (blob.ext, blob.mime, blob.size) == ('png', 'image/png', len(PNG))
+        blob.publish()
+        assert open(blob_store.path_of(blob.digest, 'png'), 'rb').read() == PNG
+
+    def test_sniffs_across_short_reads(self):
+        blob = blob_store.receive(TrickleStream(WEBP, 3))
+        assert blob.ext == 'webp'
+        blob.discard()
+
+    def test_rejects_unknown_type(self, blob_dir):
+        with pytest.raises(blob_store.BlobError):
+            blob_store.receive(io.BytesIO(b'GIF00a' + b'\x00' * 100))
+        assert os.listdir(blob_dir / 'tmp') == []
+
+    def test_rejects_empty_and_oversized(self):
+        with pytest.raises(blob_store.BlobError):
+            blob_store.receive(io.BytesIO(b''))
+        with pytest.raises(blob_store.BlobError):
+            blob_store.receive(io.BytesIO(PNG), max_bytes=len(PNG) - 1)
+
+    def test_receive_many_reports_bad_file_and_cleans_up(self, blob_dir):
+        with pytest.raises(blob_store.BlobError, match='Image 2'):
+            blob_store.receive_many([io.BytesIO(PNG), io.BytesIO(b'nope' * 10)])
+        assert os.listdir(blob_dir / 'tmp') == []
+
+
+class TestRefcount:
+
+    def test_same_content_is_stored_once(self):
+        db = BlobDB()
+        cursor = FakeCursor(db)
+        first, second = upload(PNG), upload(PNG)
+        blob_store.acquire(cursor, first)
+        blob_store.acquire(cursor, second)
+        assert db.blobs[first.digest]['ref_count'] == 2
+
+    def test_acquire_many_counts_duplicates(self):
+        db = BlobDB()
+        blobs = [upload(PNG), upload(WEBP), upload(PNG)]
+        blob_store.acquire_many(FakeCursor(db), blobs)
+        assert db.blobs[blobs[0].digest]['ref_count'] == 2
+        assert db.blobs[blobs[1].digest]['ref_count'] == 1
+        assert len(db.statements('INSERT INTO image_blob')) == 1
+
+    def test_release_returns_paths_only_at_zero(self):
+        db = BlobDB()
+        cursor = FakeCursor(db)
+        blob = upload(PNG)
+        blob_store.acquire(cursor, blob)
+        blob_store.acquire(cursor, blob)
+        assert blob_store.release(cursor, blob.digest) == []
+        paths = blob_store.release(cursor, blob.digest)
+        assert paths == [blob_store.path_of(blob.digest, 'png')]
+        assert blob.digest not in db.blobs
+        # release 不删除文件，事务提交后才由 reclaim 删除
+        assert os.path.exists(paths[0])
+
+    def test_release_includes_variants(self, blob_dir):
+        db = BlobDB()
+        cursor = FakeCursor(db)
+        blob = upload(PNG)
+        blob_store.acquire(cursor, blob)
+        variant = blob_dir / blob.digest[:2] / f'{blob.digest}_320.webp'
+        variant.write_bytes(b'x')
+        assert sorted(blob_store.release(cursor, blob.digest)) == sorted(
+            [blob_store.path_of(blob.digest, 'png'), str(variant)]
+        )
+
+    def test_reclaim_deletes_unreferenced_files(self):
+        db = BlobDB()
+        conn = FakeConnection(db)
+        blob = upload(PNG)
+        with conn.cursor() as cursor:
+            blob_store.acquire(cursor, blob)
+            paths = blob_store.release(cursor, blob.digest)
+        blob_store.reclaim(conn, paths)
+        assert not os.path.exists(paths[0])
+        assert conn.commits == 1
+
+    def test_reclaim_keeps_reuploaded_files(self):
+        db = BlobDB()
+        conn = FakeConnection(db)
+        blob = upload(PNG)
+        with conn.cursor() as cursor:
+            blob_store.acquire(cursor, blob)
+            paths = blob_store.release(cursor, blob.digest)
+            # 释放事务提交后、reclaim 之前，同一图片又被上传
+            blob_store.acquire(cursor, upload(PNG))
+        blob_store.reclaim(conn, paths)
+        assert os.path.exists(paths[0])
+
+    def test_scan_finds_blobs_and_partials(self, blob_dir):
+        blob = upload(PNG)
+        (blob_dir / 'tmp' / 'x.part').write_bytes(b'')
+        blobs, partials = blob_store.scan()
+        assert blobs == [(blob.digest, blob_store.path_of(blob.digest, 'png'))]
+        assert partials == [str(blob_dir / 'tmp' / 'x.part')]
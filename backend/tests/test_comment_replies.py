@@ -0,0 +1,60 @@
+import pytest
+
+from conftest import FakeCursor, FakeDB, Result
+from utils import user_cache
+
+
+class RepliesDB(FakeDB):
+    """post_comment 中的回复：root_id -> 按 (create_time, id) 排序的回复"""
+
+    def __init__(self, threads):
+        super().__init__()
+        self.threads = threads
+
+    def execute(self, sql, params):
+        if sql.startswith('SELECT id, username, role FROM user'):
+            return Result([{'id': user_id, 'username': f'user{user_id}', 'role': 'user'} for user_id in params[0]])
+        if sql.startswith('SELECT root_id, COUNT(*) AS reply_count'):
+            return Result([
+                {'root_id': root_id, 'reply_count': len(self.threads[root_id])}
+                for root_id in params[0] if self.threads.get(root_id)
+            ])
+        if 'ROW_NUMBER() OVER' in sql:
+            root_ids, limit = params
+            return Result([
+                dict(reply, root_id=root_id, reply_count=len(self.threads[root_id]))
+                for root_id in root_ids for reply in self.threads.get(root_id, [])[:limit]
+            ])
+        return super().execute(sql, params)
+
+
+@pytest.fixture
+def replies_db():
+    user_cache._cache.clear()
+    threads = {
+        1: [
+            {'id': 10 + i, 'user_id': 7, 'post_id': 1, 'parent_id': 1, 'content': 'r', 'create_time': f't{i}'}
+            for i in range(3)
+        ],
+        2: [],
+    }
+    return RepliesDB(threads)
+
+
+class TestFetchThreadReplies:
+
+    def fetch(self, db, limit):
+        from blueprints.post_comment_routes import fetch_thread_replies
+        return fetch_thread_replies(FakeCursor(db), [1, 2], limit=limit)
+
+    def test_limit_truncates_and_counts(self, replies_db):
+        threads = self.fetch(replies_db, 2)
+        assert [reply['id'] for reply in threads[1]['replies']] == [10, 11]
+        assert threads[1]['reply_count'] == 3
+        assert threads[1]['replies'][0]['username'] == 'user7'
+        assert 2 not in threads
+
+    def test_limit_zero_still_counts(self, replies_db):
+        threads = self.fetch(replies_db, 0)
+        assert threads == {1: {'replies': [], 'reply_count': 3}}
+        assert replies_db.statements('SELECT root_id, COUNT(*)')
@@ -0,0 +1,77 @@
+from utils.comment_tree import build_comment_tree
+
+
+def comment(id, parent_id=None):
+    return {'id': id, 'parent_id': parent_id}
+
+
+def ids(nodes):
+    return [node['id'] for node in nodes]
+
+
+class TestBuildCommentTree:
+
+    def test_nests_replies_in_input_order(self):
+        roots = build_comment_tree([comment(1), comment(2), comment(3, 1), comment(4, 3), comment(5, 1)])
+        assert ids(roots) == [1, 2]
+        assert ids(roots[0]['replies']) == [3, 5]
+        assert ids(roots[0]['replies'][0]['replies']) == [4]
+        assert roots[0]['reply_count'] == 2
+        assert roots[1]['replies'] == []
+
+    def test_orphans_become_roots(self):
+        roots = build_comment_tree([comment(1), comment(2, 99)])
+        assert ids(roots) == [1, 2]
+
+    def test_max_depth_flattens_descendants(self):
+        roots = build_comment_tree([comment(1), comment(2, 1), comment(3, 2), comment(4, 3)], max_depth=1)
+        assert ids(roots[0]['replies']) == [2, 3, 4]
+        assert all(reply['replies'] == [] for reply in roots[0]['replies'])
+
+    def test_max_depth_flattening_keeps_input_order(self):
+        # 4 是 2 的子回复但排在 3 之前，平铺后按输入顺序而不是遍历顺序排列
+        comments = [comment(1), comment(2, 1), comment(4, 2), comment(3, 1), comment(6, 3), comment(5, 4)]
+        roots = build_comment_tree(comments, max_depth=1)
+        assert ids(roots[0]['replies']) == [2, 4, 3, 6, 5]
+        assert roots[0]['reply_count'] == 5
+
+    def test_max_depth_flattens_below_limit_only(self):
+        comments = [comment(1), comment(2, 1), comment(3, 2), comment(4, 3), comment(5, 2)]
+        roots = build_comment_tree(comments, max_depth=2)
+        second = roots[0]['replies']
+        assert ids(second) == [2]
+        assert ids(second[0]['replies']) == [3, 4, 5]
+        assert second[0]['reply_count'] == 3
+        assert all(reply['replies'] == [] and reply['reply_count'] == 0 for reply in second[0]['replies'])
+
+    def test_max_replies_truncates_but_keeps_count(self):
+        roots = build_comment_tree([comment(1)] + [comment(i, 1) for i in range(2, 7)], max_replies=2)
+        assert ids(roots[0]['replies']) == [2, 3]
+        assert roots[0]['reply_count'] == 5
+
+    def test_max_replies_applies_at_every_level(self):
+        comments = [comment(1), comment(2, 1), comment(3, 1), comment(4, 2), comment(5, 2), comment(6, 2)]
+        roots = build_comment_tree(comments, max_replies=1)
+        assert ids(roots[0]['replies']) == [2]
+        assert roots[0]['reply_count'] == 2
+        assert ids(roots[0]['replies'][0]['replies']) == [4]
+        assert roots[0]['replies'][0]['reply_count'] == 3
+
+    def test_max_replies_after_flattening(self):
+        comments = [comment(1), comment(2, 1), comment(3, 2), comment(4, 1)]
+        roots = build_comment_tree(comments, max_depth=1, max_replies=2)
+        assert ids(roots[0]['replies']) == [2, 3]
+        assert roots[0]['reply_count'] == 3
+
+    def test_input_is_not_modified(self):
+        comments = [comment(1), comment(2, 1)]
+        build_comment_tree(comments)
+        assert comments == [comment(1), comment(2, 1)]
+
+    def test_deep_chain_does_not_recurse(self):
+        chain = [comment(1)] + [comment(i, i - 1) for i in range(2, 5001)]
+        roots = build_comment_tree(chain)
+        node, depth = roots[0], 0
+        while node['replies']:
+            node, depth = node['replies'][0], depth + 1
+        assert depth == 4999
@@ -0,0 +1,172 @@
+import re
+
+import pymysql
+import pytest
+
+from conftest import FakeConnection, FakeCursor, FakeDB, Result
+from utils import like_buffer, likes
+
+
+class LikeDB(FakeDB):
+    """post 表的 like_count 与 post_like 表，按 likes / like_buffer 实际发出的语句模拟"""
+
+    def __init__(self, counts, liked=()):
+        super().__init__()
+        self.counts = dict(counts)
+        self.likes = set(liked)
+        self.fail_on = None
+
+    def execute(self, sql, params):
+        if self.fail_on and sql.startswith(self.fail_on):
+            raise pymysql.OperationalError(1213, 'Deadlock found')
+        if sql.startswith('SELECT like_count FROM `post` WHERE id = %s'):
+            post_id = params[0]
+            return Result([{'like_count': self.counts[post_id]}] if post_id in self.counts else [])
+        if sql.startswith('SELECT id FROM `post` WHERE id IN %s'):
+            return Result([{'id': post_id} for post_id in sorted(params[0]) if post_id in self.counts])
+        if sql.startswith('INSERT IGNORE INTO post_like'):
+            # 重复记录和外键不满足的记录都被 IGNORE 跳过
+            pairs = {pair for pair in zip(params[0::2], params[1::2]) if pair[0] in self.counts} - self.likes
+            self.likes |= pairs
+            return Result(rowcount=len(pairs))
+        if sql.startswith('DELETE FROM post_like WHERE post_id = %s AND user_id IN %s'):
+            removed = {(params[0], user_id) for user_id in params[1]} & self.likes
+            self.likes -= removed
+            return Result(rowcount=len(removed))
+        if sql.startswith('DELETE FROM post_like WHERE post_id = %s AND user_id = %s'):
+            key = tuple(params)
+            found = key in self.likes
+            self.likes.discard(key)
+            return Result(rowcount=int(found))
+        match = re.match(r'UPDATE `post` SET like_count = (LAST_INSERT_ID\()?like_count ([+-])', sql)
+        if match:
+            amount, post_id = params
+            if post_id not in self.counts:
+                return Result(rowcount=0)
+            current = self.counts[post_id]
+            self.counts[post_id] = current + amount if match.group(2) == '+' else current - min(current, amount)
+            return Result(rowcount=1, lastrowid=self.counts[post_id])
+        if sql.startswith('INSERT INTO content_version'):
+            return Result(rowcount=len(params))
+        return super().execute(sql, params)
+
+
+class TestSetLike:
+
+    def test_like_is_idempotent(self):
+        db = LikeDB({1: 0})
+        cursor = FakeCursor(db)
+        assert likes.set_like(cursor, 'post', 1, 7, True) == 1
+        assert likes.set_like(cursor, 'post', 1, 7, True) == 1
+        assert db.counts[1] == 1
+        assert len(db.statements('UPDATE `post`')) == 1
+
+    def test_unlike_is_idempotent(self):
+        db = LikeDB({1: 1}, liked={(1, 7)})
+        cursor = FakeCursor(db)
+        assert likes.set_like(cursor, 'post', 1, 7, False) == 0
+        assert likes.set_like(cursor, 'post', 1, 7, False) == 0
+        assert db.counts[1] == 0
+        assert len(db.statements('UPDATE `post`')) == 1
+
+    def test_change_takes_two_statements_without_locks(self):
+        db = LikeDB({1: 0})
+        likes.set_like(FakeCursor(db), 'post', 1, 7, True)
+        assert [sql.split(' ', 2)[:2] for sql, _ in db.executed] == [['INSERT', 'IGNORE'], ['UPDATE', '`post`']]
+        assert 'LAST_INSERT_ID' in db.executed[1][0]
+        assert not any('FOR UPDATE' in sql for sql, _ in db.executed)
+
+    def test_missing_target(self):
+        db = LikeDB({})
+        assert likes.set_like(FakeCursor(db), 'post', 1, 7, True) is None
+        assert likes.set_like(FakeCursor(db), 'post', 1, 7, False) is None
+        assert db.likes == set()
+        assert not db.statements('UPDATE')
+
+
+@pytest.fixture
+def buffer(monkeypatch):
+    monkeypatch.setattr(like_buffer.response_cache, 'invalidate_post', lambda post_id: None)
+    return like_buffer.LikeBuffer(max_pending=100)
+
+
+def use_db(monkeypatch, db):
+    monkeypatch.setattr(like_buffer, 'get_db_connection', lambda: FakeConnection(db))
+
+
+class TestLikeBuffer:
+
+    def test_like_then_unlike_cancels_out(self, buffer):
+        buffer.record('post', 1, 7, True, False)
+        buffer.record('post', 1, 7, False, False)
+        assert buffer.pending_delta('post', 1) == 0
+        assert buffer.stats()['pending'] == 0
+        assert buffer.stats()['coalesced'] == 1
+
+    def test_pending_delta_per_target(self, buffer):
+        buffer.record('post', 1, 7, True, False)
+        buffer.record('post', 1, 8, True, False)
+        buffer.record('post', 2, 7, False, True)
+        buffer.record('post', 1, 7, True, False)
+        assert buffer.pending_delta('post', 1) == 2
+        assert buffer.pending_delta('post', 2) == -1
+        assert buffer.pending_delta('post', 3) == 0
+
+    def test_flush_writes_and_clears(self, buffer, monkeypatch):
+        db = LikeDB({1: 0, 2: 1}, liked={(2, 7)})
+        use_db(monkeypatch, db)
+        buffer.record('post', 1, 7, True, False)
+        buffer.record('post', 1, 8, True, False)
+        buffer.record('post', 2, 7, False, True)
+        assert buffer.flush() == 3
+        assert db.likes == {(1, 7), (1, 8)}
+        assert db.counts == {1: 2, 2: 0}
+        assert buffer.pending_delta('post', 1) == 0
+        assert buffer.stats()['pending'] == 0
+
+    def test_flush_counts_only_rows_that_changed(self, buffer, monkeypatch):
+        # 另一个 worker 已经写入了同一个点赞，缓冲里记录的 persisted 已过时
+        db = LikeDB({1: 1}, liked={(1, 7)})
+        use_db(monkeypatch, db)
+        buffer.record('post', 1, 7, True, False)
+        buffer.record('post', 1, 8, False, True)
+        buffer.flush()
+        assert db.counts[1] == 1
+        assert not db.statements('UPDATE `post`')
+
+    def test_flush_skips_deleted_targets(self, buffer, monkeypatch):
+        db = LikeDB({1: 0})
+        use_db(monkeypatch, db)
+        buffer.record('post', 1, 7, True, False)
+        buffer.record('post', 2, 7, True, False)
+        buffer.flush()
+        assert db.likes == {(1, 7)}
+
+    def test_failed_flush_restores_pending(self, buffer, monkeypatch):
+        db = LikeDB({1: 0})
+        db.fail_on = 'INSERT IGNORE'
+        use_db(monkeypatch, db)
+        buffer.record('post', 1, 7, True, False)
+        assert buffer.flush() == 0
+        assert buffer.pending_delta('post', 1) == 1
+        assert buffer.stats()['flush_errors'] == 1
+
+        db.fail_on = None
+        assert buffer.flush() == 1
+        assert db.counts[1] == 1
+        assert buffer.pending_delta('post', 1) == 0
+
+    def test_settle_toggles_and_adds_pending_delta(self, buffer, monkeypatch):
+        class SettleDB(LikeDB):
+            def execute(self, sql, params):
+                if sql.startswith('SELECT t.like_count'):
+                    user_id, post_id = params
+                    return Result([{'like_count': self.counts[post_id], 'liked': (post_id, user_id) in self.likes}])
+                return super().execute(sql, params)
+
+        monkeypatch.setattr(like_buffer, 'buffer', buffer)
+        db = SettleDB({1: 5})
+        cursor = FakeCursor(db)
+        assert like_buffer.settle(cursor, 'post', 1, 7) == (True, 6)
+        assert like_buffer.settle(cursor, 'post', 1, 7) == (False, 5)
+        assert like_buffer.settle(cursor, 'post', 1, 7, liked=True) == (True, 6)
@@ -0,0 +1,33 @@
+import pytest
+
+from utils.pagination import decode_cursor, encode_cursor, keyset_condition, next_cursor, split_page
+
+
+class TestCursorPagination:
+
+    def test_round_trip(self):
+        token = encode_cursor('2024-01-02 03:04:05', 17)
+        assert decode_cursor(token, 2) == ['2024-01-02 03:04:05', 17]
+
+    def test_empty_cursor_means_first_page(self):
+        assert decode_cursor('', 2) is None
+        assert decode_cursor(None, 2) is None
+
+    @pytest.mark.parametrize('token', ['not base64!', encode_cursor(1), encode_cursor(1, 2, 3)])
+    def test_invalid_cursor(self, token):
+        with pytest.raises(ValueError):
+            decode_cursor(token, 2)
+
+    def test_split_page_uses_extra_row(self):
+        assert split_page([1, 2, 3], 2) == ([1, 2], True)
+        assert split_page([1, 2], 2) == ([1, 2], False)
+
+    def test_next_cursor_from_last_row(self):
+        rows = [{'id': 1, 'create_time': 'a'}, {'id': 2, 'create_time': 'b'}]
+        assert decode_cursor(next_cursor(rows, True, 'create_time'), 2) == ['b', 2]
+        assert next_cursor(rows, False, 'create_time') is None
+        assert next_cursor([], True, 'create_time') is None
+
+    def test_keyset_condition_direction(self):
+        assert keyset_condition('t', 'id', descending=False) == '(t > %s OR (t = %s AND id > %s))'
+        assert keyset_condition('t', 'id', descending=True) == '(t < %s OR (t = %s AND id < %s))'
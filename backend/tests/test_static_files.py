@@ -0,0 +1,22 @@
+from utils import static_files
+
+
+class TestHiddenFiles:
+
+    def test_is_hidden(self):
+        assert static_files.is_hidden(static_files.MANIFEST_NAME)
+        assert static_files.is_hidden('assets/.env')
+        assert static_files.is_hidden('.git/config')
+        assert not static_files.is_hidden('assets/app-AbCd1234.js')
+
+    def test_exists_rejects_dotfiles(self, tmp_path):
+        (tmp_path / 'app.js').write_text('')
+        (tmp_path / static_files.MANIFEST_NAME).write_text('{}')
+        root = static_files.StaticRoot('assets', str(tmp_path))
+        assert root.exists('app.js')
+        assert not root.exists(static_files.MANIFEST_NAME)
+
+        root.scan()
+        root.manifest = {static_files.MANIFEST_NAME: {}}
+        assert root.exists('app.js')
+        assert not root.exists(static_files.MANIFEST_NAME)
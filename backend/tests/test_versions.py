@@ -0,0 +1,168 @@
+import pytest
+from flask import Flask, jsonify
+
+from conftest import FakeConnection, FakeCursor, FakeDB, Result
+from utils import response_cache, versions
+
+
+class VersionDB(FakeDB):
+    """content_version 表：scope -> (version, updated_at 时间戳)"""
+
+    def __init__(self):
+        super().__init__()
+        self.rows = {}
+
+    def execute(self, sql, params):
+        if sql.startswith('SELECT scope, version'):
+            return Result([
+                {'scope': scope, 'version': version, 'updated_at': updated_at}
+                for scope, (version, updated_at) in self.rows.items() if scope in params[0]
+            ])
+        if sql.startswith('INSERT INTO content_version'):
+            for scope in params:
+                version, _ = self.rows.get(scope, (0, None))
+                self.rows[scope] = (version + 1, 1700000000 + version)
+            return Result(rowcount=len(params))
+        return super().execute(sql, params)
+
+    def bump(self, *scopes):
+        versions.bump(FakeCursor(self), *scopes)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = VersionDB()
+    monkeypatch.setattr(versions, 'get_db_connection', lambda: FakeConnection(db))
+    return db
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(response_cache, 'backend', response_cache.MemoryBackend(maxsize=16, ttl=60))
+    app = Flask(__name__)
+    app.calls = 0
+
+    @app.route('/posts/<int:post_id>')
+    @response_cache.cached(response_cache.post_tags)
+    @versions.conditional(versions.post_scopes)
+    def post(post_id):
+        app.calls += 1
+        return jsonify({'id': post_id})
+
+    @app.route('/projects')
+    @versions.conditional(versions.project_scopes, max_stale=60)
+    def projects():
+        app.calls += 1
+        return jsonify([])
+
+    return app
+
+
+def version_queries(db):
+    return len(db.statements('SELECT scope, version'))
+
+
+class TestBump:
+
+    def test_bump_sorts_and_dedupes(self, db):
+        db.bump('post:2', 'posts', 'post:2')
+        sql, params = db.executed[-1]
+        assert params == ['post:2', 'posts']
+        assert sql.count('(%s, 1)') == 2
+
+    def test_counter_changes_do_not_touch_list_scope(self):
+        assert versions.target_scopes('post', 3) == ['post:3']
+        assert versions.target_scopes('moment', 3) == ['moment:3']
+
+
+class TestConditional:
+
+    def test_etag_and_304(self, app, db):
+        client = app.test_client()
+        first = client.get('/projects')
+        assert first.status_code == 200
+        assert first.headers['Cache-Control'] == 'private, no-cache'
+        etag = first.headers['ETag']
+
+        again = client.get('/projects', headers={'If-None-Match': etag})
+        assert again.status_code == 304
+        assert again.data == b''
+        assert app.calls == 1
+
+    def test_bump_changes_etag(self, app, db):
+        client = app.test_client()
+        etag = client.get('/projects').headers['ETag']
+        db.bump('projects')
+        response = client.get('/projects', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+
+    def test_global_scope_invalidates_everything(self, app, db):
+        client = app.test_client()
+        etag = client.get('/projects').headers['ETag']
+        db.bump(versions.GLOBAL_SCOPE)
+        assert client.get('/projects', headers={'If-None-Match': etag}).status_code == 200
+
+    def test_query_string_is_part_of_etag(self, app, db):
+        client = app.test_client()
+        assert client.get('/projects?page=1').headers['ETag'] != client.get('/projects?page=2').headers['ETag']
+
+    def test_if_modified_since(self, app, db):
+        db.bump('projects')
+        client = app.test_client()
+        last_modified = client.get('/projects').headers['Last-Modified']
+        response = client.get('/projects', headers={'If-Modified-Since': last_modified})
+        assert response.status_code == 304
+
+    def test_max_stale_rotates_etag(self, app, db, monkeypatch):
+        client = app.test_client()
+        monkeypatch.setattr(versions.time, 'time', lambda: 1200.0)
+        etag = client.get('/projects').headers['ETag']
+        monkeypatch.setattr(versions.time, 'time', lambda: 1230.0)
+        assert client.get('/projects', headers={'If-None-Match': etag}).status_code == 304
+        monkeypatch.setattr(versions.time, 'time', lambda: 1290.0)
+        assert client.get('/projects', headers={'If-None-Match': etag}).status_code == 200
+
+    def test_max_stale_etag_is_weak(self, app, db):
+        client = app.test_client()
+        assert client.get('/projects').headers['ETag'].startswith('W/')
+        assert not client.get('/posts/1').headers['ETag'].startswith('W/')
+
+    def test_database_unavailable_falls_back(self, app, monkeypatch):
+        monkeypatch.setattr(versions, 'get_db_connection', lambda: None)
+        response = app.test_client().get('/projects')
+        assert response.status_code == 200
+        assert 'ETag' not in response.headers
+
+
+class TestCachedConditional:
+
+    def test_cache_hit_answers_304_without_query(self, app, db):
+        client = app.test_client()
+        first = client.get('/posts/1')
+        assert first.headers['X-Cache'] == 'MISS'
+        queries = version_queries(db)
+
+        hit = client.get('/posts/1', headers={'If-None-Match': first.headers['ETag']})
+        assert hit.status_code == 304
+        assert hit.headers['X-Cache'] == 'HIT'
+        assert version_queries(db) == queries
+        assert app.calls == 1
+
+    def test_cache_hit_returns_body_and_etag(self, app, db):
+        client = app.test_client()
+        first = client.get('/posts/1')
+        hit = client.get('/posts/1')
+        assert hit.status_code == 200
+        assert hit.headers['ETag'] == first.headers['ETag']
+        assert hit.get_json() == {'id': 1}
+
+    def test_invalidate_refreshes_etag(self, app, db):
+        client = app.test_client()
+        etag = client.get('/posts/1').headers['ETag']
+        db.bump('post:1')
+        response_cache.invalidate_post(1)
+        response = client.get('/posts/1', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['X-Cache'] == 'MISS'
+        assert response.headers['ETag'] != etag
@@ -0,0 +1,261 @@
+"""
+内容寻址的图片存储
+
+上传流按块读取，边写临时文件边计算 sha256，写完后原子重命名为 <哈希前两位>/<哈希>.<扩展名>：
+- 文件名只由内容决定，同名文件不会互相覆盖，相同图片只保存一份
+- 扩展名按文件头识别，不信任客户端文件名；超过 MAX_IMAGE_BYTES 时立即中止
+- image_blob 表记录每个文件的引用数，moment_image.blob_hash 指向它；
+  引用数在与 moment_image 相同的事务中增减，归零时删除记录，文件在事务提交后由 reclaim 删除
+上传方在引用事务（acquire）提交之后才把临时文件重命名到位，事务回滚不会在存储目录留下文件；
+reclaim 先锁定该哈希（记录已不存在时为间隙锁）并确认仍没有记录，再删除文件：
+在上传提交之后运行的 reclaim 能看到记录，不会删掉刚上传的同一文件；在它之前运行的 reclaim 删除时文件尚未放到位。
+"""
+import glob
+import hashlib
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pymysql
+
+from config import Config
+
+CHUNK_SIZE = 64 * 1024
+# 批量上传时同时写入的文件数；哈希和文件写入都会释放 GIL，线程即可并行
+RECEIVE_THREADS = 4
+# 识别文件类型需要的文件头长度（WebP 需要 12 字节）
+SNIFF_BYTES = 16
+
+# 文件头 -> (扩展名, MIME)
+_SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', ('png', 'image/png')),
+    (b'\xff\xd8\xff', ('jpg', 'image/jpeg')),
+    (b'GIF87a', ('gif', 'image/gif')),
+    (b'GIF89a', ('gif', 'image/gif')),
+]
+
+
+class BlobError(ValueError):
+    """上传内容不合法（类型不支持、为空或超过大小限制）"""
+
+
+def sniff(head):
+    """按文件头识别图片类型，返回 (扩展名, MIME)，不支持时返回 None"""
+    for magic, kind in _SIGNATURES:
+        if head.startswith(magic):
+            return kind
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp', 'image/webp'
+    return None
+
+
+def digest_of(filename):
+    """从原图或缩放版本的文件名（<哈希>.<ext> / <哈希>_<宽度>.<ext>）取出哈希"""
+    return filename.split('.', 1)[0].split('_', 1)[0]
+
+
+def relative_path(digest, ext):
+    return f'{digest[:2]}/{digest}.{ext}'
+
+
+def path_of(digest, ext):
+    return os.path.join(Config.BLOB_STORE_DIR, digest[:2], f'{digest}.{ext}')
+
+
+def url_of(digest, ext):
+    return f'{Config.BLOB_STORE_URL}/{relative_path(digest, ext)}'
+
+
+class PendingBlob:
+    """已写入临时文件、尚未放到最终位置的上传"""
+
+    def __init__(self, tmp_path, digest, ext, mime, size):
+        self.tmp_path = tmp_path
+        self.digest = digest
+        self.ext = ext
+        self.mime = mime
+        self.size = size
+
+    @property
+    def url(self):
+        return url_of(self.digest, self.ext)
+
+    def publish(self):
+        """重命名到内容地址；目标已存在时内容相同，直接覆盖"""
+        target = path_of(self.digest, self.ext)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(self.tmp_path, target)
+        self.tmp_path = None
+
+    def discard(self):
+        if self.tmp_path is not None:
+            try:
+                os.remove(self.tmp_path)
+            except FileNotFoundError:
+                pass
+            self.tmp_path = None
+
+
+def receive(stream, max_bytes=None):
+    """
+    把上传流写入临时文件并计算哈希，返回 PendingBlob
+    调用方在 acquire 所在的事务提交之后调用 publish，最后调用 discard 清理未放置的临时文件
+    """
+    max_bytes = max_bytes or Config.MAX_IMAGE_BYTES
+    tmp_dir = os.path.join(Config.BLOB_STORE_DIR, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    # 临时文件与最终位置在同一文件系统，os.replace 是原子的
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix='.part')
+    sha = hashlib.sha256()
+    size = 0
+    kind = None
+    head = b''
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                # 一次 read 可能不足 SNIFF_BYTES 字节，攒够文件头再识别
+                if kind is None and len(head) < SNIFF_BYTES:
+                    head = (head + chunk)[:SNIFF_BYTES]
+                    if len(head) == SNIFF_BYTES:
+                        kind = sniff(head)
+                        if kind is None:
+                            raise BlobError('Unsupported image type')
+                size += len(chunk)
+                if size > max_bytes:
+                    raise BlobError(f'Image too large (max {max_bytes} bytes)')
+                sha.update(chunk)
+                out.write(chunk)
+        if size == 0:
+            raise BlobError('Empty image')
+        if kind is None:
+            # 文件比 SNIFF_BYTES 还短
+            kind = sniff(head)
+            if kind is None:
+                raise BlobError('Unsupported image type')
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    ext, mime = kind
+    return PendingBlob(tmp_path, sha.hexdigest(), ext, mime, size)
+
+
+def receive_many(streams, max_bytes=None):
+    """
+    并发接收多个上传流，按输入顺序返回 PendingBlob 列表
+    任一文件不合法时丢弃其余已写入的临时文件，抛出 BlobError，消息中带有文件序号（从 1 开始）
+    """
+    streams = list(streams)
+    with ThreadPoolExecutor(max_workers=min(len(streams), RECEIVE_THREADS) or 1) as pool:
+        futures = [pool.submit(receive, stream, max_bytes) for stream in streams]
+    blobs, error = [], None
+    for number, future in enumerate(futures, start=1):
+        try:
+            blobs.append(future.result())
+        except BlobError as e:
+            error = error or BlobError(f'Image {number}: {e}')
+        except BaseException as e:
+            error = error or e
+    if error is not None:
+        for blob in blobs:
+            blob.discard()
+        raise error
+    return blobs
+
+
+def acquire(cursor, blob):
+    """引用数 +1（不存在则新建记录），同时锁定该行直到事务结束"""
+    cursor.execute(
+        "INSERT INTO image_blob (content_hash, ext, mime, size, ref_count) VALUES (%s, %s, %s, %s, 1) "
+        "ON DUPLICATE KEY UPDATE ref_count = ref_count + 1",
+        (blob.digest, blob.ext, blob.mime, blob.size)
+    )
+
+
+def acquire_many(cursor, blobs):
+    """
+    批量引用：同一哈希出现几次引用数就加几，一条多行 INSERT 完成
+    按哈希排序写入，多个请求并发时加锁顺序一致，避免死锁
+    """
+    counts = {}
+    for blob in blobs:
+        counts.setdefault(blob.digest, [blob, 0])[1] += 1
+    rows = [
+        (digest, blob.ext, blob.mime, blob.size, count)
+        for digest, (blob, count) in sorted(counts.items())
+    ]
+    # 用行别名引用待插入的值（VALUES() 写法在 MySQL 8.0.20 起已弃用）
+    placeholders = ', '.join(['(%s, %s, %s, %s, %s)'] * len(rows))
+    cursor.execute(
+        f"INSERT INTO image_blob (content_hash, ext, mime, size, ref_count) VALUES {placeholders} AS new "
+        f"ON DUPLICATE KEY UPDATE ref_count = image_blob.ref_count + new.ref_count",
+        [value for row in rows for value in row]
+    )
+
+
+def release(cursor, digest):
+    """
+    引用数 -1，归零时删除记录
+    返回引用归零后应删除的文件路径（原图及其缩放版本），调用方在事务提交成功后交给 reclaim；未归零时返回 []
+    """
+    cursor.execute("SELECT ext, ref_count FROM image_blob WHERE content_hash = %s FOR UPDATE", (digest,))
+    row = cursor.fetchone()
+    if row is None:
+        return []
+    if row['ref_count'] > 1:
+        cursor.execute("UPDATE image_blob SET ref_count = ref_count - 1 WHERE content_hash = %s", (digest,))
+        return []
+    cursor.execute("DELETE FROM image_blob WHERE content_hash = %s", (digest,))
+    # 原图及由它生成的缩放版本（<哈希>_<宽度>.<扩展名>）
+    derived = glob.glob(os.path.join(Config.BLOB_STORE_DIR, digest[:2], f'{digest}_*'))
+    return [path_of(digest, row['ext']), *derived]
+
+
+def reclaim(conn, paths):
+    """
+    删除 release 返回的文件，须在释放引用的事务提交之后调用
+    每个哈希在单独的短事务中加锁确认仍没有记录后才删除；期间并发上传同一文件的 acquire 会等待。
+    出错时保留文件，由 `flask blobs gc` 清理
+    """
+    by_digest = {}
+    for path in paths:
+        by_digest.setdefault(digest_of(os.path.basename(path)), []).append(path)
+    for digest in sorted(by_digest):
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM image_blob WHERE content_hash = %s FOR UPDATE", (digest,))
+                if cursor.fetchone() is None:
+                    for path in by_digest[digest]:
+                        try:
+                            os.remove(path)
+                        except FileNotFoundError:
+                            pass
+            conn.commit()
+        except pymysql.Error as e:
+            conn.rollback()
+            print(f"Database error in blob reclaim: {e}")
+
+
+def scan(min_age=0):
+    """
+    遍历存储目录，返回 (文件列表 [(哈希, 路径)]（包括缩放版本）, 临时文件列表)
+    只包含修改时间早于 min_age 秒之前的文件，避免误删正在上传中的文件
+    """
+    cutoff = time.time() - min_age
+    blobs, partials = [], []
+    if not os.path.isdir(Config.BLOB_STORE_DIR):
+        return blobs, partials
+    for entry in os.scandir(Config.BLOB_STORE_DIR):
+        if not entry.is_dir():
+            continue
+        for item in os.scandir(entry.path):
+            if not item.is_file() or item.stat().st_mtime > cutoff:
+                continue
+            if entry.name == 'tmp':
+                partials.append(item.path)
+            else:
+                blobs.append((digest_of(item.name), item.path))
+    return blobs, partials
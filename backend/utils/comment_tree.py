@@ -0,0 +1,55 @@
+"""
+评论树构建
+
+一次遍历按 parent_id 建立子节点索引，再用显式栈迭代展开，整体 O(n)，
+不受递归深度限制。
+"""
+
+
+def build_comment_tree(comments, max_depth=None, max_replies=None):
+    """
+    将扁平评论列表组装为嵌套的 replies 树，返回根评论列表（保持输入顺序）
+    - parent_id 为空或父评论不在列表中的评论视为根
+    - max_depth：最大嵌套层数，超出的子孙回复平铺到第 max_depth 层，
+      max_depth=1 即所有回复平铺在根评论下
+    - max_replies：每个节点最多返回的回复数，reply_count 为实际回复总数
+    输入的评论 dict 不会被修改
+    """
+    nodes = {}
+    order = {}
+    for index, comment in enumerate(comments):
+        node = dict(comment)
+        nodes[node['id']] = node
+        order[node['id']] = index
+
+    roots = []
+    children = {}
+    for node in nodes.values():
+        parent_id = node.get('parent_id')
+        if parent_id is None or parent_id not in nodes:
+            roots.append(node)
+        else:
+            children.setdefault(parent_id, []).append(node)
+
+    stack = [(root, 0) for root in reversed(roots)]
+    while stack:
+        node, depth = stack.pop()
+        replies = children.get(node['id'], [])
+        if replies and max_depth is not None and depth + 1 >= max_depth:
+            # 已到最大层数：收集全部子孙平铺为本节点的回复，按原始顺序排列
+            flat = []
+            pending = list(replies)
+            while pending:
+                child = pending.pop()
+                flat.append(child)
+                pending.extend(children.get(child['id'], []))
+            flat.sort(key=lambda child: order[child['id']])
+            for child in flat:
+                child['replies'] = []
+                child['reply_count'] = 0
+            replies = flat
+        else:
+            stack.extend((child, depth + 1) for child in reversed(replies))
+        node['reply_count'] = len(replies)
+        node['replies'] = replies[:max_replies] if max_replies is not None else replies
+    return roots
@@ -0,0 +1,99 @@
+"""
+冗余计数维护
+
+post 表上的 like_count、comment_count 和 moment 表上的 like_count 是点赞表、评论表的冗余计数，
+所有写操作都通过这里在同一事务内更新，读操作直接读列即可。
+动态目前没有评论表，moment.comment_count 没有写入路径，保持默认值 0，不在此登记。
+计数漂移（历史数据、手工改库等）由 reconcile() 按批次对账修复。
+"""
+
+COUNTER_TARGETS = {
+    'post': {
+        'table': 'post',
+        'fk': 'post_id',
+        'sources': {'like_count': 'post_like', 'comment_count': 'post_comment'},
+    },
+    'moment': {
+        'table': 'moment',
+        'fk': 'moment_id',
+        'sources': {'like_count': 'moment_like'},
+    },
+}
+
+
+def _resolve(target, field):
+    spec = COUNTER_TARGETS[target]
+    if field not in spec['sources']:
+        raise ValueError(f'Unknown counter {target}.{field}')
+    return spec['table'], spec['sources'][field], spec['fk']
+
+
+def adjust(cursor, target, target_id, field, delta, return_value=False):
+    """
+    计数增减 delta，不会减到 0 以下
+    return_value=True 时借助 LAST_INSERT_ID(expr) 在同一条 UPDATE 中带回新值，
+    返回 None 表示目标行不存在
+    """
+    table, _, _ = _resolve(target, field)
+    if delta >= 0:
+        new_value = f"{field} + %s"
+    else:
+        # 列为 UNSIGNED 时直接相减可能越界，先取 LEAST 保证结果不小于 0
+        new_value = f"{field} - LEAST({field}, %s)"
+    if return_value:
+        new_value = f"LAST_INSERT_ID({new_value})"
+    cursor.execute(f"UPDATE `{table}` SET {field} = {new_value} WHERE id = %s", (abs(delta), target_id))
+    if cursor.rowcount == 0:
+        return None
+    return cursor.lastrowid if return_value else cursor.rowcount
+
+
+def recount(cursor, target, target_id, field):
+    """按源表重新统计单个目标的计数，用于级联删除等无法确定增量的场景"""
+    table, source, fk = _resolve(target, field)
+    cursor.execute(
+        f"UPDATE `{table}` SET {field} = (SELECT COUNT(*) FROM `{source}` WHERE {fk} = %s) WHERE id = %s",
+        (target_id, target_id)
+    )
+
+
+def reconcile(conn, targets=None, batch_size=500):
+    """
+    对账：按主键分批把冗余计数与源表的真实计数比对并修正
+    每批只聚合该批 id 范围内的源数据并单独提交，避免长事务和大范围锁
+    返回 {'post.like_count': 修正行数, ...}
+    """
+    repaired = {}
+    for target in targets or COUNTER_TARGETS:
+        spec = COUNTER_TARGETS[target]
+        table, fk = spec['table'], spec['fk']
+        for field, source in spec['sources'].items():
+            key = f'{target}.{field}'
+            repaired[key] = 0
+            last_id = 0
+            while True:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        f"SELECT id FROM `{table}` WHERE id > %s ORDER BY id ASC LIMIT %s",
+                        (last_id, batch_size)
+                    )
+                    ids = [row['id'] for row in cursor.fetchall()]
+                    if not ids:
+                        break
+                    low, high = ids[0], ids[-1]
+                    cursor.execute(f"""
+                        UPDATE `{table}` t
+                        LEFT JOIN (
+                            SELECT {fk}, COUNT(*) AS cnt
+                            FROM `{source}`
+                            WHERE {fk} BETWEEN %s AND %s
+                            GROUP BY {fk}
+                        ) s ON s.{fk} = t.id
+                        SET t.{field} = COALESCE(s.cnt, 0)
+                        WHERE t.id BETWEEN %s AND %s
+                          AND t.{field} <> COALESCE(s.cnt, 0)
+                    """, (low, high, low, high))
+                    repaired[key] += cursor.rowcount
+                conn.commit()
+                last_id = high
+    return repaired
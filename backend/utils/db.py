@@ -1,19 +1,264 @@
+import threading
+import time
+from collections import deque
+
 import pymysql
+from pymysql.constants import CLIENT
+from flask import g, has_app_context
 from config import Config
-import pymysql
+
+
+class PoolTimeout(Exception):
+    """在 checkout 超时时间内没有可用连接"""
+
+
+class ConnectionPool:
+    """
+    有界、线程安全的 MySQL 连接池
+    - max_size: 同时存在的最大连接数（空闲 + 借出）
+    - timeout: 借出连接时最长等待秒数
+    - max_idle: 空闲超过该秒数的连接直接回收
+    - max_lifetime: 创建超过该秒数的连接直接回收
+    - ping_interval: 空闲超过该秒数的连接在借出前先 ping 做健康检查
+    """
+
+    def __init__(self, max_size=10, timeout=5, max_idle=300, max_lifetime=3600, ping_interval=30, **connect_kwargs):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+        self.connect_kwargs = connect_kwargs
+
+        self._idle = deque()  # (conn, created_at, last_used)
+        self._created_at = {}  # id(conn) -> created_at
+        self._size = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'created': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'recycled_idle': 0,
+            'recycled_lifetime': 0,
+            'failed_health_checks': 0,
+        }
+
+    def _connect(self):
+        # FOUND_ROWS: UPDATE 的 rowcount 返回匹配行数而不是实际变更行数
+        return pymysql.connect(
+            cursorclass=pymysql.cursors.DictCursor,
+            client_flag=CLIENT.FOUND_ROWS,
+            **self.connect_kwargs
+        )
+
+    @staticmethod
+    def _close(conn):
+        # 关闭会发送 QUIT，属于网络操作，不在锁内调用
+        try:
+            conn.close()
+        except pymysql.Error:
+            pass
+
+    def _forget(self, conn):
+        # 调用方需持有 self._cond；只调整计数，连接由调用方在锁外关闭
+        self._created_at.pop(id(conn), None)
+        self._size -= 1
+        self._cond.notify()
+
+    def _take_idle(self, expired):
+        """
+        调用方需持有 self._cond
+        取出一个未过期的空闲连接 (conn, last_used)，过期的连接放入 expired 由调用方在锁外关闭
+        """
+        now = time.monotonic()
+        while self._idle:
+            conn, created_at, last_used = self._idle.pop()
+            if now - created_at > self.max_lifetime:
+                self._stats['recycled_lifetime'] += 1
+            elif now - last_used > self.max_idle:
+                self._stats['recycled_idle'] += 1
+            else:
+                return conn, last_used
+            self._forget(conn)
+            expired.append(conn)
+        return None
+
+    def acquire(self):
+        """
+        锁内只做簿记：取空闲连接或占一个名额；建连、ping、关闭过期连接都在锁外进行，
+        一个连接的网络往返不会阻塞其他线程借还连接
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            expired = []
+            reserved = False
+            with self._cond:
+                while True:
+                    idle = self._take_idle(expired)
+                    if idle is not None:
+                        break
+                    if self._size < self.max_size:
+                        # 先占位再建连，避免并发时超出上限
+                        self._size += 1
+                        reserved = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        break
+                    self._stats['waits'] += 1
+                    self._cond.wait(remaining)
+            for conn in expired:
+                self._close(conn)
+
+            if reserved:
+                try:
+                    conn = self._connect()
+                except pymysql.Error:
+                    with self._cond:
+                        # 建连失败，归还占位
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._created_at[id(conn)] = time.monotonic()
+                    self._stats['created'] += 1
+                    self._stats['checkouts'] += 1
+                return conn
+
+            if idle is None:
+                raise PoolTimeout(f'No connection available within {self.timeout}s')
+
+            conn, last_used = idle
+            if time.monotonic() - last_used > self.ping_interval:
+                try:
+                    conn.ping(reconnect=False)
+                except pymysql.Error:
+                    with self._cond:
+                        self._stats['failed_health_checks'] += 1
+                        self._forget(conn)
+                    self._close(conn)
+                    continue
+            with self._cond:
+                self._stats['checkouts'] += 1
+            return conn
+
+    def release(self, conn):
+        healthy = conn.open
+        if healthy:
+            try:
+                # 归还前结束未提交的事务，避免把脏状态带给下一个请求（锁外执行）
+                conn.rollback()
+            except pymysql.Error:
+                healthy = False
+        with self._cond:
+            if healthy:
+                created_at = self._created_at.get(id(conn), time.monotonic())
+                if time.monotonic() - created_at > self.max_lifetime:
+                    self._stats['recycled_lifetime'] += 1
+                    healthy = False
+            if healthy:
+                self._idle.append((conn, created_at, time.monotonic()))
+                self._cond.notify()
+            else:
+                self._forget(conn)
+        if not healthy:
+            self._close(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                **self._stats,
+            }
+
+
+class PooledConnection:
+    """
+    连接代理：close() 不会真正断开连接
+    - 请求内的连接由 teardown 统一归还，close() 为空操作，多次 get_db_connection() 拿到的是同一个连接
+    - 请求外（脚本、后台线程）的连接在 close() 时归还连接池
+    """
+
+    def __init__(self, pool, conn, request_scoped=False):
+        self._pool = pool
+        self._conn = conn
+        self._request_scoped = request_scoped
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._request_scoped or self._conn is None:
+            return
+        self._pool.release(self._conn)
+        self._conn = None
+
+    def release(self):
+        if self._conn is not None:
+            self._pool.release(self._conn)
+            self._conn = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    max_size=Config.DB_POOL_SIZE,
+                    timeout=Config.DB_POOL_TIMEOUT,
+                    max_idle=Config.DB_POOL_MAX_IDLE,
+                    max_lifetime=Config.DB_POOL_MAX_LIFETIME,
+                    ping_interval=Config.DB_POOL_PING_INTERVAL,
+                    host=Config.MYSQL_HOST,
+                    port=Config.MYSQL_PORT,
+                    user=Config.MYSQL_USER,
+                    password=Config.MYSQL_PASSWORD,
+                    database=Config.MYSQL_DB,
+                    charset=Config.MYSQL_CHARSET,
+                )
+    return _pool
+
 
 def get_db_connection():
+    """
+    获取数据库连接
+    在请求上下文中返回挂在 flask.g 上的同一个连接，请求结束时自动归还；
+    其他情况下返回一个独立的池化连接，close() 即归还
+    """
+    if has_app_context() and 'db_conn' in g:
+        return g.db_conn
+
     try:
-        connection = pymysql.connect(
-            host=Config.MYSQL_HOST,
-            port=Config.MYSQL_PORT,
-            user=Config.MYSQL_USER,
-            password=Config.MYSQL_PASSWORD,
-            database=Config.MYSQL_DB,
-            charset=Config.MYSQL_CHARSET,
-            cursorclass=pymysql.cursors.DictCursor
-        )
-        return connection
-    except pymysql.Error as e:
+        conn = get_pool().acquire()
+    except (pymysql.Error, PoolTimeout) as e:
         print(f"数据库连接失败: {e}")
-        return None
\ No newline at end of file
+        return None
+
+    if has_app_context():
+        g.db_conn = PooledConnection(get_pool(), conn, request_scoped=True)
+        return g.db_conn
+    return PooledConnection(get_pool(), conn)
+
+
+def release_db_connection(exception=None):
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        conn.release()
+
+
+def pool_stats():
+    return get_pool().stats()
+
+
+def init_app(app):
+    app.teardown_appcontext(release_db_connection)
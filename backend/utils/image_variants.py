@@ -0,0 +1,189 @@
+"""
+动态图片的缩略图与响应式版本
+
+上传提交后把文件交给进程池（解码、缩放是 CPU 密集操作，不占用请求线程和 GIL），
+按 IMAGE_VARIANT_WIDTHS 中小于原图宽度的每个宽度各生成一份原格式和一份 WebP，
+与原图放在同一目录：<哈希>_<宽度>.<扩展名>。
+完成后把原图尺寸和版本列表写回 image_blob.variants，并递增相关动态的内容版本号。
+variants 为 NULL 表示尚未处理，接口返回空的 srcset，前端回退到原图；
+进程重启时未完成的任务由 `flask blobs variants` 补齐。
+"""
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import pymysql
+
+from config import Config
+from utils import blob_store, versions
+from utils.db import get_db_connection
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+# 原图扩展名 -> 缩放后非 WebP 版本的格式（动图只取第一帧，存为 png）
+_FALLBACK_FORMAT = {
+    'jpg': ('jpg', 'JPEG'),
+    'png': ('png', 'PNG'),
+    'gif': ('png', 'PNG'),
+    'webp': None,
+}
+
+_MIME = {'jpg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif', 'webp': 'image/webp'}
+
+
+def variant_path(digest, width, ext):
+    return os.path.join(Config.BLOB_STORE_DIR, digest[:2], f'{digest}_{width}.{ext}')
+
+
+def variant_url(digest, width, ext):
+    return f'{Config.BLOB_STORE_URL}/{digest[:2]}/{digest}_{width}.{ext}'
+
+
+def _save(image, path, fmt, **options):
+    # 先写临时文件再重命名，读者不会看到写了一半的文件
+    tmp_path = f'{path}.part'
+    image.save(tmp_path, fmt, **options)
+    os.replace(tmp_path, path)
+
+
+def generate(digest, ext, widths):
+    """进程池任务：返回 (原图宽, 原图高, [[宽, 高, 扩展名], ...])"""
+    from PIL import Image, ImageOps
+
+    with Image.open(blob_store.path_of(digest, ext)) as source:
+        image = ImageOps.exif_transpose(source)
+        width, height = image.size
+        fallback = _FALLBACK_FORMAT[ext]
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+        variants = []
+        for target in sorted(set(widths)):
+            if target >= width:
+                break
+            target_height = max(1, round(height * target / width))
+            resized = image.resize((target, target_height), Image.Resampling.LANCZOS)
+            _save(resized, variant_path(digest, target, 'webp'), 'WEBP', quality=WEBP_QUALITY, method=4)
+            variants.append([target, target_height, 'webp'])
+            if fallback:
+                fallback_ext, fallback_fmt = fallback
+                if fallback_fmt == 'JPEG':
+                    _save(resized.convert('RGB'), variant_path(digest, target, fallback_ext), fallback_fmt,
+                          quality=JPEG_QUALITY, optimize=True, progressive=True)
+                else:
+                    _save(resized, variant_path(digest, target, fallback_ext), fallback_fmt, optimize=True)
+                variants.append([target, target_height, fallback_ext])
+    return width, height, variants
+
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=Config.IMAGE_WORKERS)
+    return _executor
+
+
+def save_result(cursor, digest, width, height, variants):
+    """写回处理结果并使引用该图片的动态的 ETag 失效；文件已被删除时不做任何事"""
+    cursor.execute(
+        "UPDATE image_blob SET width = %s, height = %s, variants = %s WHERE content_hash = %s",
+        (width, height, json.dumps(variants), digest)
+    )
+    cursor.execute("SELECT DISTINCT moment_id FROM moment_image WHERE blob_hash = %s", (digest,))
+    moment_ids = [row['moment_id'] for row in cursor.fetchall()]
+    if moment_ids:
+        versions.bump(cursor, *(f'moment:{moment_id}' for moment_id in moment_ids))
+
+
+def _finished(digest, future):
+    with _lock:
+        _pending.discard(digest)
+    try:
+        width, height, variants = future.result()
+    except Exception as e:
+        # 保持 NULL，继续回退到原图，可由 `flask blobs variants` 重试
+        print(f"Image variant generation failed for {digest}: {e}")
+        return
+    conn = get_db_connection()
+    if conn is None:
+        return
+    try:
+        with conn.cursor() as cursor:
+            save_result(cursor, digest, width, height, variants)
+        conn.commit()
+    except pymysql.Error as e:
+        conn.rollback()
+        print(f"Database error in image variant save: {e}")
+    finally:
+        conn.close()
+
+
+def schedule(digest, ext):
+    """上传事务提交后调用，立即返回；同一文件正在处理时不重复提交"""
+    with _lock:
+        if digest in _pending:
+            return
+        _pending.add(digest)
+    try:
+        future = _get_executor().submit(generate, digest, ext, Config.IMAGE_VARIANT_WIDTHS)
+    except RuntimeError as e:
+        with _lock:
+            _pending.discard(digest)
+        print(f"Image variant scheduling failed for {digest}: {e}")
+        return
+    future.add_done_callback(partial(_finished, digest))
+
+
+def schedule_missing(cursor, digests):
+    """上传事务提交后调用：把其中尚未生成缩放版本的文件（新文件或之前处理失败的）交给进程池"""
+    digests = tuple(set(digests))
+    if not digests:
+        return
+    cursor.execute(
+        "SELECT content_hash, ext FROM image_blob WHERE content_hash IN %s AND variants IS NULL", (digests,)
+    )
+    for row in cursor.fetchall():
+        schedule(row['content_hash'], row['ext'])
+
+
+def attach(images):
+    """
+    把查询中带出的 blob_hash、variants 列转换为前端可直接使用的字段，原地修改：
+    width / height：原图尺寸（未知时为 None）
+    variants：[{url, width, height, type}]，按宽度升序
+    srcset：{MIME: 'url 320w, url 640w, ...'}，与原图同类型的一组末尾附上原图；尚未处理时为空
+    """
+    for image in images:
+        digest = image.pop('blob_hash', None)
+        raw = image.pop('variants', None)
+        image.setdefault('width', None)
+        image.setdefault('height', None)
+        image['variants'] = []
+        image['srcset'] = {}
+        if not digest or raw is None:
+            continue
+        for width, height, ext in json.loads(raw):
+            image['variants'].append({
+                'url': variant_url(digest, width, ext),
+                'width': width,
+                'height': height,
+                'type': _MIME[ext],
+            })
+        if not image['variants']:
+            continue
+        candidates = {}
+        for variant in image['variants']:
+            candidates.setdefault(variant['type'], []).append(f"{variant['url']} {variant['width']}w")
+        original_type = _MIME.get(image['image_url'].rsplit('.', 1)[-1])
+        if original_type in candidates and image['width']:
+            candidates[original_type].append(f"{image['image_url']} {image['width']}w")
+        image['srcset'] = {mime: ', '.join(entries) for mime, entries in candidates.items()}
+    return images
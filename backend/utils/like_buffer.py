@@ -0,0 +1,232 @@
+"""
+点赞写回缓冲（write-behind）
+
+开启 LIKE_WRITE_BEHIND 后，点赞/取消点赞只记录在进程内缓冲里，按 (目标, 用户) 合并：
+同一用户先赞后取消会互相抵消，不产生任何写入。后台线程按 LIKE_FLUSH_INTERVAL
+批量把缓冲写回数据库：每个目标先加行锁，再用多行 INSERT IGNORE / DELETE 写入点赞记录，
+计数按这两条语句实际影响的行数调整，多 worker 各自缓冲或与直接点赞并发时计数也不会漂移。
+返回给前端的 like_count = 数据库中的计数 + 尚未落库的增量（估计值，以落库结果为准）。
+"""
+import atexit
+import threading
+
+import pymysql
+from config import Config
+from utils import counters, response_cache, versions
+from utils.db import get_db_connection
+from utils.likes import LIKE_TABLES
+
+
+class LikeBuffer:
+
+    def __init__(self, max_pending=1000):
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        # (target, target_id, user_id) -> {'liked': 目标状态, 'persisted': 数据库中的状态}
+        self._pending = {}
+        # 正在写回、尚未提交的批次，期间的新操作需要以它为基准
+        self._inflight = {}
+        # (target, target_id) -> pending 与 inflight 中条目的增量之和，随条目增删维护
+        self._deltas = {}
+        self._flush_lock = threading.Lock()
+        self._flush_needed = threading.Event()
+        self._stats = {'recorded': 0, 'coalesced': 0, 'flushes': 0, 'flushed_rows': 0, 'flush_errors': 0}
+
+    def state(self, target, target_id, user_id):
+        """返回缓冲中记录的点赞状态，没有记录时返回 None"""
+        key = (target, target_id, user_id)
+        with self._lock:
+            entry = self._pending.get(key) or self._inflight.get(key)
+            return entry['liked'] if entry else None
+
+    def _add_delta(self, key, amount):
+        # 调用方需持有 self._lock
+        target_key = key[:2]
+        total = self._deltas.get(target_key, 0) + amount
+        if total:
+            self._deltas[target_key] = total
+        else:
+            self._deltas.pop(target_key, None)
+
+    def record(self, target, target_id, user_id, liked, persisted):
+        key = (target, target_id, user_id)
+        with self._lock:
+            self._stats['recorded'] += 1
+            entry = self._pending.get(key)
+            if entry is not None:
+                persisted = entry['persisted']
+            elif key in self._inflight:
+                # 写回提交后数据库状态就是在途批次的目标状态
+                persisted = self._inflight[key]['liked']
+            if entry is not None:
+                self._add_delta(key, -_delta(entry))
+            if liked == persisted:
+                # 与落库状态一致，之前的操作被抵消
+                if self._pending.pop(key, None) is not None:
+                    self._stats['coalesced'] += 1
+            else:
+                self._pending[key] = {'liked': liked, 'persisted': persisted}
+                self._add_delta(key, _delta(self._pending[key]))
+            if len(self._pending) >= self.max_pending:
+                self._flush_needed.set()
+
+    def pending_delta(self, target, target_id):
+        with self._lock:
+            return self._deltas.get((target, target_id), 0)
+
+    def stats(self):
+        with self._lock:
+            return {'pending': len(self._pending), 'inflight': len(self._inflight), **self._stats}
+
+    def flush(self):
+        """把缓冲写回数据库，返回写回的条目数；失败时条目放回缓冲等待下次重试"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                self._inflight, self._pending = self._pending, {}
+                batch = self._inflight
+            self._flush_needed.clear()
+
+            conn = get_db_connection()
+            if conn is None:
+                self._restore(batch)
+                return 0
+            try:
+                with conn.cursor() as cursor:
+                    _write_batch(cursor, batch)
+                conn.commit()
+            except pymysql.Error as e:
+                conn.rollback()
+                print(f"Database error in like buffer flush: {e}")
+                self._restore(batch)
+                return 0
+            finally:
+                conn.close()
+
+            # 点赞数落库后，相关文章的缓存响应才需要失效
+            for target_id in {tid for (target, tid, _) in batch if target == 'post'}:
+                response_cache.invalidate_post(target_id)
+
+            with self._lock:
+                for key, entry in batch.items():
+                    self._add_delta(key, -_delta(entry))
+                self._inflight = {}
+                self._stats['flushes'] += 1
+                self._stats['flushed_rows'] += len(batch)
+            return len(batch)
+
+    def _restore(self, batch):
+        with self._lock:
+            self._stats['flush_errors'] += 1
+            self._inflight = {}
+            for key, entry in batch.items():
+                newer = self._pending.get(key)
+                if newer is None:
+                    # 条目从 inflight 回到 pending，增量不变
+                    self._pending[key] = entry
+                elif newer['liked'] == entry['persisted']:
+                    # 在途期间用户又改回了原状态，整体抵消
+                    del self._pending[key]
+                    self._add_delta(key, -_delta(entry) - _delta(newer))
+                else:
+                    newer['persisted'] = entry['persisted']
+                    self._add_delta(key, -_delta(entry))
+
+    def run_forever(self, interval):
+        while True:
+            self._flush_needed.wait(interval)
+            self.flush()
+
+
+def _delta(entry):
+    return 1 if entry['liked'] else -1
+
+
+def _write_batch(cursor, batch):
+    """
+    写回一个批次；计数增量取自 INSERT IGNORE / DELETE 的实际影响行数，而不是缓冲中记录的 persisted，
+    后者只是进程内的估计，其他 worker 或直接点赞接口可能已经改变了数据库状态
+    """
+    by_target = {}
+    for (target, target_id, user_id), entry in batch.items():
+        group = by_target.setdefault(target, {}).setdefault(target_id, {'insert': [], 'delete': []})
+        group['insert' if entry['liked'] else 'delete'].append(user_id)
+
+    for target, groups in by_target.items():
+        target_table, table, fk = LIKE_TABLES[target]
+        # 先按 id 顺序锁定目标行（多个 worker 同时写回时加锁顺序一致），顺带过滤缓冲期间已被删除的目标
+        cursor.execute(
+            f"SELECT id FROM `{target_table}` WHERE id IN %s ORDER BY id FOR UPDATE",
+            (tuple(groups),)
+        )
+        existing = [row['id'] for row in cursor.fetchall()]
+        changed = []
+        for target_id in existing:
+            group = groups[target_id]
+            delta = 0
+            if group['insert']:
+                # 目标已锁定且存在，IGNORE 只会跳过重复点赞
+                placeholders = ', '.join(['(%s, %s)'] * len(group['insert']))
+                cursor.execute(
+                    f"INSERT IGNORE INTO {table} ({fk}, user_id) VALUES {placeholders}",
+                    [value for user_id in group['insert'] for value in (target_id, user_id)]
+                )
+                delta += cursor.rowcount
+            if group['delete']:
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE {fk} = %s AND user_id IN %s",
+                    (target_id, tuple(group['delete']))
+                )
+                delta -= cursor.rowcount
+            if delta:
+                counters.adjust(cursor, target, target_id, 'like_count', delta)
+                changed.append(target_id)
+        versions.bump(cursor, *(scope for target_id in changed for scope in versions.target_scopes(target, target_id)))
+
+
+def settle(cursor, target, target_id, user_id, liked=None):
+    """
+    写回模式下的点赞：一次只读查询拿到计数和当前状态，不加锁、不提交
+    liked 为 None 时切换当前状态，否则设置为指定状态
+    返回 (liked, like_count)，目标不存在时返回 None
+    """
+    target_table, table, fk = LIKE_TABLES[target]
+    cursor.execute(f"""
+        SELECT t.like_count,
+            EXISTS(SELECT 1 FROM {table} l WHERE l.{fk} = t.id AND l.user_id = %s) AS liked
+        FROM `{target_table}` t
+        WHERE t.id = %s
+    """, (user_id, target_id))
+    row = cursor.fetchone()
+    if not row:
+        return None
+
+    persisted = bool(row['liked'])
+    if liked is None:
+        current = buffer.state(target, target_id, user_id)
+        liked = not (persisted if current is None else current)
+    buffer.record(target, target_id, user_id, liked, persisted)
+    like_count = row['like_count'] + buffer.pending_delta(target, target_id)
+    return liked, max(like_count, 0)
+
+
+def enabled():
+    return Config.LIKE_WRITE_BEHIND
+
+
+buffer = LikeBuffer(max_pending=Config.LIKE_BUFFER_MAX_PENDING)
+_flusher = None
+
+
+def init_app(app):
+    global _flusher
+    if not enabled() or _flusher is not None:
+        return
+    _flusher = threading.Thread(
+        target=buffer.run_forever, args=(Config.LIKE_FLUSH_INTERVAL,),
+        name='like-buffer-flusher', daemon=True
+    )
+    _flusher.start()
+    # 进程退出前把剩余的点赞写回
+    atexit.register(buffer.flush)
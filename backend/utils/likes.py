@@ -0,0 +1,37 @@
+"""
+幂等点赞
+
+PUT/DELETE 点赞接口直接声明目标状态：INSERT IGNORE / DELETE 一条语句完成点赞记录的变更，
+受影响行数就是计数增量，只有真的发生变化时才执行一次带回新值的计数 UPDATE，不加锁、不先查询。
+- 重复点赞时 INSERT IGNORE 影响 0 行，不会因唯一约束报错，也不会重复计数
+- 目标不存在时外键约束同样被 IGNORE 降级为警告，影响 0 行，随后读取计数时得到空结果
+"""
+from utils import counters
+
+LIKE_TABLES = {
+    target: (spec['table'], spec['sources']['like_count'], spec['fk'])
+    for target, spec in counters.COUNTER_TARGETS.items()
+}
+
+
+def set_like(cursor, target, target_id, user_id, liked):
+    """
+    将用户对目标的点赞状态设置为 liked
+    返回更新后的点赞数，目标不存在时返回 None
+    """
+    table, like_table, fk = LIKE_TABLES[target]
+    if liked:
+        cursor.execute(f"INSERT IGNORE INTO {like_table} ({fk}, user_id) VALUES (%s, %s)", (target_id, user_id))
+        delta = cursor.rowcount
+    else:
+        cursor.execute(f"DELETE FROM {like_table} WHERE {fk} = %s AND user_id = %s", (target_id, user_id))
+        delta = -cursor.rowcount
+
+    if delta:
+        # 计数 UPDATE 通过 LAST_INSERT_ID 带回新值，不需要再查询
+        return counters.adjust(cursor, target, target_id, 'like_count', delta, return_value=True)
+
+    # 状态本来就是目标状态（或目标不存在），只读一次当前计数
+    cursor.execute(f"SELECT like_count FROM `{table}` WHERE id = %s", (target_id,))
+    row = cursor.fetchone()
+    return row['like_count'] if row else None
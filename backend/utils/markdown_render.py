@@ -0,0 +1,96 @@
+"""
+Markdown 服务端渲染
+
+文章写入时把正文渲染为 HTML（代码块用 Pygments 高亮，标题生成锚点并提取目录），
+结果按内容哈希存入 post_render 表，post.content_hash 指向当前版本：
+- 相同正文只渲染一次，修改后改回旧内容可直接复用
+- 哈希包含 RENDER_VERSION，渲染规则变化时递增它，再执行 `flask posts render` 全量重建
+get_post_by_id 通过 JOIN 直接读取渲染结果，请求路径上没有渲染开销。
+代码块的配色由 `flask posts highlight-css` 生成的 frontend/MyBlog/src/assets/highlight.css 提供，
+更换 HIGHLIGHT_STYLE 后重新执行该命令并重新构建前端。
+"""
+import hashlib
+import json
+
+import mistune
+from mistune.toc import add_toc_hook
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
+from pygments.util import ClassNotFound
+
+RENDER_VERSION = 1
+HIGHLIGHT_STYLE = 'default'
+
+_formatter = HtmlFormatter(cssclass='highlight', style=HIGHLIGHT_STYLE)
+
+
+class HighlightRenderer(mistune.HTMLRenderer):
+
+    def block_code(self, code, info=None):
+        language = info.split(None, 1)[0] if info else None
+        if language:
+            try:
+                return highlight(code, get_lexer_by_name(language, stripall=False), _formatter)
+            except ClassNotFound:
+                pass
+        return super().block_code(code, info)
+
+
+_markdown = None
+
+
+def _get_markdown():
+    # 每个进程（包括渲染进程池中的子进程）各自创建一次解析器
+    global _markdown
+    if _markdown is None:
+        _markdown = mistune.create_markdown(
+            escape=True,
+            renderer=HighlightRenderer(escape=True),
+            plugins=['strikethrough', 'table', 'url', 'task_lists']
+        )
+        add_toc_hook(_markdown, min_level=1, max_level=3)
+    return _markdown
+
+
+def content_hash(content):
+    raw = f'{RENDER_VERSION}:{content or ""}'.encode('utf-8')
+    return hashlib.sha256(raw).hexdigest()
+
+
+def render(content):
+    """返回 (html, toc)，toc 为 [{'level', 'id', 'text'}]"""
+    html, state = _get_markdown().parse(content or '')
+    toc = [{'level': level, 'id': anchor, 'text': text} for level, anchor, text in state.env.get('toc_items', [])]
+    return html, toc
+
+
+def render_entry(content):
+    """进程池任务：返回 (content_hash, html, toc_json)"""
+    html, toc = render(content)
+    return content_hash(content), html, json.dumps(toc, ensure_ascii=False)
+
+
+def save_entries(cursor, entries):
+    """批量写入渲染结果，已存在的哈希覆盖（重建时使用）"""
+    if entries:
+        # 行别名写法（VALUES() 已弃用）；正文可能很大，逐行执行也避免单条语句超过 max_allowed_packet
+        cursor.executemany(
+            "INSERT INTO post_render (content_hash, html, toc) VALUES (%s, %s, %s) AS new "
+            "ON DUPLICATE KEY UPDATE html = new.html, toc = new.toc",
+            entries
+        )
+
+
+def store(cursor, content):
+    """确保该正文的渲染结果存在，返回内容哈希；已渲染过的内容不会重复渲染"""
+    digest = content_hash(content)
+    cursor.execute("SELECT 1 FROM post_render WHERE content_hash = %s", (digest,))
+    if cursor.fetchone() is None:
+        save_entries(cursor, [render_entry(content)])
+    return digest
+
+
+def css():
+    """代码高亮样式表，与渲染时使用的 HIGHLIGHT_STYLE 一致，由 `flask posts highlight-css` 写入前端"""
+    return _formatter.get_style_defs('.highlight')
@@ -0,0 +1,43 @@
+"""
+动态 feed 组装
+
+一页动态所需的作者、图片在固定次数的查询内批量取回，再在 Python 中拼装，
+点赞数/评论数直接读取 moment 表上的冗余计数列。查询次数与每页条数无关。
+"""
+from utils import image_variants, user_cache
+
+# 动态目前都由站长发布，作者固定为用户ID 1
+MOMENT_AUTHOR_ID = 1
+
+MOMENT_COLUMNS = 'id, content, publish_time, like_count, comment_count'
+
+
+def assemble_moments(cursor, moments):
+    """为一批动态补充 user、likes_count、comments、images 字段，原地修改并返回"""
+    moments = list(moments)
+    if not moments:
+        return moments
+    moment_ids = tuple(moment['id'] for moment in moments)
+
+    # 作者信息：走用户缓存，命中时不查库
+    author = user_cache.get_user(cursor, MOMENT_AUTHOR_ID)
+    user_info = {'id': author['id'], 'username': author['username']} if author else {'username': '未知用户'}
+
+    # 整页图片连同缩放版本一次取回，按动态分组
+    cursor.execute("""
+        SELECT mi.id, mi.moment_id, mi.image_url, mi.display_order, mi.blob_hash, b.width, b.height, b.variants
+        FROM moment_image mi
+        LEFT JOIN image_blob b ON b.content_hash = mi.blob_hash
+        WHERE mi.moment_id IN %s
+        ORDER BY mi.moment_id, mi.display_order
+    """, (moment_ids,))
+    images_by_moment = {}
+    for image in image_variants.attach(cursor.fetchall()):
+        images_by_moment.setdefault(image.pop('moment_id'), []).append(image)
+
+    for moment in moments:
+        moment['user'] = dict(user_info)
+        moment['likes_count'] = moment.pop('like_count')  # 使用 likes_count 以匹配前端
+        moment['comments'] = []  # 详细评论需要另外查询
+        moment['images'] = images_by_moment.get(moment['id'], [])
+    return moments
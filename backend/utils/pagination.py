@@ -0,0 +1,51 @@
+"""
+游标（keyset）分页
+
+游标是对最后一行排序键（排序列 + id）的不透明编码，下一页直接用
+WHERE (sort_key, id) 比较定位，不需要像 OFFSET 那样扫描并丢弃前面的行，
+第 N 页和第 1 页的代价相同。
+"""
+import base64
+import json
+
+
+def encode_cursor(*values):
+    raw = json.dumps(values, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, size):
+    """解析游标，返回长度为 size 的列表；空游标返回 None，非法游标抛出 ValueError"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f'Invalid cursor: {token}') from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError(f'Invalid cursor: {token}')
+    return values
+
+
+def keyset_condition(sort_column, id_column, descending):
+    """生成 "排在游标之后" 的条件，参数顺序为 (sort_value, sort_value, id)"""
+    op = '<' if descending else '>'
+    return f"({sort_column} {op} %s OR ({sort_column} = %s AND {id_column} {op} %s))"
+
+
+def split_page(rows, per_page):
+    """
+    查询时多取一行（LIMIT per_page + 1），据此判断是否还有下一页，无需 COUNT(*)
+    返回 (本页数据, has_more)
+    """
+    rows = list(rows)
+    return rows[:per_page], len(rows) > per_page
+
+
+def next_cursor(rows, has_more, sort_key, id_key='id'):
+    """还有下一页时根据最后一行生成游标，否则返回 None"""
+    if not has_more or not rows:
+        return None
+    last = rows[-1]
+    return encode_cursor(last[sort_key], last[id_key])
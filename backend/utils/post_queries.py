@@ -0,0 +1,165 @@
+"""
+文章列表查询
+
+点赞数、评论数由 utils.counters 冗余维护在 post 表上，文章行与计数在一条 SQL 内取回。
+无论取多少篇文章，数据库往返次数都是 1。
+
+列表支持两种投影：
+- full：包含正文 content（兼容旧前端）
+- summary：只返回标题、摘要、计数和时间，摘要 excerpt 在写入时预先生成并存入 post 表
+fields= 可在允许的列中进一步挑选（稀疏字段集），id 始终返回。
+
+分页列表按 POST_SORTS 排序，游标为 (排序值, id)，由 (排序列, id) 复合索引支撑，
+不需要 COUNT(*) 也不需要 OFFSET。
+"""
+import json
+import re
+
+from config import Config
+from utils import markdown_render
+from utils.pagination import keyset_condition, next_cursor, split_page
+
+POST_COLUMNS = ('id', 'title', 'content', 'like_count', 'comment_count')
+SUMMARY_COLUMNS = ('id', 'title', 'excerpt', 'like_count', 'comment_count', 'create_time', 'update_time')
+LISTABLE_COLUMNS = frozenset(POST_COLUMNS + SUMMARY_COLUMNS)
+POST_VIEWS = {'full': POST_COLUMNS, 'summary': SUMMARY_COLUMNS}
+# 排序方式 -> 排序列（None 表示只按 id），全部降序，id 作为并列时的次序
+POST_SORTS = {'newest': None, 'likes': 'like_count', 'comments': 'comment_count'}
+
+_CODE_BLOCK = re.compile(r'```.*?(```|$)', re.S)
+_IMAGE = re.compile(r'!\[[^\]]*\]\([^)]*\)')
+_LINK = re.compile(r'\[([^\]]*)\]\([^)]*\)')
+_HTML_TAG = re.compile(r'<[^>]+>')
+_MARKUP = re.compile(r'(^|\n)\s*(#{1,6}|>|[-*+]|\d+\.)\s+|[`*_~]')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def make_excerpt(content, length=None):
+    """
+    由正文生成纯文本摘要：去掉代码块、图片、链接地址、HTML 标签和常见 Markdown 标记，
+    合并空白后截取前 length 个字符
+    """
+    length = length or Config.POST_EXCERPT_LENGTH
+    text = _CODE_BLOCK.sub(' ', content or '')
+    text = _IMAGE.sub(' ', text)
+    text = _LINK.sub(r'\1', text)
+    text = _HTML_TAG.sub(' ', text)
+    text = _MARKUP.sub(' ', text)
+    text = _WHITESPACE.sub(' ', text).strip()
+    if len(text) <= length:
+        return text
+    return text[:length].rstrip() + '…'
+
+
+def parse_columns(view=None, fields=None):
+    """
+    根据 view / fields 参数确定列表返回的列
+    fields 为逗号分隔的列名，给出时优先于 view；非法参数抛出 ValueError
+    """
+    if fields:
+        requested = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = [field for field in requested if field not in LISTABLE_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        return tuple(dict.fromkeys(['id', *requested]))
+    view = (view or 'full').lower()
+    if view not in POST_VIEWS:
+        raise ValueError(f"view must be one of {', '.join(POST_VIEWS)}")
+    return POST_VIEWS[view]
+
+
+def _build_posts_sql(columns, post_ids=None, order_by='p.id ASC'):
+    select_cols = ', '.join(f'p.{col}' for col in columns)
+    post_filter = 'WHERE p.id IN %(post_ids)s' if post_ids is not None else ''
+    return f"""
+        SELECT {select_cols}
+        FROM post p
+        {post_filter}
+        ORDER BY {order_by}
+    """
+
+
+def fetch_posts(cursor, columns=POST_COLUMNS, post_ids=None):
+    """
+    获取文章，点赞数、评论数作为普通列按 columns 一并取回
+    post_ids 为 None 时返回全部文章，否则只返回指定文章
+    """
+    if post_ids is not None:
+        post_ids = tuple(post_ids)
+        if not post_ids:
+            return []
+    sql = _build_posts_sql(columns, post_ids)
+    cursor.execute(sql, {'post_ids': post_ids} if post_ids is not None else None)
+    return list(cursor.fetchall())
+
+
+def fetch_post(cursor, post_id, columns=POST_COLUMNS):
+    posts = fetch_posts(cursor, columns, post_ids=(post_id,))
+    return posts[0] if posts else None
+
+
+def fetch_post_detail(cursor, post_id):
+    """
+    文章详情，带预渲染的 content_html 与目录 toc（JOIN post_render，一次查询）
+    尚未渲染过的文章（如迁移后未执行 `flask posts render`）在此补渲染一次并存储，调用方负责提交
+    """
+    cursor.execute("""
+        SELECT p.id, p.title, p.content, p.like_count, p.comment_count, p.content_hash,
+            r.html AS content_html, r.toc
+        FROM post p
+        LEFT JOIN post_render r ON r.content_hash = p.content_hash
+        WHERE p.id = %s
+    """, (post_id,))
+    post = cursor.fetchone()
+    if not post:
+        return None
+    stored_hash = post.pop('content_hash')
+    toc = post.pop('toc')
+    if post['content_html'] is None or stored_hash != markdown_render.content_hash(post['content']):
+        # 未渲染或渲染版本已变化
+        digest, post['content_html'], toc = markdown_render.render_entry(post['content'])
+        markdown_render.save_entries(cursor, [(digest, post['content_html'], toc)])
+        cursor.execute("UPDATE post SET content_hash = %s, update_time = update_time WHERE id = %s", (digest, post_id))
+    post['toc'] = json.loads(toc)
+    return post
+
+
+def fetch_post_page(cursor, columns=POST_COLUMNS, sort='newest', after=None, per_page=10):
+    """
+    按 sort 游标分页获取文章，after 为 decode_cursor 解析出的 (排序值, id)
+    返回 (本页文章, has_more, next_cursor)
+    """
+    sort_column = POST_SORTS[sort]
+    sort_key = sort_column or 'id'
+    # 生成游标需要排序列和 id，未请求的列取回后再去掉
+    select = tuple(dict.fromkeys([*columns, 'id', sort_key]))
+    select_cols = ', '.join(f'p.{col}' for col in select)
+
+    params = []
+    where = ''
+    if after:
+        if sort_column:
+            where = 'WHERE ' + keyset_condition(f'p.{sort_column}', 'p.id', descending=True)
+            params.extend([after[0], after[0], after[1]])
+        else:
+            where = 'WHERE p.id < %s'
+            params.append(after[1])
+    order_by = f'p.{sort_column} DESC, p.id DESC' if sort_column else 'p.id DESC'
+    sql = f"""
+        SELECT {select_cols}
+        FROM post p
+        {where}
+        ORDER BY {order_by}
+        LIMIT %s
+    """
+    # 多取一行用于判断 has_more
+    params.append(per_page + 1)
+    cursor.execute(sql, params)
+    posts, has_more = split_page(cursor.fetchall(), per_page)
+    cursor_for_next = next_cursor(posts, has_more, sort_key)
+
+    extra = [col for col in select if col not in columns]
+    for post in posts:
+        for col in extra:
+            del post[col]
+    return posts, has_more, cursor_for_next
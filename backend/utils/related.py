@@ -0,0 +1,340 @@
+"""
+相关文章推荐
+
+文章标题 + 正文切词后用哈希特征（crc32 取模，进程间稳定）构成词袋，经子线性 TF、平滑 IDF
+和 L2 归一化得到 TF-IDF 稀疏矩阵 X，余弦相似度即 X @ X.T。
+- 全量构建：按批次计算 X[批] @ X.T，每篇文章只保留相似度最高的 RELATED_TOP_K 篇
+- 增量更新：新建/修改文章时只更新该文章用到的词的文档频率，按当前 IDF 重算这一行并替换进矩阵，
+  再计算它与全体文章的相似度（一次稀疏矩阵乘向量），据此更新自身列表并把它插入其他文章的列表；
+  原列表中含有该文章的条目（由反向索引直接找到）整行重算
+- IDF 变化对其他行权重的影响不在增量路径中传播，由每 RELATED_REBUILD_INTERVAL 秒一次的全量重建修正
+所有修改（增量更新、删除、全量重建）都交给同一个后台线程按提交顺序执行，
+重建期间提交的更新排在重建之后，不会被重建结果覆盖。
+修改在副本上完成后整体替换，读取方不加锁，拿到的总是某次修改前或修改后的完整结果。
+接口只读取预先算好的列表，请求路径上没有矩阵运算。
+"""
+import math
+import queue
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+import pymysql
+from scipy import sparse
+
+from config import Config
+from utils.db import get_db_connection
+
+N_FEATURES = 2 ** 18
+BATCH_SIZE = 256
+
+_TOKEN = re.compile(r'[a-z0-9_]+|[一-鿿]+')
+
+
+def tokenize(text):
+    """英文数字按单词切分，中文按相邻两字（单字词保留单字）切分"""
+    for match in _TOKEN.finditer((text or '').lower()):
+        word = match.group()
+        if '一' <= word[0] <= '鿿':
+            if len(word) == 1:
+                yield word
+            for i in range(len(word) - 1):
+                yield word[i:i + 2]
+        elif len(word) > 1:
+            yield word
+
+
+def vectorize(title, content):
+    """返回 (列下标数组, 子线性词频数组)；标题词计两次以提高权重"""
+    counts = {}
+    for text in (title, title, content):
+        for token in tokenize(text):
+            column = zlib.crc32(token.encode('utf-8')) % N_FEATURES
+            counts[column] = counts.get(column, 0) + 1
+    columns = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    values = np.fromiter((1.0 + math.log(c) for c in counts.values()), dtype=np.float64, count=len(counts))
+    return columns, values
+
+
+def _splice(matrix, start, stop, row=None):
+    """把 CSR 矩阵的 [start, stop) 行替换为一行 (列下标, 权重)，row 为 None 时只删除；只拼接数组，不遍历其他行"""
+    indptr, indices, data = matrix.indptr, matrix.indices, matrix.data
+    lo, hi = indptr[start], indptr[stop]
+    columns, values = row if row is not None else (indices[:0], data[:0])
+    inserted = [lo + len(columns)] if row is not None else []
+    return sparse.csr_matrix(
+        (
+            np.concatenate([data[:lo], values, data[hi:]]),
+            np.concatenate([indices[:lo], columns, indices[hi:]]),
+            np.concatenate([indptr[:start + 1], inserted, indptr[stop + 1:] - (hi - lo) + len(columns)]),
+        ),
+        shape=(len(indptr) - 1 - (stop - start) + (row is not None), N_FEATURES)
+    )
+
+
+class RelatedIndex:
+    """
+    只由后台线程修改（见模块说明）；_matrix、_ids、_rows、_related 每次修改都整体替换为新对象
+    """
+
+    def __init__(self, top_k=10):
+        self.top_k = top_k
+        self._docs = {}        # post_id -> (columns, values)，原始词频
+        self._df = np.zeros(N_FEATURES, dtype=np.int64)
+        self._ids = []         # 矩阵行 -> post_id
+        self._rows = {}        # post_id -> 矩阵行
+        self._matrix = sparse.csr_matrix((0, N_FEATURES))
+        self._related = {}     # post_id -> [(post_id, score)]，按 score 降序
+        self._referrers = {}   # post_id -> 相关列表中含有它的文章集合
+        self.built_at = None
+
+    def __contains__(self, post_id):
+        return post_id in self._docs
+
+    def _weigh(self, doc):
+        """按当前文档频率计算一行的 TF-IDF 权重并归一化"""
+        columns, values = doc
+        idf = np.log((1.0 + len(self._docs)) / (1.0 + self._df[columns])) + 1.0
+        weights = values * idf
+        norm = np.sqrt(np.dot(weights, weights))
+        return columns, weights / norm if norm else weights
+
+    def _build_matrix(self):
+        self._ids = list(self._docs)
+        self._rows = {post_id: row for row, post_id in enumerate(self._ids)}
+        indptr = [0]
+        indices = []
+        data = []
+        for post_id in self._ids:
+            columns, weights = self._weigh(self._docs[post_id])
+            indices.append(columns)
+            data.append(weights)
+            indptr.append(indptr[-1] + len(columns))
+        if not self._ids:
+            self._matrix = sparse.csr_matrix((0, N_FEATURES))
+            return
+        self._matrix = sparse.csr_matrix(
+            (np.concatenate(data), np.concatenate(indices), np.array(indptr)),
+            shape=(len(self._ids), N_FEATURES)
+        )
+
+    def _top(self, ids, row, scores):
+        scores = scores.copy()
+        scores[row] = 0.0
+        k = min(self.top_k, len(scores) - 1)
+        if k <= 0:
+            return []
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(ids[i], round(float(scores[i]), 4)) for i in candidates if scores[i] > 0]
+
+    def _assign(self, related, post_id, entries):
+        """设置（entries 为 None 时删除）post_id 的相关列表，同步维护反向索引"""
+        for related_id, _ in related.get(post_id, ()):
+            referrers = self._referrers.get(related_id)
+            if referrers is not None:
+                referrers.discard(post_id)
+        if entries is None:
+            related.pop(post_id, None)
+            return
+        related[post_id] = entries
+        for related_id, _ in entries:
+            self._referrers.setdefault(related_id, set()).add(post_id)
+
+    def _recompute(self, matrix, ids, related, rows):
+        """按批次重算指定行的相关列表"""
+        for start in range(0, len(rows), BATCH_SIZE):
+            batch = rows[start:start + BATCH_SIZE]
+            block = (matrix[batch] @ matrix.T).toarray()
+            for offset, row in enumerate(batch):
+                self._assign(related, ids[row], self._top(ids, row, block[offset]))
+
+    def _set_doc(self, post_id, doc):
+        old = self._docs.pop(post_id, None)
+        if old is not None:
+            self._df[old[0]] -= 1
+        if doc is not None:
+            self._docs[post_id] = doc
+            self._df[doc[0]] += 1
+
+    def replace_all(self, posts):
+        """用 [(post_id, title, content)] 全量重建；在独立对象上计算，完成后整体替换，期间读取不受影响"""
+        fresh = RelatedIndex(self.top_k)
+        for post_id, title, content in posts:
+            fresh._set_doc(post_id, vectorize(title, content))
+        fresh._build_matrix()
+        fresh._recompute(fresh._matrix, fresh._ids, fresh._related, list(range(len(fresh._ids))))
+        self._docs, self._df, self._referrers = fresh._docs, fresh._df, fresh._referrers
+        self._matrix, self._ids, self._rows = fresh._matrix, fresh._ids, fresh._rows
+        self._related = fresh._related
+        self.built_at = time.monotonic()
+
+    def update(self, post_id, title, content):
+        """新建或修改文章后调用"""
+        if self.built_at is None:
+            return
+        self._set_doc(post_id, vectorize(title, content))
+        columns, weights = self._weigh(self._docs[post_id])
+        ids, rows = list(self._ids), dict(self._rows)
+        row = rows.get(post_id)
+        if row is None:
+            row = rows[post_id] = len(ids)
+            ids.append(post_id)
+            matrix = _splice(self._matrix, row, row, (columns, weights))
+        else:
+            matrix = _splice(self._matrix, row, row + 1, (columns, weights))
+        vector = sparse.csr_matrix((weights, columns, [0, len(columns)]), shape=(1, N_FEATURES))
+        scores = (matrix @ vector.T).toarray().ravel()
+
+        related = dict(self._related)
+        self._assign(related, post_id, self._top(ids, row, scores))
+        # 原来含有该文章的列表，分数已失效，整行重算
+        stale_ids = self._referrers.get(post_id, set()) - {post_id}
+        self._recompute(matrix, ids, related, sorted(rows[other] for other in stale_ids))
+
+        # 其余文章：新分数进入前 top_k 时插入
+        for other_row in np.flatnonzero(scores):
+            other = ids[other_row]
+            if other == post_id or other in stale_ids:
+                continue
+            score = round(float(scores[other_row]), 4)
+            entries = related.get(other, [])
+            if score > 0 and (len(entries) < self.top_k or score > entries[-1][1]):
+                entries = sorted(entries + [(post_id, score)], key=lambda item: -item[1])[:self.top_k]
+                self._assign(related, other, entries)
+
+        self._matrix, self._ids, self._rows = matrix, ids, rows
+        self._related = related
+
+    def remove(self, post_id):
+        """删除文章后调用"""
+        if self.built_at is None or post_id not in self._docs:
+            return
+        self._set_doc(post_id, None)
+        ids, rows = list(self._ids), dict(self._rows)
+        row, last = rows.pop(post_id), len(ids) - 1
+        matrix = self._matrix
+        if row != last:
+            # 最后一行移到被删除的位置，其他行的下标不变
+            start, stop = matrix.indptr[last], matrix.indptr[last + 1]
+            matrix = _splice(matrix, row, row + 1, (matrix.indices[start:stop], matrix.data[start:stop]))
+            ids[row] = ids[last]
+            rows[ids[row]] = row
+        matrix = _splice(matrix, last, last + 1)
+        ids.pop()
+
+        related = dict(self._related)
+        self._assign(related, post_id, None)
+        stale_ids = self._referrers.pop(post_id, set())
+        self._recompute(matrix, ids, related, sorted(rows[other] for other in stale_ids if other in rows))
+
+        self._matrix, self._ids, self._rows = matrix, ids, rows
+        self._related = related
+
+    def get(self, post_id, limit=None):
+        related = self._related.get(post_id, [])
+        return related[:limit] if limit else list(related)
+
+    def stats(self):
+        return {
+            'posts': len(self._ids),
+            'nnz': int(self._matrix.nnz),
+            'top_k': self.top_k,
+            'age_seconds': round(time.monotonic() - self.built_at, 1) if self.built_at is not None else None,
+        }
+
+
+index = RelatedIndex(top_k=Config.RELATED_TOP_K)
+_jobs = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+# 已提交、尚未完成的全量重建的完成事件，避免重复提交
+_rebuild_done = None
+
+
+def _run():
+    while True:
+        job, args, done = _jobs.get()
+        try:
+            job(*args)
+        except Exception as e:
+            print(f"Related index job failed: {e}")
+        finally:
+            done.set()
+
+
+def _submit(job, *args):
+    """交给后台线程按提交顺序执行，返回任务完成时置位的事件；调用方需持有 _worker_lock"""
+    global _worker
+    if _worker is None:
+        _worker = threading.Thread(target=_run, name='related-index', daemon=True)
+        _worker.start()
+    done = threading.Event()
+    _jobs.put((job, args, done))
+    return done
+
+
+def rebuild():
+    """从数据库全量加载文章并重建，返回是否成功；只在后台线程中调用"""
+    conn = get_db_connection()
+    if conn is None:
+        return False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id, title, content FROM post")
+            posts = [(row['id'], row['title'], row['content']) for row in cursor.fetchall()]
+    except pymysql.Error as e:
+        print(f"Database error in related index rebuild: {e}")
+        return False
+    finally:
+        conn.close()
+    index.replace_all(posts)
+    return True
+
+
+def _rebuild_job():
+    global _rebuild_done
+    try:
+        rebuild()
+    finally:
+        with _worker_lock:
+            _rebuild_done = None
+
+
+def ensure_fresh():
+    """
+    超过重建间隔时提交一次后台重建，当前请求继续使用旧结果；
+    尚未构建过时等待首次构建完成。并发请求只会提交一次重建
+    """
+    global _rebuild_done
+    built_at = index.built_at
+    if built_at is not None and time.monotonic() - built_at < Config.RELATED_REBUILD_INTERVAL:
+        return
+    with _worker_lock:
+        if _rebuild_done is None:
+            _rebuild_done = _submit(_rebuild_job)
+        done = _rebuild_done
+    if built_at is None:
+        done.wait()
+
+
+def related_posts(post_id, limit=None):
+    ensure_fresh()
+    return index.get(post_id, limit)
+
+
+def stats():
+    return index.stats()
+
+
+def post_changed(post_id, title, content):
+    """写接口提交后调用，增量计算交给后台线程，不阻塞响应"""
+    with _worker_lock:
+        _submit(index.update, post_id, title, content)
+
+
+def post_removed(post_id):
+    with _worker_lock:
+        _submit(index.remove, post_id)
@@ -0,0 +1,236 @@
+"""
+GET 接口响应缓存
+
+读多写少的接口（文章列表、文章详情）把序列化好的响应体缓存起来，命中时不查库也不重新序列化。
+- 缓存键：endpoint + 查询参数 + 路由参数 + 所属标签的代数
+- 失效：写接口调用 invalidate(标签)，标签代数加一，旧代数下的条目不会再被读到，随 LRU/TTL 自然淘汰
+- 后端：memory（进程内 LRU，默认）、file（本机目录，多 worker 共享）、none（关闭）
+TTL 兜底限制最大陈旧时间（RESPONSE_CACHE_TTL 秒）。
+"""
+import functools
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+from flask import make_response, request
+
+from config import Config
+from utils.cache import TTLCache
+
+# 随响应体一起缓存的响应头（versions.conditional 生成的条件请求头），命中时据此直接判断 304
+CACHED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control')
+
+
+class MemoryBackend:
+    def __init__(self, maxsize, ttl):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value):
+        self._cache.set(key, value)
+
+    def generation(self, tag):
+        return self._generations.get(tag, 0)
+
+    def bump(self, tag):
+        with self._lock:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+
+    def clear(self):
+        self._cache.clear()
+        with self._lock:
+            self._generations.clear()
+
+    def stats(self):
+        return {'backend': 'memory', **self._cache.stats()}
+
+
+class FileBackend:
+    """
+    每个条目一个文件（键的 sha1 命名），写入先落临时文件再 os.replace，多进程并发读写安全
+    标签代数同样存成文件，任一 worker 失效后其他 worker 立即可见
+    """
+
+    PRUNE_EVERY = 256
+
+    def __init__(self, directory, ttl):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(os.path.join(directory, 'tags'), exist_ok=True)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'writes': 0}
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest)
+
+    def _tag_path(self, tag):
+        return os.path.join(self.directory, 'tags', hashlib.sha1(tag.encode('utf-8')).hexdigest())
+
+    def _write(self, path, data):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires_at, stored_key, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            value = None
+        else:
+            if stored_key != key or expires_at <= time.time():
+                value = None
+        with self._lock:
+            self._stats['hits' if value is not None else 'misses'] += 1
+        return value
+
+    def set(self, key, value):
+        data = pickle.dumps((time.time() + self.ttl, key, value), protocol=pickle.HIGHEST_PROTOCOL)
+        try:
+            self._write(self._path(key), data)
+        except OSError as e:
+            print(f"Response cache write error: {e}")
+            return
+        with self._lock:
+            self._stats['writes'] += 1
+            prune = self._stats['writes'] % self.PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def generation(self, tag):
+        try:
+            with open(self._tag_path(tag), 'rb') as f:
+                return int(f.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def bump(self, tag):
+        # 并发 bump 可能丢失一次自增，但代数一定与旧值不同，失效效果不受影响
+        self._write(self._tag_path(tag), str(self.generation(tag) + 1).encode('ascii'))
+
+    def prune(self):
+        """删除已过期的条目文件（旧代数的条目不会再被读取，只能靠过期清理）"""
+        now = time.time()
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.stat().st_mtime + self.ttl <= now:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def clear(self):
+        for directory in (self.directory, os.path.join(self.directory, 'tags')):
+            for entry in os.scandir(directory):
+                if entry.is_file():
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                'backend': 'file',
+                'directory': self.directory,
+                **self._stats,
+                'hit_rate': round(self._stats['hits'] / lookups, 4) if lookups else 0.0,
+            }
+
+
+def _create_backend():
+    kind = Config.RESPONSE_CACHE_BACKEND
+    if kind == 'none':
+        return None
+    if kind == 'file':
+        return FileBackend(Config.RESPONSE_CACHE_DIR, Config.RESPONSE_CACHE_TTL)
+    if kind == 'memory':
+        return MemoryBackend(Config.RESPONSE_CACHE_SIZE, Config.RESPONSE_CACHE_TTL)
+    raise ValueError(f'Unknown RESPONSE_CACHE_BACKEND: {kind}')
+
+
+backend = _create_backend()
+
+
+def cached(tags):
+    """
+    缓存 GET 视图的 200 响应，放在 jwt_required/swag_from 之下，鉴权仍然每次执行
+    tags(**view_args) 返回该响应依赖的标签列表，写接口通过这些标签失效
+    与 versions.conditional 同用时放在它之上：命中时用缓存的 ETag 处理 If-None-Match，不查询数据库
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if backend is None:
+                return view(*args, **kwargs)
+
+            view_args = dict(request.view_args or {})
+            key = (
+                request.endpoint,
+                tuple(sorted(request.args.items(multi=True))),
+                tuple(sorted(view_args.items())),
+                tuple((tag, backend.generation(tag)) for tag in tags(**view_args)),
+                CACHED_HEADERS,
+            )
+            entry = backend.get(key)
+            if entry is not None:
+                body, status, content_type, headers = entry
+                response = make_response(body, status)
+                response.content_type = content_type
+                response.headers.extend(headers)
+                response.headers['X-Cache'] = 'HIT'
+                return response.make_conditional(request)
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                headers = [(name, response.headers[name]) for name in CACHED_HEADERS if name in response.headers]
+                backend.set(key, (response.get_data(), response.status_code, response.content_type, headers))
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def post_tags(post_id=None, **_):
+    """文章相关响应的标签：列表共用 posts，详情只依赖 post:<id>"""
+    return ['posts'] if post_id is None else [f'post:{post_id}']
+
+
+def invalidate(*tags):
+    if backend is None:
+        return
+    for tag in tags:
+        try:
+            backend.bump(tag)
+        except OSError as e:
+            print(f"Response cache invalidate error: {e}")
+
+
+def invalidate_post(post_id):
+    """文章内容、点赞数、评论数变化后调用，同时失效列表与该文章详情"""
+    invalidate('posts', f'post:{post_id}')
+
+
+def clear():
+    if backend is not None:
+        backend.clear()
+
+
+def stats():
+    if backend is None:
+        return {'backend': 'none'}
+    return backend.stats()
@@ -0,0 +1,67 @@
+"""
+全文检索
+
+文章、动态、项目各自有 ngram FULLTEXT 索引（migrations/008_fulltext_search.sql），
+一次 UNION ALL 查询按 MATCH 相关度排序取回一页结果，再在 Python 中截取命中片段并高亮。
+"""
+import html
+import re
+
+# 类型 -> (表, 标题列, 正文列, MATCH 列)；MATCH 列必须与 FULLTEXT 索引列一致
+SEARCH_SOURCES = {
+    'post': ('post', 'title', 'content', 'title, content'),
+    'moment': ('moment', None, 'content', 'content'),
+    'project': ('project', 'name', 'description', 'name, description'),
+}
+
+MAX_QUERY_LENGTH = 100
+
+
+def search(cursor, q, types=None, limit=10, offset=0):
+    """按相关度返回 [{type, id, title, body, score}]，types 为空时检索全部类型"""
+    parts = []
+    params = []
+    for search_type in types or SEARCH_SOURCES:
+        table, title_col, body_col, match_cols = SEARCH_SOURCES[search_type]
+        title_expr = f'`{title_col}`' if title_col else 'NULL'
+        parts.append(f"""
+            SELECT '{search_type}' AS type, id, {title_expr} AS title, `{body_col}` AS body,
+                MATCH({match_cols}) AGAINST (%s IN NATURAL LANGUAGE MODE) AS score
+            FROM `{table}`
+            WHERE MATCH({match_cols}) AGAINST (%s IN NATURAL LANGUAGE MODE)
+        """)
+        params.extend([q, q])
+    sql = ' UNION ALL '.join(parts) + ' ORDER BY score DESC, type ASC, id DESC LIMIT %s OFFSET %s'
+    params.extend([limit, offset])
+    cursor.execute(sql, params)
+    return list(cursor.fetchall())
+
+
+def query_terms(q):
+    """高亮用的词：整个查询串加上按空白拆分的各个词，长的优先匹配"""
+    terms = {q.strip(), *q.split()}
+    return sorted((term for term in terms if term), key=len, reverse=True)
+
+
+def highlight(text, terms, width=120):
+    """
+    截取第一个命中词附近 width 个字符的片段，命中处用 <mark> 包裹，其余内容做 HTML 转义
+    没有命中时返回开头的片段
+    """
+    text = text or ''
+    if not terms:
+        return html.escape(text[:width])
+    pattern = re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE)
+    first = pattern.search(text)
+    start = max(0, first.start() - width // 3) if first else 0
+    end = min(len(text), start + width)
+    snippet = text[start:end]
+
+    pieces = []
+    last = 0
+    for match in pattern.finditer(snippet):
+        pieces.append(html.escape(snippet[last:match.start()]))
+        pieces.append(f'<mark>{html.escape(match.group())}</mark>')
+        last = match.end()
+    pieces.append(html.escape(snippet[last:]))
+    return ('…' if start > 0 else '') + ''.join(pieces) + ('…' if end < len(text) else '')
@@ -0,0 +1,349 @@
+"""
+静态文件与上传文件的服务层
+
+- 前端 dist：index.html 常驻内存（同时缓存 gzip 版本），每次请求只 stat 一次，mtime 变化时重新加载，
+  同时重新扫描 dist 下的文件列表；SPA 路由判断查内存中的文件集合，不再逐次 isfile
+- 存在 .br / .gz 同名文件且客户端接受时直接返回压缩版本（Content-Encoding + Vary）
+- Vite 构建出的带哈希文件（assets/xxx-<hash>.js）内容不会变化，Cache-Control 为 immutable；
+  其余文件每次携带 ETag / Last-Modified 重新验证
+- 图片等文件经 send_file(conditional=True) 返回，支持 Range、If-None-Match、If-Modified-Since
+- STATIC_SENDFILE=x-sendfile 时由 Flask 输出 X-Sendfile；=x-accel-redirect 时只返回头部，
+  由 nginx 的 internal location 输出文件内容，例如：
+      location /_static/dist/ { internal; alias /srv/blog/frontend/MyBlog/dist/; gzip_static on; }
+  位置前缀为 STATIC_ACCEL_PREFIX，其后是各目录的名称（dist、assets、uploads、blobs）
+- `flask assets build` 为目录生成 .br/.gz 并写出清单（MANIFEST_NAME：每个文件的大小、mtime、sha256、
+  Content-Type 和可用的压缩版本）；启动时加载清单后，清单内的文件不再 stat、不再猜测类型，
+  ETag 取内容哈希。dist 的清单在 index.html 变化（重新构建）时随之重新加载，与新构建不符时忽略
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+from urllib.parse import quote
+
+from flask import abort, current_app, request, send_file
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+
+from config import Config
+
+try:
+    import brotli
+except ImportError:  # 未安装时只生成 gzip 版本
+    brotli = None
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, no-cache'
+
+# Vite 默认输出 assets/<name>-<8 位 base64url 哈希>.<ext>
+_HASHED_ASSET = re.compile(r'^assets/.+-[A-Za-z0-9_-]{8}\.[A-Za-z0-9]+$')
+
+# 按优先级排列的预压缩格式：(Accept-Encoding 名称, 文件后缀)
+_ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+MANIFEST_NAME = '.assets-manifest.json'
+MANIFEST_VERSION = 1
+
+# 值得压缩的类型；图片、字体 woff2 等已压缩格式不处理
+_COMPRESSIBLE = {
+    'application/javascript', 'application/json', 'application/manifest+json', 'application/wasm',
+    'application/xml', 'image/svg+xml', 'image/x-icon', 'image/vnd.microsoft.icon', 'font/ttf', 'font/otf',
+}
+# 压缩后至少要小 10% 才保留
+_MIN_RATIO = 0.9
+
+
+def is_hashed_asset(path):
+    return bool(_HASHED_ASSET.match(path))
+
+
+def is_hidden(path):
+    """以 . 开头的文件或目录（清单 MANIFEST_NAME、.git、.env 等）不对外提供"""
+    return any(part.startswith('.') for part in path.split('/'))
+
+
+def _mimetype(path):
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def _accepts(encoding):
+    return request.accept_encodings[encoding] > 0
+
+
+def walk(directory, exclude=()):
+    """返回目录下全部文件的相对路径（/ 分隔），跳过 exclude 中的子目录"""
+    exclude = {os.path.abspath(path) for path in exclude}
+    files = []
+    for parent, dirs, names in os.walk(directory):
+        dirs[:] = [d for d in dirs if os.path.join(parent, d) not in exclude]
+        relative = os.path.relpath(parent, directory)
+        for filename in names:
+            files.append(filename if relative == '.' else f'{relative}/{filename}'.replace(os.sep, '/'))
+    return files
+
+
+def _is_compressible(mimetype):
+    return mimetype.startswith('text/') or mimetype in _COMPRESSIBLE
+
+
+def _write_atomic(path, data):
+    tmp_path = f'{path}.part'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def build_entry(directory, path, min_size=1024, force=False):
+    """
+    进程池任务：计算一个文件的清单条目，必要时生成 .br / .gz
+    已有的压缩版本比原文件新时直接复用（force 时重新生成）；压缩收益不足时删除旧的压缩版本
+    """
+    full = os.path.join(directory, path)
+    stat = os.stat(full)
+    with open(full, 'rb') as f:
+        data = f.read()
+    entry = {
+        'size': stat.st_size,
+        'mtime': int(stat.st_mtime),
+        'sha256': hashlib.sha256(data).hexdigest(),
+        'type': _mimetype(path),
+        'encodings': {},
+    }
+    compressors = {'gzip': lambda raw: gzip.compress(raw, 9, mtime=0)}
+    if brotli is not None:
+        compressors['br'] = lambda raw: brotli.compress(raw, quality=11)
+    wanted = len(data) >= min_size and _is_compressible(entry['type'])
+
+    for encoding, suffix in _ENCODINGS:
+        sibling = full + suffix
+        if not wanted or encoding not in compressors:
+            if wanted or not os.path.exists(sibling):
+                continue
+            os.remove(sibling)
+            continue
+        try:
+            sibling_stat = os.stat(sibling)
+        except FileNotFoundError:
+            sibling_stat = None
+        if sibling_stat is not None and not force and sibling_stat.st_mtime >= stat.st_mtime:
+            size = sibling_stat.st_size
+        else:
+            compressed = compressors[encoding](data)
+            size = len(compressed)
+            if size > len(data) * _MIN_RATIO:
+                if sibling_stat is not None:
+                    os.remove(sibling)
+                continue
+            _write_atomic(sibling, compressed)
+        entry['encodings'][encoding] = size
+    return entry
+
+
+def manifest_sources(directory, exclude=()):
+    """清单应包含的文件：排除清单本身、压缩版本（原文件存在时）和未完成的临时文件"""
+    files = set(walk(directory, exclude))
+    return sorted(
+        path for path in files
+        if path != MANIFEST_NAME and not path.endswith('.part')
+        and not any(path.endswith(suffix) and path[:-len(suffix)] in files for _, suffix in _ENCODINGS)
+    )
+
+
+def write_manifest(directory, entries):
+    _write_atomic(
+        os.path.join(directory, MANIFEST_NAME),
+        json.dumps({'version': MANIFEST_VERSION, 'files': entries}, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    )
+
+
+class StaticRoot:
+    """
+    一个对外提供文件的目录
+    cache_control 为 Cache-Control 字符串，或接收相对路径返回字符串的函数
+    files 不为 None 时为已知文件的相对路径集合，用于免 stat 判断文件和预压缩版本是否存在
+    """
+
+    def __init__(self, name, directory, cache_control=REVALIDATE, precompressed=False):
+        self.name = name
+        self.directory = os.path.abspath(directory)
+        self.cache_control = cache_control
+        self.precompressed = precompressed
+        self.files = None
+        self.manifest = {}
+
+    def scan(self):
+        self.files = frozenset(walk(self.directory))
+
+    def load_manifest(self):
+        """读取 `flask assets build` 生成的清单，返回是否加载成功"""
+        try:
+            with open(os.path.join(self.directory, MANIFEST_NAME), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+            return False
+        if manifest.get('version') != MANIFEST_VERSION:
+            self.manifest = {}
+            return False
+        self.manifest = manifest['files']
+        return True
+
+    def exists(self, path):
+        if is_hidden(path):
+            return False
+        if path in self.manifest:
+            return True
+        if self.files is not None:
+            return path in self.files
+        full = safe_join(self.directory, path)
+        return full is not None and os.path.isfile(full)
+
+    def _cache_control_for(self, path):
+        return self.cache_control(path) if callable(self.cache_control) else self.cache_control
+
+    def _pick_encoding(self, path):
+        """返回 (实际发送的相对路径, Content-Encoding)"""
+        entry = self.manifest.get(path)
+        for encoding, suffix in _ENCODINGS:
+            if entry is not None:
+                available = encoding in entry['encodings']
+            else:
+                available = self.precompressed and self.exists(path + suffix)
+            if available and _accepts(encoding):
+                return path + suffix, encoding
+        return path, None
+
+    def _has_variants(self, path):
+        entry = self.manifest.get(path)
+        if entry is not None:
+            return bool(entry['encodings'])
+        return self.precompressed and any(self.exists(path + suffix) for _, suffix in _ENCODINGS)
+
+    @staticmethod
+    def _entry_matches(stat, entry, encoding):
+        """文件仍是生成清单时的版本（压缩版本只记录了大小）"""
+        if encoding:
+            return stat.st_size == entry['encodings'][encoding]
+        return stat.st_size == entry['size'] and int(stat.st_mtime) == entry['mtime']
+
+    def _send_entry(self, full, entry, encoding):
+        """
+        按清单中的元数据发送，不猜类型、不计算 ETag；
+        打开文件后用 fstat 核对大小和修改时间，文件在清单生成后被改过时退回 send_file，避免发出错误的长度和 ETag
+        """
+        size = entry['encodings'][encoding] if encoding else entry['size']
+        if current_app.config['USE_X_SENDFILE']:
+            try:
+                stat = os.stat(full)
+            except FileNotFoundError:
+                abort(404)
+            if not self._entry_matches(stat, entry, encoding):
+                return send_file(full, mimetype=entry['type'], conditional=True, etag=True)
+            response = current_app.response_class(mimetype=entry['type'], direct_passthrough=True)
+            response.headers['X-Sendfile'] = full
+        else:
+            try:
+                file = open(full, 'rb')
+            except FileNotFoundError:
+                abort(404)
+            if not self._entry_matches(os.fstat(file.fileno()), entry, encoding):
+                file.close()
+                return send_file(full, mimetype=entry['type'], conditional=True, etag=True)
+            response = current_app.response_class(
+                wrap_file(request.environ, file), mimetype=entry['type'], direct_passthrough=True
+            )
+        response.content_length = size
+        response.last_modified = entry['mtime']
+        response.set_etag(f"{entry['sha256'][:32]}-{encoding or 'identity'}")
+        return response.make_conditional(request, accept_ranges=True, complete_length=size)
+
+    def serve(self, path):
+        if not self.exists(path):
+            abort(404)
+
+        mode = Config.STATIC_SENDFILE
+        entry = self.manifest.get(path)
+        if mode == 'x-accel-redirect':
+            # 内容协商、Range 与条件请求交给 nginx（gzip_static / brotli_static）
+            response = current_app.response_class(mimetype=entry['type'] if entry else _mimetype(path))
+            response.headers['X-Accel-Redirect'] = f'{Config.STATIC_ACCEL_PREFIX}/{self.name}/{quote(path)}'
+        else:
+            sent_path, encoding = self._pick_encoding(path)
+            full = safe_join(self.directory, sent_path)
+            if entry is not None:
+                response = self._send_entry(full, entry, encoding)
+            else:
+                # USE_X_SENDFILE 开启时 send_file 只输出 X-Sendfile 头
+                response = send_file(full, mimetype=_mimetype(path), conditional=True, etag=True)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+            if self._has_variants(path):
+                response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = self._cache_control_for(path)
+        return response
+
+
+class SpaRoot(StaticRoot):
+    """前端构建目录：内存中的 index.html + 文件列表，index.html 的 mtime 变化时一起刷新"""
+
+    def __init__(self, name, directory):
+        super().__init__(name, directory, cache_control=self._dist_cache_control, precompressed=True)
+        self._index = None       # (mtime_ns, body, gzip 后的 body)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _dist_cache_control(path):
+        return IMMUTABLE if is_hashed_asset(path) else REVALIDATE
+
+    def _load(self):
+        index_path = os.path.join(self.directory, 'index.html')
+        try:
+            mtime = os.stat(index_path).st_mtime_ns
+        except FileNotFoundError:
+            abort(404)
+        index = self._index
+        if index is not None and index[0] == mtime:
+            return index
+        with self._lock:
+            if self._index is None or self._index[0] != mtime:
+                with open(index_path, 'rb') as f:
+                    body = f.read()
+                # 新构建会重写 index.html，顺带刷新文件列表；清单与当前 index.html 不一致时说明尚未重新生成，忽略
+                self.scan()
+                if self.load_manifest() and self.manifest.get('index.html', {}).get('sha256') != hashlib.sha256(body).hexdigest():
+                    self.manifest = {}
+                self._index = (mtime, body, gzip.compress(body, 9))
+            return self._index
+
+    def index(self):
+        mtime, body, compressed = self._load()
+        use_gzip = _accepts('gzip')
+        response = current_app.response_class(compressed if use_gzip else body, mimetype='text/html')
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        response.set_etag(f'{mtime:x}-{"gz" if use_gzip else "id"}')
+        response.last_modified = mtime / 1e9
+        response.headers['Cache-Control'] = REVALIDATE
+        return response.make_conditional(request)
+
+    def serve_path(self, path):
+        """已知文件直接返回；assets/ 下找不到的文件返回 404（避免把 index.html 当脚本返回），其余路径交给前端路由"""
+        self._load()
+        if self.exists(path):
+            return self.serve(path)
+        if path.startswith('assets/'):
+            abort(404)
+        return self.index()
+
+
+def init_app(app, *roots):
+    """登记对外提供的目录（供 `flask assets build` 使用）并加载各自的清单"""
+    app.extensions['static_roots'] = {root.name: root for root in roots}
+    for root in roots:
+        if not isinstance(root, SpaRoot):
+            # SpaRoot 在首次加载 index.html 时读取清单
+            root.load_manifest()
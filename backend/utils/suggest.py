@@ -0,0 +1,176 @@
+"""
+标题联想
+
+文章、项目标题按类型分别以小写形式保存在有序数组中，前缀查询在每个请求的类型里用 bisect
+定位到第一个不小于前缀的位置，最多向后取 limit 条，再按标题合并取前 limit 条，
+耗时与 limit × 类型数成正比，与标题总数及其他类型的命中条数无关。
+索引在后台线程中全量构建（启动时及每 SUGGEST_REBUILD_INTERVAL 秒一次，以同步其他 worker 的写入），
+完成后整体替换，请求从不等待数据库；构建期间写接口的增量更新先记下，替换时重放，不会丢失。
+"""
+import bisect
+import heapq
+import itertools
+import threading
+import time
+
+import pymysql
+
+from config import Config
+from utils.db import get_db_connection
+
+# 类型 -> (表, 标题列)
+SUGGEST_SOURCES = {
+    'post': ('post', 'title'),
+    'project': ('project', 'name'),
+}
+
+
+def _normalize(text):
+    return ' '.join(text.split()).casefold()
+
+
+class PrefixIndex:
+
+    def __init__(self):
+        self._keys = {}      # 类型 -> 有序的 (标准化标题, id)
+        self._entries = {}   # (类型, id) -> (标准化标题, 原标题)
+        self._journal = None # 全量构建期间的增量更新 [(类型, id, 标题或 None)]
+        self._lock = threading.Lock()
+        self.built_at = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _apply_locked(self, keys, entries, item_type, item_id, title):
+        """新增、更新（title 非空）或删除（title 为 None）一条标题"""
+        entry = entries.pop((item_type, item_id), None)
+        type_keys = keys.setdefault(item_type, [])
+        if entry is not None:
+            key = (entry[0], item_id)
+            index = bisect.bisect_left(type_keys, key)
+            if index < len(type_keys) and type_keys[index] == key:
+                del type_keys[index]
+        if title:
+            normalized = _normalize(title)
+            entries[(item_type, item_id)] = (normalized, title)
+            bisect.insort(type_keys, (normalized, item_id))
+
+    def _update(self, item_type, item_id, title):
+        with self._lock:
+            self._apply_locked(self._keys, self._entries, item_type, item_id, title)
+            if self._journal is not None:
+                self._journal.append((item_type, item_id, title))
+
+    def add(self, item_type, item_id, title):
+        """新增或更新一条标题"""
+        self._update(item_type, item_id, title or None)
+
+    def remove(self, item_type, item_id):
+        self._update(item_type, item_id, None)
+
+    def begin_rebuild(self):
+        """开始全量构建前调用，此后的增量更新在 replace_all 时重放到新索引上"""
+        with self._lock:
+            self._journal = []
+
+    def replace_all(self, items):
+        """用 [(类型, id, 标题)] 整体替换索引"""
+        entries = {}
+        for item_type, item_id, title in items:
+            if title:
+                entries[(item_type, item_id)] = (_normalize(title), title)
+        keys = {item_type: [] for item_type in SUGGEST_SOURCES}
+        for (item_type, item_id), (normalized, _) in entries.items():
+            keys.setdefault(item_type, []).append((normalized, item_id))
+        for type_keys in keys.values():
+            type_keys.sort()
+        with self._lock:
+            for change in self._journal or ():
+                self._apply_locked(keys, entries, *change)
+            self._journal = None
+            self._entries = entries
+            self._keys = keys
+            self.built_at = time.monotonic()
+
+    def abort_rebuild(self):
+        with self._lock:
+            self._journal = None
+
+    def lookup(self, prefix, limit=10, types=None):
+        prefix = _normalize(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            keys, entries = self._keys, self._entries
+            candidates = []
+            for item_type in sorted(types if types is not None else keys):
+                type_keys = keys.get(item_type, [])
+                # 每个类型最多取 limit 条，总扫描量有界
+                start = bisect.bisect_left(type_keys, (prefix,))
+                matched = itertools.takewhile(
+                    lambda key: key[0].startswith(prefix), itertools.islice(type_keys, start, start + limit)
+                )
+                candidates.append([(normalized, item_type, item_id) for normalized, item_id in matched])
+            return [
+                {'type': item_type, 'id': item_id, 'title': entries[(item_type, item_id)][1]}
+                for _, item_type, item_id in itertools.islice(heapq.merge(*candidates), limit)
+            ]
+
+
+index = PrefixIndex()
+_rebuild_lock = threading.Lock()
+
+
+def _title(value):
+    # project 表部分列为二进制类型，取出后是 bytes
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+def rebuild():
+    """从数据库全量加载标题，返回是否成功"""
+    conn = get_db_connection()
+    if conn is None:
+        return False
+    index.begin_rebuild()
+    try:
+        items = []
+        with conn.cursor() as cursor:
+            for item_type, (table, column) in SUGGEST_SOURCES.items():
+                cursor.execute(f"SELECT id, `{column}` AS title FROM `{table}`")
+                items.extend((item_type, row['id'], _title(row['title'])) for row in cursor.fetchall())
+        index.replace_all(items)
+        return True
+    except pymysql.Error as e:
+        index.abort_rebuild()
+        print(f"Database error in suggest index rebuild: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def _rebuild_in_background():
+    try:
+        rebuild()
+    finally:
+        _rebuild_lock.release()
+
+
+def ensure_fresh():
+    """索引未构建或超过重建间隔时在后台线程重建，当前请求继续使用旧索引（未构建时结果为空）"""
+    built_at = index.built_at
+    if built_at is not None and time.monotonic() - built_at < Config.SUGGEST_REBUILD_INTERVAL:
+        return
+    # 同一时间只有一个重建线程
+    if not _rebuild_lock.acquire(blocking=False):
+        return
+    threading.Thread(target=_rebuild_in_background, name='suggest-rebuild', daemon=True).start()
+
+
+def suggest(prefix, limit=10, types=None):
+    ensure_fresh()
+    return index.lookup(prefix, limit=limit, types=types)
+
+
+def init_app(app):
+    """启动时在后台开始构建，不阻塞应用加载；数据库不可用时在之后的查询中重试"""
+    ensure_fresh()
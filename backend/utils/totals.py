@@ -0,0 +1,45 @@
+"""
+列表总数
+
+total 参数决定分页接口如何给出总数：
+- exact（默认）：每次 COUNT(*)
+- cached：COUNT(*) 结果缓存 TOTAL_CACHE_TTL 秒，新增/删除时失效
+- none：不统计总数，只靠 has_more 判断是否还有下一页
+"""
+from config import Config
+from utils.cache import TTLCache
+
+TOTAL_MODES = ('exact', 'cached', 'none')
+
+_cache = TTLCache(maxsize=1024, ttl=Config.TOTAL_CACHE_TTL)
+
+
+def parse_mode(value):
+    mode = (value or 'exact').lower()
+    if mode not in TOTAL_MODES:
+        raise ValueError(f"total must be one of {', '.join(TOTAL_MODES)}")
+    return mode
+
+
+def get_total(cursor, mode, key, sql, params=()):
+    """按 mode 返回总数，mode 为 none 时返回 None"""
+    if mode == 'none':
+        return None
+
+    def count():
+        cursor.execute(sql, params)
+        return cursor.fetchone()['total']
+
+    if mode == 'cached':
+        return _cache.get_or_set(key, count)
+    total = count()
+    _cache.set(key, total)
+    return total
+
+
+def invalidate(key):
+    _cache.delete(key)
+
+
+def stats():
+    return _cache.stats()
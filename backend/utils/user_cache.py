@@ -0,0 +1,58 @@
+"""
+用户身份缓存
+
+进程内缓存 user.id -> {id, username, role}，评论、动态等读写路径通过它补全用户名，
+不再为每次查询 JOIN user 表或单独打开连接查用户名。未命中的 ID 一次 IN 查询批量补齐，
+不存在的用户也会缓存（值为 None），注册、改名时调用 invalidate 失效。
+"""
+from config import Config
+from utils.cache import TTLCache
+
+_MISSING = object()
+
+_cache = TTLCache(maxsize=Config.USER_CACHE_SIZE, ttl=Config.USER_CACHE_TTL)
+
+
+def get_users(cursor, user_ids):
+    """返回 {user_id: {'id', 'username', 'role'} 或 None}，缺失部分一次查询补齐"""
+    users = {}
+    missing = []
+    for user_id in set(user_ids):
+        if user_id is None:
+            continue
+        user = _cache.get(user_id, _MISSING)
+        if user is _MISSING:
+            missing.append(user_id)
+        else:
+            users[user_id] = user
+
+    if missing:
+        cursor.execute("SELECT id, username, role FROM user WHERE id IN %s", (tuple(missing),))
+        found = {row['id']: row for row in cursor.fetchall()}
+        for user_id in missing:
+            user = found.get(user_id)
+            _cache.set(user_id, user)
+            users[user_id] = user
+    return users
+
+
+def get_user(cursor, user_id):
+    return get_users(cursor, [user_id]).get(user_id)
+
+
+def attach_usernames(cursor, rows, default='匿名用户', user_key='user_id'):
+    """按 user_key 为每行补充 username 字段，用户不存在时使用 default，原地修改并返回"""
+    rows = list(rows)
+    users = get_users(cursor, [row[user_key] for row in rows])
+    for row in rows:
+        user = users.get(row[user_key])
+        row['username'] = user['username'] if user else default
+    return rows
+
+
+def invalidate(user_id):
+    _cache.delete(user_id)
+
+
+def stats():
+    return _cache.stats()
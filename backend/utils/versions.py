@@ -0,0 +1,124 @@
+"""
+内容版本号与条件请求
+
+写操作在同一事务内递增相关 scope 的版本号（content_version 表），读接口用版本号生成强 ETag：
+客户端带 If-None-Match 命中时只做一次主键查询就返回 304，不查业务数据也不序列化 JSON。
+全局 scope（*）由对账等批量修复操作递增，使所有 ETag 一起失效。
+点赞、评论只递增单条内容的 scope：所有计数变化都去更新同一个列表 scope 会让这一行成为全站的锁热点，
+列表 ETag 改为按 LIST_ETAG_MAX_STALE 时间窗口轮换，列表中的计数最多陈旧一个窗口。
+"""
+import functools
+import hashlib
+import time
+from datetime import datetime, timezone
+
+import pymysql
+from flask import current_app, make_response, request
+
+from utils.db import get_db_connection
+
+GLOBAL_SCOPE = '*'
+
+
+def target_scopes(target, target_id):
+    """点赞、评论等计数变化影响的 scope：只有该条内容的详情，列表由 ETag 时间窗口兜底"""
+    return [f'{target}:{target_id}']
+
+
+def bump(cursor, *scopes):
+    """递增版本号，需与业务写入在同一事务内提交；按 scope 排序加锁，避免并发事务互相死锁"""
+    scopes = sorted(set(scopes))
+    if not scopes:
+        return
+    placeholders = ', '.join(['(%s, 1)'] * len(scopes))
+    cursor.execute(
+        f"INSERT INTO content_version (scope, version) VALUES {placeholders} "
+        f"ON DUPLICATE KEY UPDATE version = version + 1",
+        scopes
+    )
+
+
+def current(cursor, scopes):
+    """返回 ({scope: version}, 最后修改时间)，没有记录的 scope 版本为 0"""
+    cursor.execute(
+        "SELECT scope, version, UNIX_TIMESTAMP(updated_at) AS updated_at FROM content_version WHERE scope IN %s",
+        (tuple(scopes),)
+    )
+    rows = {row['scope']: row for row in cursor.fetchall()}
+    versions = {scope: rows[scope]['version'] if scope in rows else 0 for scope in scopes}
+    stamps = [int(row['updated_at']) for row in rows.values() if row['updated_at'] is not None]
+    last_modified = datetime.fromtimestamp(max(stamps), tz=timezone.utc) if stamps else None
+    return versions, last_modified
+
+
+def conditional(scopes, max_stale=None):
+    """
+    为 GET 视图加上 ETag / Last-Modified，放在 jwt_required/swag_from 之下；
+    与 response_cache.cached 同用时放在它之下，缓存命中时连同 ETag 一起返回，不再查询版本表
+    scopes(**view_args) 返回响应依赖的 scope 列表；查询参数也参与 ETag 计算
+    max_stale：秒数，响应中含有不递增版本号的计数时使用，ETag 每隔这么久轮换一次
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            view_args = dict(request.view_args or {})
+            conn = get_db_connection()
+            if conn is None:
+                return view(*args, **kwargs)
+            try:
+                with conn.cursor() as cursor:
+                    versions, last_modified = current(cursor, [GLOBAL_SCOPE, *scopes(**view_args)])
+            except pymysql.Error as e:
+                # 版本表不可用时退化为普通请求
+                print(f"Database error in conditional request: {e}")
+                return view(*args, **kwargs)
+            finally:
+                conn.close()
+
+            window = None
+            if max_stale:
+                window = int(time.time() // max_stale)
+                window_start = datetime.fromtimestamp(window * max_stale, tz=timezone.utc)
+                last_modified = max(last_modified, window_start) if last_modified else window_start
+
+            etag = hashlib.sha1(repr((
+                request.endpoint,
+                sorted(request.args.items(multi=True)),
+                sorted(versions.items()),
+                window,
+            )).encode('utf-8')).hexdigest()
+
+            if request.if_none_match:
+                # If-None-Match 按弱比较匹配，W/ 前缀不影响判断
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                since = request.if_modified_since
+                not_modified = bool(last_modified and since and last_modified <= since)
+            if not_modified:
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            # 带时间窗的 ETag 在窗口内不随列表里的计数变化而变化，只保证语义等价，标为弱 ETag
+            response.set_etag(etag, weak=window is not None)
+            if last_modified:
+                response.last_modified = last_modified
+            # 接口需要登录，只允许客户端私有缓存，每次使用前携带 ETag 重新验证
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def post_scopes(post_id=None, **_):
+    return ['posts'] if post_id is None else [f'post:{post_id}']
+
+
+def project_scopes(project_id=None, **_):
+    return ['projects'] if project_id is None else [f'project:{project_id}']
+
+
+def moment_scopes(moment_id, **_):
+    return [f'moment:{moment_id}']